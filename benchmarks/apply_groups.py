@@ -0,0 +1,119 @@
+"""Benchmark the per group overhead of apply_groups against rebuilding the graph for
+every group, as done inside a pandas grouped apply.
+
+Usage:
+
+    python benchmarks/apply_groups.py [--groups 2000] [--length 10] [--repeat 3] [--workers 4]
+
+Prints the median time per group of the bare function calls, of rebuilding and running
+the graph per group, and of apply_groups in this process (max_workers=1, where the
+difference with rebuilding is the planning and graph construction saved) and across a
+pool of worker processes.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from pyflow import GraphBuilder
+
+
+def shift(df):
+    return df.assign(x=df['x'] + 1)
+
+
+def total(df):
+    return df['x'].sum()
+
+
+def build_graph(length, value=None):
+
+    G = GraphBuilder()
+    placeholder = G.placeholder('group') if value is None else None
+    data_node = G.add(shift)(placeholder if value is None else value)
+
+    for _ in range(length - 1):
+        data_node = G.add(shift)(data_node)
+
+    return G, placeholder, G.add(total)(data_node)
+
+
+def get_frame(n_groups):
+
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'g': rng.integers(n_groups, size=10 * n_groups), 'x': rng.random(10 * n_groups)})
+
+
+def time_calls(df, length):
+
+    start_time = time.perf_counter()
+
+    for _, group in df.groupby('g'):
+
+        value = group
+        for _ in range(length):
+            value = shift(value)
+        total(value)
+
+    return time.perf_counter() - start_time
+
+
+def time_rebuild(df, length):
+
+    start_time = time.perf_counter()
+
+    for _, group in df.groupby('g'):
+
+        G, _, output = build_graph(length, group)
+        G.run(output)
+
+    return time.perf_counter() - start_time
+
+
+def time_apply_groups(df, length, max_workers):
+
+    G, placeholder, output = build_graph(length)
+    start_time = time.perf_counter()
+
+    G.apply_groups(df, by='g', input=placeholder, targets=output, max_workers=max_workers, chunksize=64)
+
+    return time.perf_counter() - start_time
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--groups', type=int, default=2000)
+    parser.add_argument('--length', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=4)
+    options = parser.parse_args()
+
+    df = get_frame(options.groups)
+    n_groups = df['g'].nunique()
+
+    durations = {
+        'calls only': statistics.median(time_calls(df, options.length) for _ in range(options.repeat)),
+        'rebuild': statistics.median(time_rebuild(df, options.length) for _ in range(options.repeat)),
+        'apply_groups': statistics.median(time_apply_groups(df, options.length, 1) for _ in range(options.repeat)),
+        'apply_groups x{}'.format(options.workers): statistics.median(
+            time_apply_groups(df, options.length, options.workers) for _ in range(options.repeat))
+    }
+
+    for name, duration in durations.items():
+        print('{:<20} {:>8.1f} us per group'.format(name, duration / n_groups * 1e6))
+
+    overheads = {k: (durations[k] - durations['calls only']) / n_groups * 1e6 for k in ['rebuild', 'apply_groups']}
+
+    print('overhead per group in a single process: {:.1f} us -> {:.1f} us ({:.0f}% less)'.format(
+        overheads['rebuild'], overheads['apply_groups'], 100 * (1 - overheads['apply_groups'] / overheads['rebuild'])))
+
+
+if __name__ == '__main__':
+    main()
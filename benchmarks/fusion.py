@@ -0,0 +1,95 @@
+"""Benchmark the per op node overhead of running a long linear chain of small
+transforms, with and without operator fusion.
+
+Usage:
+
+    python benchmarks/fusion.py [--length 2000] [--repeat 5]
+
+Prints the median time per op node of building the plan and of executing it, 
+unfused and fused, along with the time of the bare function calls, and the 
+execution overhead saved by fusion.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from pyflow import GraphBuilder
+from pyflow.scheduler import SequentialExecutor
+
+
+def increment(a):
+    return a + 1
+
+
+def build_chain(length):
+
+    G = GraphBuilder()
+    data_node = G.add(increment)(0)
+
+    for _ in range(length - 1):
+        data_node = G.add(increment)(data_node)
+
+    return G, data_node
+
+
+def time_run(length, fuse):
+
+    G, data_node = build_chain(length)
+
+    start_time = time.perf_counter()
+    plan = G.plan(data_node, fuse=fuse)
+    plan_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    SequentialExecutor().execute(plan)
+    execute_duration = time.perf_counter() - start_time
+
+    assert data_node.get() == length
+
+    return plan_duration, execute_duration
+
+
+def time_calls(length):
+
+    start_time = time.perf_counter()
+
+    value = 0
+    for _ in range(length):
+        value = increment(value)
+
+    return time.perf_counter() - start_time
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--length', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+
+    calls_duration = statistics.median(time_calls(options.length) for _ in range(options.repeat))
+    print('{:<16} {:>8.2f} us per op node'.format('calls only', calls_duration / options.length * 1e6))
+
+    overheads = dict()
+
+    for fuse in [False, True]:
+
+        durations = [time_run(options.length, fuse) for _ in range(options.repeat)]
+        plan_duration = statistics.median(elem[0] for elem in durations)
+        execute_duration = statistics.median(elem[1] for elem in durations)
+
+        overheads[fuse] = (execute_duration - calls_duration) / options.length * 1e6
+
+        print('{:<16} plan {:>8.2f} us, execute {:>8.2f} us per op node'.format(
+            'fuse={}'.format(fuse), plan_duration / options.length * 1e6, execute_duration / options.length * 1e6))
+
+    print('execution overhead per op node: {:.2f} us -> {:.2f} us ({:.0f}% less)'.format(
+        overheads[False], overheads[True], 100 * (1 - overheads[True] / overheads[False])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark the time of `import pyflow` in a fresh interpreter.
+
+Usage:
+
+    python benchmarks/import_time.py [--repeat 10] [--max-ms 150]
+
+Exits with status 1 if the median import time exceeds --max-ms, or if any of the
+heavy optional dependencies is imported along with pyflow.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ['numpy', 'pandas', 'pyspark', 'graphviz', 'dask', 'bokeh', 'cloudpickle']
+
+SRC_DIRPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')
+
+
+def time_import():
+    """Cumulative import time of pyflow in microseconds, from python -X importtime,
+    and the heavy modules that were imported with it"""
+
+    script = ("import sys, pyflow; "
+              "print(','.join(m for m in {} if m in sys.modules))".format(HEAVY_MODULES))
+    env = dict(os.environ, PYTHONPATH=SRC_DIRPATH)
+
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], 
+                               capture_output=True, text=True, env=env, check=True)
+
+    pyflow_line = [elem for elem in completed.stderr.split('\n') if elem.endswith('| pyflow')][-1]
+    cumulative_us = int(pyflow_line.split('|')[1])
+    imported_heavy_modules = [elem for elem in completed.stdout.strip().split(',') if elem]
+
+    return cumulative_us, imported_heavy_modules
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=150)
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.repeat):
+        cumulative_us, imported_heavy_modules = time_import()
+        timings.append(cumulative_us / 1000)
+
+    median_ms = statistics.median(timings)
+    print('import pyflow: median {:.1f} ms, min {:.1f} ms, max {:.1f} ms over {} runs'.format(
+        median_ms, min(timings), max(timings), args.repeat))
+
+    if imported_heavy_modules:
+        print('heavy modules imported eagerly: {}'.format(', '.join(imported_heavy_modules)))
+        return 1
+
+    if median_ms > args.max_ms:
+        print('import time regressed above {} ms'.format(args.max_ms))
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,12 +5,22 @@ from .node import DataHolderNode
 from .node import DataNode
 from .node import OperationNode
 from .graph_document import document
+from .lazy_frame import LazyFrameEngine
+from .lazy_frame import register_lazy_frame_engine
+from .metrics import MetricsRegistry
+from .metrics import enable_metrics
+from .metrics import disable_metrics
 	
 __all__ = [
 	"GraphBuilder",
 	"DataHolderNode",
 	"DataNode",
-	"OperationNode"
-	"document"
+	"OperationNode",
+	"document",
+	"LazyFrameEngine",
+	"register_lazy_frame_engine",
+	"MetricsRegistry",
+	"enable_metrics",
+	"disable_metrics"
 	]
 	
\ No newline at end of file
@@ -0,0 +1,227 @@
+from collections import defaultdict
+
+from .utils import _activation_attributes
+
+
+def _get_plain_label(node):
+
+    label = str(node['attributes']['label'])
+
+    # record labels are of the form {label|data_dim}
+    if node['attributes']['shape'] == 'record' and label.startswith('{'):
+        label = label[1:-1].split('|')[0]
+
+    return label
+
+def get_graph_clusters(render_model, current_graph_uid):
+    """Nodes of grafted graphs (ghost nodes and their data nodes), clustered by graph"""
+
+    return {k: 'graph {}'.format(v['graph_uid']) for k, v in render_model['nodes'].items()
+            if v['graph_uid'] != current_graph_uid}
+
+def get_group_clusters(render_model):
+    """Nodes of user defined groups (G.add(func, group=...)), clustered by group,
+    largest groups first"""
+
+    groups = defaultdict(dict)
+
+    for k, v in render_model['nodes'].items():
+        if v['group'] is not None:
+            groups[v['group']][k] = 'group {}'.format(v['group'])
+
+    return sorted(groups.values(), key=len, reverse=True)
+
+def get_chain_clusters(render_model):
+    """Maximal linear chains of nodes, where each node has the next one as its only
+    child and the next node has it as its only parent"""
+
+    parents = defaultdict(set)
+    children = defaultdict(set)
+
+    for tail, head in render_model['edges']:
+        children[tail].add(head)
+        parents[head].add(tail)
+
+    def next_in_chain(node_uid):
+
+        if len(children[node_uid]) != 1:
+            return None
+
+        child_node_uid = next(iter(children[node_uid]))
+
+        if len(parents[child_node_uid]) != 1:
+            return None
+
+        return child_node_uid
+
+    chain_clusters = dict()
+    chained_node_uids = set()
+
+    for node_uid in render_model['nodes']:
+
+        if node_uid in chained_node_uids:
+            continue
+
+        # only start from the head of a chain
+        if len(parents[node_uid]) == 1 and next_in_chain(next(iter(parents[node_uid]))) == node_uid:
+            continue
+
+        chain = [node_uid]
+        while next_in_chain(chain[-1]) is not None:
+            chain.append(next_in_chain(chain[-1]))
+
+        if len(chain) < 2:
+            continue
+
+        chained_node_uids.update(chain)
+
+        for elem in chain:
+            chain_clusters[elem] = 'chain {}'.format(chain[0])
+
+    return chain_clusters
+
+def creates_cycle(render_model, member_node_uids):
+    """Whether collapsing the nodes into a single node creates a cycle, i.e. whether a
+    path leaves them and comes back through an outside node (e.g. a -> b -> c, with a
+    and c in the same group)"""
+
+    member_node_uids = set(member_node_uids)
+    children = defaultdict(list)
+
+    for tail, head in render_model['edges']:
+        children[tail].append(head)
+
+    stack = [head for tail in member_node_uids for head in children[tail] if head not in member_node_uids]
+    visited_node_uids = set(stack)
+
+    while len(stack) > 0:
+
+        for child_node_uid in children[stack.pop()]:
+
+            if child_node_uid in member_node_uids:
+                return True
+
+            if child_node_uid not in visited_node_uids:
+                visited_node_uids.add(child_node_uid)
+                stack.append(child_node_uid)
+
+    return False
+
+def collapse_render_model(render_model, clusters, graph_attributes):
+    """Collapse the nodes of each cluster (dict of node uid to cluster uid) of the
+    render model into a single node"""
+
+    if len(clusters) == 0:
+        return render_model
+
+    cluster_members = defaultdict(list)
+    for node_uid in render_model['nodes']:
+        if node_uid in clusters:
+            cluster_members[clusters[node_uid]].append(node_uid)
+
+    nodes = dict()
+
+    for node_uid, node in render_model['nodes'].items():
+
+        if node_uid not in clusters:
+            nodes[node_uid] = node
+            continue
+
+        cluster_uid = clusters[node_uid]
+
+        if cluster_uid in nodes:
+            continue
+
+        members = [render_model['nodes'][elem] for elem in cluster_members[cluster_uid]]
+        n_collapsed = sum(elem.get('n_collapsed', 1) for elem in members)
+
+        if cluster_uid.startswith('chain'):
+            label = '{} ... {} ({})'.format(_get_plain_label(members[0]), _get_plain_label(members[-1]), n_collapsed)
+        elif cluster_uid.startswith('graph'):
+            ghost_nodes = [elem for elem in members if elem['type'] == 'graph']
+            label = '{} ({})'.format(_get_plain_label(ghost_nodes[0]) if ghost_nodes else cluster_uid, n_collapsed)
+        else:
+            label = '{} ({})'.format(cluster_uid.split(' ', 1)[1], n_collapsed)
+
+        attributes = dict(label=label,
+                          shape=graph_attributes['graph_node_shape'],
+                          fontsize=graph_attributes['graph_node_fontsize'],
+                          height=graph_attributes['graph_node_shapesize'],
+                          width=graph_attributes['graph_node_shapesize'],
+                          fillcolor=graph_attributes['graph_node_color'],
+                          style='filled')
+
+        # the collapsed node is activated if any of its members is
+        attributes.update(_activation_attributes(any(elem['attributes'].get('color') == 'lawngreen' for elem in members)))
+
+        groups = set(elem['group'] for elem in members)
+
+        nodes[cluster_uid] = {'type': 'collapsed',
+                              'rank': None,
+                              'group': groups.pop() if len(groups) == 1 else None,
+                              'graph_uid': members[0]['graph_uid'],
+                              'n_collapsed': n_collapsed,
+                              'attributes': attributes}
+
+    edges = []
+    collapsed_edges = set()
+
+    for tail, head in render_model['edges']:
+
+        if tail not in clusters and head not in clusters:
+            edges.append((tail, head))
+            continue
+
+        edge = (clusters.get(tail, tail), clusters.get(head, head))
+
+        # edges inside a cluster disappear, and parallel edges between clusters are merged
+        if edge[0] == edge[1] or edge in collapsed_edges:
+            continue
+
+        collapsed_edges.add(edge)
+        edges.append(edge)
+
+    return {'nodes': nodes, 'edges': edges}
+
+def collapse_to_max_nodes(render_model, current_graph_uid, graph_attributes, max_nodes):
+    """Collapse the render model level by level until it has at most max_nodes nodes:
+
+    1. grafted graphs, one node per graph
+    2. user defined groups, largest first
+    3. linear chains
+
+    Grafted graphs and groups whose collapse would create a cycle are left as they 
+    are, and collapsing linear chains is the last level, so the result can have more
+    than max_nodes nodes.
+    """
+    if len(render_model['nodes']) <= max_nodes:
+        return render_model
+
+    def collapse_acyclic(render_model, clusters):
+
+        # skipped if it would create a cycle, which the layouts cannot draw
+        if creates_cycle(render_model, clusters):
+            return render_model
+
+        return collapse_render_model(render_model, clusters, graph_attributes)
+
+    graph_clusters = defaultdict(dict)
+
+    for node_uid, cluster_uid in get_graph_clusters(render_model, current_graph_uid).items():
+        graph_clusters[cluster_uid][node_uid] = cluster_uid
+
+    # one cluster at a time, since collapsing one can make collapsing another create a cycle
+    for clusters in graph_clusters.values():
+        render_model = collapse_acyclic(render_model, clusters)
+
+    for group_clusters in get_group_clusters(render_model):
+
+        if len(render_model['nodes']) <= max_nodes:
+            return render_model
+
+        render_model = collapse_acyclic(render_model, group_clusters)
+
+    if len(render_model['nodes']) <= max_nodes:
+        return render_model
+
+    return collapse_render_model(render_model, get_chain_clusters(render_model), graph_attributes)
@@ -0,0 +1,110 @@
+from operator import getitem
+
+from .node.operation_node import CONDITION
+
+
+class DaskLiteral(object):
+    """Task that returns a value already held by a data node.
+
+    Wrapping the value in a callable keeps Dask from interpreting it as a
+    task or as a key (e.g. a tuple whose first element is callable).
+    """
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self):
+        return self.value
+
+
+class DaskOperation(object):
+    """Task that calls the function of an op node with the values of its parent
+    data nodes, reconstructing args and kwargs from the function signature.
+    """
+    def __init__(self, function, function_signature):
+        self.function = function
+        self.function_signature = function_signature
+
+    def __call__(self, *parent_data_nodes_values):
+
+        args = []
+        kwargs = {}
+
+        for key, val in zip(self.function_signature, parent_data_nodes_values):
+
+            if key is None:
+                args.append(val)
+
+            else:
+                kwargs[key] = val
+
+        return self.function(*args, **kwargs)
+
+
+def get_dask_key(node, current_graph_uid):
+
+    # keep the same naming convention as graph_dict for nodes of grafted graphs
+    if node.graph_uid == current_graph_uid:
+        return node.node_uid
+    else:
+        return "{} from {}".format(node.node_uid, node.graph_uid)
+
+def to_dask_graph(target_nodes, current_graph_uid):
+    """Lower the op/data node structure upstream of target_nodes into a Dask task
+    graph dictionary. Data nodes holding values become literals, so already
+    computed (e.g. persisted) results are not recomputed.
+
+    Returns the task graph and the dict of dask key to node for every node in it.
+    """
+    dsk = {}
+    key_nodes = {}
+
+    stack = list(target_nodes)
+
+    while len(stack) > 0:
+
+        node = stack.pop()
+        key = get_dask_key(node, current_graph_uid)
+
+        if key in key_nodes:
+            continue
+
+        key_nodes[key] = node
+
+        if node.node_type == 'data':
+
+            if node.has_value():
+                dsk[key] = (DaskLiteral(node.value_holder.get()), )
+                continue
+
+            # a data node can only have 1 op parent node
+            parent_op_node = node.get_parent_node_weak_refs()[0]()
+            parent_op_key = get_dask_key(parent_op_node, current_graph_uid)
+
+            if parent_op_node.n_out > 1:
+                output_index = [elem() for elem in parent_op_node.get_child_node_weak_refs()].index(node)
+                dsk[key] = (getitem, parent_op_key, output_index)
+            else:
+                dsk[key] = parent_op_key
+
+            stack.append(parent_op_node)
+
+        else:
+
+            # dask runs every task of the graph
+            if node.is_branch or CONDITION in node.function_signature:
+                raise ValueError("Conditional op nodes (when=, branch) cannot be run by the dask scheduler, "
+                                 "instead got '{}'".format(node.node_uid))
+
+            # the number of elements is only known while running
+            if node.is_map:
+                raise ValueError("Map op nodes (map_over) cannot be run by the dask scheduler, "
+                                 "instead got '{}'".format(node.node_uid))
+
+            parent_data_nodes = [elem() for elem in node.get_parent_node_weak_refs()]
+            parent_data_keys = [get_dask_key(elem, current_graph_uid) for elem in parent_data_nodes]
+
+            dsk[key] = (DaskOperation(node.function, node.function_signature), *parent_data_keys)
+
+            stack.extend(parent_data_nodes)
+
+    return dsk, key_nodes
@@ -0,0 +1,322 @@
+import math
+
+from . import metrics
+from .scheduler import start_plan
+from .scheduler import get_dependents
+from .scheduler import get_unique_parent_data_nodes
+from .scheduler import is_releasable
+from .scheduler import get_stored_target_nodes
+from .scheduler import release_consumed_data_nodes
+from .scheduler import get_ready_dependents
+from .scheduler import check_ready_op_nodes
+from .scheduler import get_condition_data_nodes
+from .node.operation_node import CONDITION
+from .fusion import get_member_op_nodes
+from .memory import sizeof_value
+
+
+# how much more op nodes than the average a worker can be assigned by partition_plan
+PARTITION_SLACK = 1.1
+
+
+def get_result_key(plan, data_node):
+
+    # unique across the graphs of the plan, and across plans sharing the workers
+    return '{}/{}/{}'.format(id(plan), data_node.graph_uid, data_node.node_uid)
+
+def release_results(client, keys):
+
+    if len(keys) > 0:
+        client.release(keys)
+
+def get_data_nbytes(data_node):
+
+    # sizes are recorded on every run; unknown sizes still weigh a little, so that
+    # chains are kept together on the first run
+    return data_node.last_nbytes if data_node.last_nbytes is not None else 1
+
+def get_local_nbytes(op_node, address, locations):
+
+    # the bytes of the inputs of the op node held by the worker at address
+    return sum(get_data_nbytes(elem) for elem in get_unique_parent_data_nodes(op_node)
+               if id(elem) in locations and locations[id(elem)][0] == address)
+
+def partition_plan(plan, addresses):
+    """Assign the op nodes of the plan to workers, keeping on the same worker the op
+    nodes exchanging the most bytes (from the output sizes recorded on the data nodes),
+    while balancing the number of op nodes per worker.
+
+    This is a greedy streaming partitioning in the plan order: each op node goes to the
+    worker already assigned the largest inputs of the op node, among the workers below
+    capacity, and to the least loaded one on ties.
+    """
+    capacity = math.ceil(PARTITION_SLACK * len(plan.op_nodes) / len(addresses))
+
+    partition = dict()
+    loads = {elem: 0 for elem in addresses}
+
+    for op_node in plan.op_nodes:
+
+        input_nbytes = {elem: 0 for elem in addresses}
+
+        for parent_data_node in get_unique_parent_data_nodes(op_node):
+
+            producer = parent_data_node.get_parent_node_weak_refs()[0]() if parent_data_node.has_parent_node_weak_refs() else None
+            address = partition.get(id(producer))
+
+            if address is not None:
+                input_nbytes[address] += get_data_nbytes(parent_data_node)
+
+        candidates = [elem for elem in addresses if loads[elem] < capacity] or addresses
+        address = max(candidates, key=lambda elem: (input_nbytes[elem], -loads[elem]))
+
+        for member_op_node in get_member_op_nodes(op_node):
+            partition[id(member_op_node)] = address
+
+        loads[address] += 1
+
+    return partition
+
+
+class TransferReport(dict):
+    """Bytes moved by a distributed run:
+
+    worker_to_worker: results fetched by a worker from the worker that produced them
+    driver_to_worker: values held by the driver sent to the workers
+    worker_to_driver: persisted and target results brought back to the driver
+    local: results consumed on the worker holding them, without any transfer
+
+    along with the number of op nodes run by each worker.
+    """
+    def __init__(self, addresses):
+
+        super(TransferReport, self).__init__(worker_to_worker=0, driver_to_worker=0, worker_to_driver=0, local=0,
+                                             n_op_nodes={elem: 0 for elem in addresses})
+
+
+class DistributedExecutor(object):
+    """Run the op nodes of the plan on pyflow worker processes (see pyflow.worker),
+    one op node at a time per worker, as soon as the op nodes producing their inputs
+    are done.
+
+    The functions and the input values held by the driver are sent to the workers with
+    cloudpickle. Outputs stay on the worker that produced them: a worker running a
+    consumer fetches them directly from the producing worker. Only the outputs that are
+    persisted, shallowly persisted or targets are fetched back into their data nodes.
+    Results are released from the workers once their consumers have all run or been
+    skipped.
+
+    Placement is locality aware: when workers are free, the ready op nodes go to the
+    free worker already holding the most bytes of their inputs, then to the worker
+    partition_plan assigned them to, so that large intermediates move between workers
+    as little as possible. The bytes moved are reported in plan.transfer_report.
+    """
+    def __init__(self, workers, timing_history=None):
+
+        if not isinstance(workers, (list, tuple)) or len(workers) == 0:
+            raise ValueError("Expected workers to be a non-empty list of 'host:port' addresses, "
+                             "instead got '{}'".format(workers))
+
+        self.workers = list(workers)
+        self.timing_history = timing_history
+
+    def execute(self, plan):
+
+        for _ in self.execute_iter(plan):
+            pass
+
+    def execute_iter(self, plan):
+        """Run the plan, yielding the target data nodes once they are fetched back"""
+
+        from collections import defaultdict
+        from concurrent.futures import ThreadPoolExecutor
+        from concurrent.futures import wait
+        from concurrent.futures import FIRST_COMPLETED
+
+        from .worker import WorkerClient
+
+        # the element op nodes would be run by the workers holding the list, but the
+        # outputs are collected by the map op node on the driver
+        if len(plan.map_op_node_ids) > 0:
+            raise ValueError("Map op nodes (map_over) cannot be run by the distributed scheduler, "
+                             "instead got '{}'".format([elem.node_uid for elem in plan.op_nodes 
+                                                       if id(elem) in plan.map_op_node_ids][0]))
+
+        clients = dict()
+
+        # the (worker address, key) of the result of each data node computed by the plan
+        locations = dict()
+
+        # results to release from each worker, sent once the worker is not running an op
+        # node, so that the driver never waits on a busy connection
+        pending_releases = defaultdict(list)
+
+        plan.transfer_report = TransferReport(self.workers)
+
+        def release_result(data_node):
+
+            # released from its worker along with the next op node sent there
+            if id(data_node) in locations:
+                address, key = locations.pop(id(data_node))
+                pending_releases[address].append(key)
+
+        try:
+            for address in self.workers:
+                clients[address] = WorkerClient(address)
+
+            start_plan(plan)
+
+            remaining_dependency_counts = {k: len(v) for k, v in plan.dependencies.items()}
+            dependents = get_dependents(plan)
+
+            partition = partition_plan(plan, self.workers)
+
+            # the driver evaluates the conditions, so their values are fetched back
+            condition_data_node_ids = set(id(elem) for elem in get_condition_data_nodes(plan))
+            plan_indices = {id(elem): i for i, elem in enumerate(plan.op_nodes)}
+
+            ready_op_nodes = check_ready_op_nodes(plan, [elem for elem in plan.op_nodes if remaining_dependency_counts[elem] == 0], 
+                                                  dependents, remaining_dependency_counts, release_result=release_result)
+            free_addresses = list(self.workers)
+
+            with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+
+                futures = dict()
+
+                while len(ready_op_nodes) > 0 or len(futures) > 0:
+
+                    while len(ready_op_nodes) > 0 and len(free_addresses) > 0:
+
+                        # the pairing of a ready op node and a free worker moving the least bytes
+                        op_node, address = max(
+                            [(op_node, address) for op_node in ready_op_nodes for address in free_addresses],
+                            key=lambda elem: (get_local_nbytes(elem[0], elem[1], locations),
+                                              partition[id(get_member_op_nodes(elem[0])[0])] == elem[1],
+                                              -plan_indices[id(elem[0])]))
+
+                        ready_op_nodes.remove(op_node)
+                        free_addresses.remove(address)
+
+                        release_results(clients[address], pending_releases.pop(address, []))
+
+                        run_arguments = self.get_run_arguments(plan, op_node, address, locations)
+                        futures[executor.submit(clients[address].run, *run_arguments)] = (op_node, address)
+
+                    done_futures, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+                    for future in done_futures:
+
+                        op_node, address = futures.pop(future)
+                        free_addresses.append(address)
+
+                        try:
+                            result = future.result()
+                        except BaseException:
+                            for elem in futures:
+                                elem.cancel()
+                            raise
+
+                        self.finish_op_node(plan, op_node, address, result, clients, locations, release_result, 
+                                            condition_data_node_ids)
+
+                        # the op nodes skipped as a result release their inputs as well
+                        ready_op_nodes += get_ready_dependents(plan, op_node, dependents, remaining_dependency_counts, 
+                                                               release_result=release_result)
+
+                        yield from get_stored_target_nodes(plan, op_node)
+
+        finally:
+
+            # the results left on the workers, e.g. the targets, or after an error
+            for address, key in locations.values():
+                pending_releases[address].append(key)
+
+            try:
+                for address, client in clients.items():
+                    release_results(client, pending_releases.pop(address, []))
+            finally:
+                for client in clients.values():
+                    client.close()
+
+    def get_run_arguments(self, plan, op_node, address, locations):
+
+        member_op_nodes = get_member_op_nodes(op_node)
+
+        # the functions of the chain, with the name each one takes the previous output by
+        functions = [(elem.function, elem.function_signature[0] if i > 0 else None)
+                     for i, elem in enumerate(member_op_nodes)]
+
+        inputs = []
+
+        for name, parent_data_node_weak_ref in zip(member_op_nodes[0].function_signature,
+                                                   op_node.get_parent_node_weak_refs()):
+
+            # conditions are evaluated by the driver
+            if name == CONDITION:
+                continue
+
+            parent_data_node = parent_data_node_weak_ref()
+
+            if id(parent_data_node) in locations:
+
+                inputs.append((name, ('ref',) + locations[id(parent_data_node)]))
+
+                if locations[id(parent_data_node)][0] == address:
+                    plan.transfer_report['local'] += get_data_nbytes(parent_data_node)
+                else:
+                    plan.transfer_report['worker_to_worker'] += get_data_nbytes(parent_data_node)
+
+            else:
+
+                value = parent_data_node.get()
+                inputs.append((name, ('value', value)))
+
+                plan.transfer_report['driver_to_worker'] += (
+                    parent_data_node.nbytes if parent_data_node.nbytes is not None else sizeof_value(value))
+
+        output_keys = [None if id(elem()) in plan.unneeded_data_node_ids else get_result_key(plan, elem())
+                       for elem in op_node.get_child_node_weak_refs()]
+
+        plan.transfer_report['n_op_nodes'][address] += len(member_op_nodes)
+
+        return functions, inputs, output_keys, op_node.n_out
+
+    def finish_op_node(self, plan, op_node, address, result, clients, locations, release_result, 
+                       condition_data_node_ids=frozenset()):
+
+        if len(get_member_op_nodes(op_node)) > 1:
+            op_node.durations = result['durations']
+
+        if self.timing_history is not None:
+            self.timing_history.record(op_node, sum(result['durations']))
+
+        if metrics.METRICS_REGISTRY is not None:
+            metrics.METRICS_REGISTRY.record_op_node(op_node, sum(result['durations']))
+
+        for child_data_node_weak_ref in op_node.get_child_node_weak_refs():
+
+            child_data_node = child_data_node_weak_ref()
+
+            if id(child_data_node) in plan.unneeded_data_node_ids:
+                continue
+
+            key = get_result_key(plan, child_data_node)
+
+            locations[id(child_data_node)] = (address, key)
+            child_data_node.last_nbytes = result['nbytes'][key]
+
+            # the values needed after the run, or to evaluate conditions, are brought back
+            # to the driver
+            if not is_releasable(plan, child_data_node) or id(child_data_node) in condition_data_node_ids:
+
+                child_data_node.set_value(clients[address].get(key))
+                plan.transfer_report['worker_to_driver'] += child_data_node.last_nbytes
+
+                if child_data_node.is_persisted():
+                    child_data_node.graph_dict.set_node_property(
+                        child_data_node.node_uid, 'data_dim', child_data_node.get_persisted_data_dim_as_str())
+
+        release_consumed_data_nodes(plan, op_node, release_result=release_result)
+
+        op_node.deactivate()
+
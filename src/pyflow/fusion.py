@@ -0,0 +1,172 @@
+class FusedOperationNode(object):
+    """A maximal linear chain of op nodes of a plan, run as one composite call.
+
+    Each op node of the chain, but the last, has a single output data node consumed
+    only by the next op node of the chain, as its only input. These intermediate
+    data nodes are never materialized: the output value of an op node is passed
+    directly to the next one. To the executors, the fused op node looks like an op
+    node with the inputs of the first op node and the outputs of the last one.
+    """
+    def __init__(self, op_nodes):
+
+        self.op_nodes = op_nodes
+
+        self.node_type = 'operation'
+        self.graph_uid = op_nodes[-1].graph_uid
+        self.node_uid = '+'.join(elem.node_uid for elem in op_nodes)
+        self.n_out = op_nodes[-1].n_out
+
+        # durations of the op nodes of the chain, measured by compute
+        self.durations = []
+
+    def get_parent_node_weak_refs(self):
+
+        return self.op_nodes[0].get_parent_node_weak_refs()
+
+    def get_child_node_weak_refs(self):
+
+        return self.op_nodes[-1].get_child_node_weak_refs()
+
+    @property
+    def output_nbytes(self):
+
+        return getattr(self.op_nodes[-1], 'output_nbytes', None)
+
+    @output_nbytes.setter
+    def output_nbytes(self, output_nbytes):
+
+        self.op_nodes[-1].output_nbytes = output_nbytes
+
+    def activate(self):
+
+        # only the first op node consumes materialized data nodes, where the
+        # activated consumers are counted
+        self.op_nodes[0].activate()
+
+    def deactivate(self):
+
+        self.op_nodes[0].deactivate()
+
+    def is_activated(self):
+
+        return self.op_nodes[0].is_activated()
+
+    def gather_parent_values(self):
+
+        return self.op_nodes[0].gather_parent_values()
+
+    def compute(self, args, kwargs):
+
+        import time
+
+        durations = []
+
+        for i, op_node in enumerate(self.op_nodes):
+
+            # the single output of the previous op node is the single input of this
+            # one, passed by position or by name as in its function signature
+            if i > 0:
+                if op_node.function_signature[0] is None:
+                    args, kwargs = [output_values], {}
+                else:
+                    args, kwargs = [], {op_node.function_signature[0]: output_values}
+
+            start_time = time.perf_counter()
+            output_values = op_node.compute(args, kwargs)
+            durations.append(time.perf_counter() - start_time)
+
+        self.durations = durations
+
+        return output_values
+
+    def store_output_values(self, output_values, unneeded_data_node_ids=frozenset()):
+
+        self.op_nodes[-1].store_output_values(output_values, unneeded_data_node_ids)
+
+    def __repr__(self):
+
+        return 'FusedOperationNode({})'.format(self.node_uid)
+
+
+def get_member_op_nodes(op_node):
+
+    if isinstance(op_node, FusedOperationNode):
+        return op_node.op_nodes
+
+    return [op_node]
+
+def is_fusable(plan, op_node, next_op_node):
+    """Whether the output of op_node can be passed directly to next_op_node"""
+
+    if op_node.n_out != 1 or len(op_node.get_child_node_weak_refs()) != 1:
+        return False
+
+    # map op nodes are expanded into element op nodes while running
+    if op_node.is_map or next_op_node.is_map:
+        return False
+
+    data_node = op_node.get_child_node_weak_refs()[0]()
+
+    # the intermediate value must not be needed anywhere else
+    if (data_node.is_persisted() or data_node.is_shallowly_persisted()
+        or id(data_node) in plan.target_node_ids):
+        return False
+
+    data_node.remove_dead_child_nodes()
+
+    if len(data_node.get_child_node_weak_refs()) != 1:
+        return False
+
+    parent_node_weak_refs = next_op_node.get_parent_node_weak_refs()
+
+    return len(parent_node_weak_refs) == 1 and parent_node_weak_refs[0]() is data_node
+
+def fuse_plan(plan):
+    """Return a plan where the maximal linear chains of op nodes of the given plan are
+    replaced by fused op nodes."""
+
+    from .scheduler import ExecutionPlan
+
+    plan_op_node_ids = set(id(elem) for elem in plan.op_nodes)
+
+    def get_next_op_node(op_node):
+
+        if len(op_node.get_child_node_weak_refs()) != 1:
+            return None
+
+        child_op_node_weak_refs = op_node.get_child_node_weak_refs()[0]().get_child_node_weak_refs()
+
+        if len(child_op_node_weak_refs) != 1:
+            return None
+
+        next_op_node = child_op_node_weak_refs[0]()
+
+        if id(next_op_node) not in plan_op_node_ids or not is_fusable(plan, op_node, next_op_node):
+            return None
+
+        return next_op_node
+
+    fused_op_node_ids = set()
+    op_nodes = []
+
+    # in the plan order, the head of a chain comes before the rest of it
+    for op_node in plan.op_nodes:
+
+        if id(op_node) in fused_op_node_ids:
+            continue
+
+        chain = [op_node]
+        next_op_node = get_next_op_node(op_node)
+
+        while next_op_node is not None:
+            chain.append(next_op_node)
+            next_op_node = get_next_op_node(next_op_node)
+
+        if len(chain) == 1:
+            op_nodes.append(op_node)
+            continue
+
+        fused_op_node_ids.update(id(elem) for elem in chain)
+        op_nodes.append(FusedOperationNode(chain))
+
+    return ExecutionPlan(op_nodes, plan.data_nodes, plan.target_nodes)
@@ -1,29 +1,57 @@
 from .node import DataNode
 from .node import OperationNode
+from .node import MapOperationNode
+from .node.operation_node import CONDITION
 from .utils import ExtendedRef
-from .utils import view_full
-from .utils import view_summary
+from .utils import GraphDict
+from .utils import view_graph
+from .utils import get_render_model
+from .utils import is_dot_available
 from .utils import save_graph_image
 from .utils import contains_return_statement
-from .utils import topological_sort
-from .utils import preprocess_graph_dict
+from .utils import get_raw_input_key
 from .utils import query_dict_with_partial_key
-from .utils import format_Warning
 from .utils import Ambiguous_Node_Name_Warning
+from .layout import view_layered
+from .layout import LayeredGraph
+from .dask_backend import to_dask_graph
+from .dask_backend import get_dask_key
+from .scheduler import build_plan
+from .scheduler import is_releasable
+from .fusion import fuse_plan
+from .scheduler import SequentialExecutor
+from .scheduler import ThreadedExecutor
+from .distributed import DistributedExecutor
+from .groups import GroupPlan
+from .groups import run_groups
+from .timings import OpTimingHistory
+from .memory import MemoryLedger
+from .serialization import get_ancestor_closure
+from .serialization import pack_nodes
+from .serialization import unpack_nodes
+from .serialization import dumps
+from .serialization import loads
 # from .utils import add_to_module_global_namespace
 
-from collections import defaultdict
-from collections import Iterable
 import sys
 import copy
+import os
 import warnings
 
  
 MAX_INTEGER = sys.maxsize 
 
+# above this many rendered nodes, view falls back to the built-in layered layout
+MAX_DOT_NODES = 2000
+
+def branch(predicate, then, otherwise):
+    """The function of the op nodes added by GraphBuilder.branch"""
+    return then if predicate else otherwise
+
 class GraphBuilder():
     
-    def __init__(self, alias=None, persist=False, verbose=False, inside_pandasUDF=None):#, shared_args=dict()):
+    def __init__(self, alias=None, persist=False, verbose=False, inside_pandasUDF=None, max_dot_nodes=MAX_DOT_NODES, timings_filepath=None, 
+                 memory_ceiling=None, on_memory_ceiling='warn', dedupe=False, deep_memory_sizing=False):#, shared_args=dict()):
 
         if not (isinstance(alias, str) or alias is None):
             raise TypeError("[ alias ] must be either None or string type")
@@ -34,6 +62,25 @@ class GraphBuilder():
         if not isinstance(verbose, bool):
             raise TypeError("[ verbose ] must be bool type")
 
+        if not isinstance(max_dot_nodes, int):
+            raise TypeError("[ max_dot_nodes ] must be int type")
+
+        if not (isinstance(timings_filepath, str) or timings_filepath is None):
+            raise TypeError("[ timings_filepath ] must be either None or string type")
+
+        if not (isinstance(memory_ceiling, int) or memory_ceiling is None):
+            raise TypeError("[ memory_ceiling ] must be either None or int type")
+
+        if on_memory_ceiling not in ['warn', 'raise']:
+            raise ValueError("Expected on_memory_ceiling to be 'warn' or 'raise', "
+                             "instead got '{}'".format(on_memory_ceiling))
+
+        if not isinstance(dedupe, bool):
+            raise TypeError("[ dedupe ] must be bool type")
+
+        if not isinstance(deep_memory_sizing, bool):
+            raise TypeError("[ deep_memory_sizing ] must be bool type")
+
         self.graph_alias = alias or "graph"
         self.graph_uid = "{}_{}".format(self.graph_alias, id(self))
 
@@ -42,7 +89,7 @@ class GraphBuilder():
         
         self.node_count = 0
         self.strong_ref_dict = {}
-        self.graph_dict = defaultdict(dict)
+        self.graph_dict = GraphDict()
 
         self.default_graph_attributes = {
             'data_node_fontsize': 10, 
@@ -62,13 +109,42 @@ class GraphBuilder():
 
         self.inside_pandasUDF = inside_pandasUDF
 
+        self.max_dot_nodes = max_dot_nodes
+
+        # durations of the op nodes across runs, used to schedule the critical path first
+        self.timing_history = OpTimingHistory(timings_filepath)
+
+        # bytes held by the values of the data nodes of this graph. The python objects
+        # of pandas object columns are only measured with deep_memory_sizing, since 
+        # measuring them takes time proportional to the number of rows on every store
+        self.memory_ledger = MemoryLedger(memory_ceiling, on_memory_ceiling, self.graph_alias, deep_memory_sizing)
+
+        # with dedupe, adding the same function on the same inputs again returns the
+        # output data nodes of the existing op node, whose uid is kept here by key
+        self.dedupe = dedupe
+        self.dedupe_dict = dict()
+
+        # the bytes moved between the driver and the workers by the last distributed run
+        self.last_transfer_report = None
+
+        # strong references to the nodes of grafted graphs shipped along with this graph
+        # when it was pickled, which no other graph holds once unpickled
+        self.external_nodes = []
+
         # if not isinstance(shared_args, dict):
         #     raise TypeError("shared_args must be a dictionary. Instead received {}".format(shared_args))
         # self.shared_args = shared_args
     
-    def add(self, func, method_alias=None, output_alias=None, n_out=1, persist=False, rank=None, color=None, shape=None, fontsize=None):
+    def add(self, func, method_alias=None, output_alias=None, n_out=1, persist=False, rank=None, color=None, shape=None, fontsize=None, group=None, 
+            when=None):
+        """when=data_node runs the op node only if the value of data_node is truthy. 
+        Otherwise the op node is skipped, along with the op nodes consuming its outputs,
+        whose values are then None."""
 
         # add_to_module_global_namespace(func, self.shared_args)
+
+        if not (when is None or (isinstance(when, ExtendedRef) and isinstance(when(), DataNode))):
+            raise TypeError("[ when ] must be either None or a data node")
         
         self.func = func
         self.method_alias = method_alias
@@ -90,11 +166,108 @@ class GraphBuilder():
         self.color = color
         self.shape = shape
         self.fontsize = fontsize
-        
+
+        # op nodes of the same group can be collapsed into one node by view
+        self.group = group
+
+        self.when = when
+
+        self.op_node_class = OperationNode
+
         return self
+
+    def map_over(self, func, method_alias=None, output_alias=None, persist=False, rank=None, color=None, shape=None, 
+                 fontsize=None, group=None, when=None):
+        """Like add, for a function called on every element of the list passed as the
+        first argument, along with the other arguments. The output data node holds the 
+        list of the outputs for each element.
+
+        The op node is expanded when run into one op node per element, which the 
+        executors run like any other op node (in parallel with scheduler='threads'), 
+        and whose inputs and outputs are released, and durations recorded, as usual."""
+
+        self.add(func, method_alias, output_alias, 1, persist, rank, color, shape, fontsize, group, when)
+        self.op_node_class = MapOperationNode
+
+        return self
+
+    def source(self, loader, *args, output_alias=None, persist=False, **kwargs):
+        """Add a source data node holding only the loader callable and its arguments
+        (e.g. np.load with a file path and mmap_mode='r', or a query function),
+        instead of a raw input value persisted for the lifetime of the graph.
+
+        The value is loaded when first needed and released like any other output once
+        its consumers have run (unless persist=True), and loaded again if needed later.
+        """
+        if not callable(loader):
+            raise TypeError("[ loader ] must be callable")
+
+        def load():
+            return loader(*args, **kwargs)
+
+        # loaders are shown and timed under their own names
+        load.__name__ = getattr(loader, '__name__', type(loader).__name__)
+        load.__qualname__ = getattr(loader, '__qualname__', load.__name__)
+        load.__module__ = getattr(loader, '__module__', None)
+        load.__doc__ = getattr(loader, '__doc__', None)
+
+        return self.add(load, output_alias=output_alias, persist=persist)()
     
+    def branch(self, predicate, then, otherwise, output_alias=None, persist=False):
+        """Add a data node holding the value of then if the value of predicate is truthy,
+        or else the value of otherwise. Only the op nodes needed by the picked side are 
+        run: those only computing the other side are skipped, as if added with when=."""
+
+        if not (isinstance(predicate, ExtendedRef) and isinstance(predicate(), DataNode)):
+            raise TypeError("[ predicate ] must be a data node")
+
+        data_node_weak_ref = self.add(branch, output_alias=output_alias, persist=persist)(predicate, then, otherwise)
+        data_node_weak_ref().get_parent_node_weak_refs()[0]().is_branch = True
+
+        return data_node_weak_ref
+
+    def placeholder(self, alias=None):
+        """Add an input data node without value, standing for the value each run binds
+        to it, e.g. every group of a DataFrame in apply_groups."""
+
+        if not (isinstance(alias, str) or alias is None):
+            raise TypeError("[ alias ] must be either None or string type")
+
+        data_node_uid = '{}_{}'.format(alias or 'data', self.node_count)
+
+        self.strong_ref_dict[data_node_uid] = DataNode(
+            graph_uid=self.graph_uid, 
+            graph_alias=self.graph_alias, 
+            node_uid=data_node_uid, 
+            verbose=self.verbose, 
+            alias=alias,
+            graph_dict=self.graph_dict, 
+            memory_ledger=self.memory_ledger)
+        self.node_count += 1
+
+        return ExtendedRef(self.strong_ref_dict[data_node_uid])
+
     def __call__(self, *args, **kwargs):
 
+        dedupe_key = None
+
+        if self.op_node_class is MapOperationNode and len(args) == 0:
+            raise ValueError("Expected the list to map over as the first positional argument, "
+                             "instead got '{}'".format(args))
+
+        # the condition is a parent data node not passed to the function
+        if self.when is not None:
+            kwargs = dict(kwargs, **{CONDITION: self.when})
+
+        # op nodes without outputs are only run for their side effects, so they are
+        # never deduplicated
+        if self.dedupe and (self.inside_pandasUDF or contains_return_statement(self.func)):
+
+            dedupe_key = self._get_dedupe_key(args, kwargs)
+
+            if dedupe_key in self.dedupe_dict:
+                return self._reuse_op_node(self.strong_ref_dict[self.dedupe_dict[dedupe_key]])
+
         # Create/update the graph using doubly linked list data structure
 
         op_node_uid = '{}_{}'.format(self.method_alias or self.func.__name__, self.node_count)
@@ -116,7 +289,7 @@ class GraphBuilder():
             input_names.append(key)
 
         # create op node to hold the input function method
-        self.strong_ref_dict[op_node_uid] = OperationNode(
+        self.strong_ref_dict[op_node_uid] = self.op_node_class(
             graph_uid=self.graph_uid, 
             graph_alias=self.graph_alias, 
             node_uid=op_node_uid, 
@@ -159,7 +332,8 @@ class GraphBuilder():
                     node_uid=parent_data_node_uid, 
                     persist=persist_this_node, 
                     verbose=self.verbose,
-                    graph_dict=self.graph_dict)
+                    graph_dict=self.graph_dict, 
+                    memory_ledger=self.memory_ledger)
                 data_node_weak_ref = ExtendedRef(self.strong_ref_dict[parent_data_node_uid])
                 self.node_count += 1
 
@@ -191,7 +365,8 @@ class GraphBuilder():
                 verbose=self.verbose, 
                 persist=persist_this_node, 
                 alias=self.output_alias[i],
-                graph_dict=self.graph_dict)
+                graph_dict=self.graph_dict, 
+                memory_ledger=self.memory_ledger)
             data_node_weak_ref = ExtendedRef(self.strong_ref_dict[child_data_node_uid])
             self.node_count += 1  
 
@@ -209,7 +384,8 @@ class GraphBuilder():
                                       'color': self.color, 
                                       'shape': self.shape,
                                       'fontsize': self.fontsize,
-                                      'shapesize': None}
+                                      'shapesize': None,
+                                      'group': self.group}
 
         method_attributes_dict = {'name': self.func.__name__, 
                                   'doc_string': self.func.__doc__}
@@ -347,6 +523,9 @@ class GraphBuilder():
 
             # make the op node point to the child data node
             self.graph_dict[op_node_weak_ref().node_uid]['children'].append(child_data_node_weak_ref().node_uid)
+
+        if dedupe_key is not None:
+            self.dedupe_dict[dedupe_key] = op_node_uid
                 
         if self.n_out > 1:
             return op_node_weak_ref().child_node_weak_refs
@@ -356,7 +535,37 @@ class GraphBuilder():
             else:
                 return op_node_weak_ref().child_node_weak_refs[0]
 
-    def run(self, *args, summary=False):    
+    def _get_dedupe_key(self, args, kwargs):
+
+        # data nodes are identified by their uids, raw inputs by their value or identity
+        input_keys = []
+
+        for key, val in [(None, elem) for elem in args] + list(kwargs.items()):
+
+            if isinstance(val, ExtendedRef) and isinstance(val(), DataNode):
+                input_keys.append((key, 'node', val().graph_uid, val().node_uid, id(val())))
+            else:
+                input_keys.append((key, get_raw_input_key(val)))
+
+        # the function object is kept alive by the key, so its identity is stable
+        return (self.func, tuple(input_keys), self.n_out, self.op_node_class)
+
+    def _reuse_op_node(self, op_node):
+
+        # the outputs are persisted if the new addition asks for it
+        if self.persist or self.func_persist:
+
+            for child_data_node_weak_ref in op_node.child_node_weak_refs:
+
+                child_data_node_weak_ref().persist()
+                self.graph_dict.set_node_property(child_data_node_weak_ref().node_uid, 'is_persisted', True)
+
+        if self.n_out > 1:
+            return op_node.child_node_weak_refs
+        else:
+            return op_node.child_node_weak_refs[0]
+
+    def _get_requested_nodes(self, args):
 
         requested_op_nodes = []
         requested_data_nodes = []
@@ -385,23 +594,276 @@ class GraphBuilder():
             elif requested_node[0][1].node_type=='operation':
                 requested_op_nodes.append(requested_node[0])
 
+        return requested_op_nodes, requested_data_nodes
+
+    def _get_terminal_nodes(self):
+        """The nodes whose results are kept after running every op node of this graph:
+        op nodes without output, and data nodes that are persisted or not consumed by 
+        any op node of this graph.
+        """
+        terminal_nodes = []
+
+        for k, v in self.strong_ref_dict.items():
+
+            if v.node_type != 'operation':
+                continue
+
+            if not v.has_child_node_weak_refs():
+                terminal_nodes.append(v)
+
+            for child_data_node_weak_ref in v.get_child_node_weak_refs():
+
+                child_data_node = child_data_node_weak_ref()
+                child_data_node.remove_dead_child_nodes()
+
+                is_consumed = any(elem().graph_uid == self.graph_uid 
+                                  for elem in child_data_node.get_child_node_weak_refs())
+
+                if (not is_consumed) or child_data_node.is_persisted() or child_data_node.is_shallowly_persisted():
+                    terminal_nodes.append(child_data_node)
+
+        return terminal_nodes
+
+    def to_dask(self, *args):
+        """Lower the computation upstream of the requested nodes into a Dask task graph.
+        With no nodes requested, every op node of this graph is lowered.
+
+        Returns the task graph dictionary along with the keys of the requested nodes, 
+        which can be passed to any Dask scheduler, e.g. dask.threaded.get(dsk, keys).
+        """
+        if len(args) == 0:
+            target_nodes = self._get_terminal_nodes()
+        else:
+            target_nodes = []
+            for elem in args:
+                requested_op_nodes, requested_data_nodes = self._get_requested_nodes([elem])
+                target_nodes += [v for k, v in requested_data_nodes + requested_op_nodes]
+
+        dsk, key_nodes = to_dask_graph(target_nodes, self.graph_uid)
+        keys = [get_dask_key(elem, self.graph_uid) for elem in target_nodes]
+
+        return dsk, keys
+
+    def _run_dask(self, dask_get=None):
+
+        if dask_get is None:
+
+            try:
+                from dask.threaded import get as dask_get
+            except ModuleNotFoundError:
+                raise ModuleNotFoundError("To use the dask scheduler, please install dask:\n\npip install dask")
+
+        target_nodes = self._get_terminal_nodes()
+        dsk, key_nodes = to_dask_graph(target_nodes, self.graph_uid)
+
+        # besides the terminal nodes, the persisted data nodes of any graph need to hold
+        # their values once the computation is done
+        target_keys = [get_dask_key(elem, self.graph_uid) for elem in target_nodes]
+        target_keys += [k for k, v in key_nodes.items() if v.node_type == 'data' and not v.has_value() 
+                        and (v.is_persisted() or v.is_shallowly_persisted()) and k not in target_keys]
+
+        output_values = dask_get(dsk, target_keys)
+
+        for key, output_value in zip(target_keys, output_values):
+
+            node = key_nodes[key]
+
+            if node.node_type != 'data' or node.has_value():
+                continue
+
+            node.set_value(output_value)
+
+            if node.is_persisted():
+                node.graph_dict.set_node_property(node.node_uid, 'data_dim', node.get_persisted_data_dim_as_str())
+
+    def plan(self, *args, fuse=False):
+        """Build the execution plan computing the requested nodes, or with no nodes 
+        requested, every op node of this graph. The plan spans every graph the 
+        requested nodes depend on, so grafted graphs are scheduled along with this one.
+
+        With fuse=True, linear chains of op nodes are fused (see run).
+        """
+        if not isinstance(fuse, bool):
+            raise TypeError("[ fuse ] must be bool type")
+
+        if len(args) == 0:
+            target_nodes = self._get_terminal_nodes()
+        else:
+            requested_op_nodes, requested_data_nodes = self._get_requested_nodes(args)
+            target_nodes = [v for k, v in requested_data_nodes + requested_op_nodes]
+
+        plan = build_plan(target_nodes)
+
+        return fuse_plan(plan) if fuse else plan
+
+    def _get_executor(self, scheduler, max_workers, order, memory_budget, workers=None):
+
+        if scheduler == 'threads':
+            return ThreadedExecutor(max_workers, order, memory_budget, self.timing_history)
+        elif scheduler == 'distributed':
+            return DistributedExecutor(workers, self.timing_history)
+        else:
+            # a single op node runs at a time, so the budget can only be honored through the order
+            return SequentialExecutor('memory' if memory_budget is not None else order, self.timing_history)
+
+    def run(self, *args, summary=False, scheduler=None, dask_get=None, max_workers=None, order=None, memory_budget=None, fuse=False, 
+            workers=None):
+        """scheduler can be None (op nodes run one after the other), 'threads' (independent
+        op nodes run concurrently in a pool of max_workers threads), 'distributed' (op nodes
+        run on the pyflow worker processes at the 'host:port' addresses of workers, see 
+        pyflow.worker) or 'dask'.
+
+        order='memory' runs first the ready op nodes increasing the live memory the least, 
+        freeing large intermediates early. memory_budget (bytes) also throttles the launches 
+        of the 'threads' scheduler to keep the estimated live memory under the budget.
+
+        order='critical_path' launches first the ready op nodes with the longest chain of 
+        op nodes depending on them, weighted by their durations recorded in earlier runs.
+
+        fuse=True runs every linear chain of op nodes, where each output is consumed only 
+        by the next op node as its single input and is neither persisted nor requested, 
+        as one composite call: the intermediate values are passed directly from one 
+        function to the next and never stored in their data nodes."""
+
+        if scheduler not in [None, 'threads', 'distributed', 'dask']:
+            raise ValueError("Expected scheduler to be None, 'threads', 'distributed' or 'dask', "
+                             "instead got '{}'".format(scheduler))
+
+        if scheduler == 'distributed' and (order is not None or memory_budget is not None):
+            raise ValueError("order and memory_budget can only be used with the None and 'threads' schedulers")
+
+        if not isinstance(fuse, bool):
+            raise TypeError("[ fuse ] must be bool type")
+
+        requested_op_nodes, requested_data_nodes = self._get_requested_nodes(args)
+
         for k, v in requested_data_nodes:
             v.shallowly_persist()
-        
-        op_nodes = [(k, v) for k, v in self.strong_ref_dict.items() if v.node_type == 'operation']
 
-        for k, v in op_nodes:
-            v.activate()
-        
-        for k, v in op_nodes:
-            v.run()
+        if scheduler == 'dask':
+
+            # dask_get can be any dask scheduler get function, e.g. dask.multiprocessing.get
+            # or the get method of a dask.distributed Client
+            self._run_dask(dask_get)
+
+        else:
+
+            # a single plan over this graph and the grafted graphs it depends on
+            target_nodes = self._get_terminal_nodes() + [v for k, v in requested_data_nodes]
+            plan = build_plan(target_nodes)
+
+            if fuse:
+                plan = fuse_plan(plan)
+
+            self._get_executor(scheduler, max_workers, order, memory_budget, workers).execute(plan)
+
+            if scheduler == 'distributed':
+                self.last_transfer_report = plan.transfer_report
+            self.timing_history.save()
         
         if len(requested_data_nodes) == 1:
             return requested_data_nodes[0][1].get()
         else:
             return [requested_data_node[1].get() for requested_data_node in requested_data_nodes]
 
-    def view_dependency(self, *args, summary=True, verbose=False, gap=None):
+    def run_iter(self, *args, scheduler=None, max_workers=None, order=None, memory_budget=None, fuse=False, workers=None):
+        """Run the op nodes the requested data nodes depend on, like run_only, and yield
+        (data node, value) pairs as soon as each requested data node is computed, in the
+        order they complete with the 'threads' and 'distributed' schedulers. Data nodes
+        already holding values are yielded first.
+
+        The values are released once yielded, unless persisted, requested from an earlier
+        run, or still needed by op nodes of the run (then released after them), so that
+        a consumer handling each value as it arrives keeps the peak memory low. Data 
+        nodes skipped by their conditions (see add when=) are not yielded.
+        See run for the other parameters ('dask' is not supported).
+        """
+        if scheduler not in [None, 'threads', 'distributed']:
+            raise ValueError("Expected scheduler to be None, 'threads' or 'distributed', "
+                             "instead got '{}'".format(scheduler))
+
+        if scheduler == 'distributed' and (order is not None or memory_budget is not None):
+            raise ValueError("order and memory_budget can only be used with the None and 'threads' schedulers")
+
+        if not isinstance(fuse, bool):
+            raise TypeError("[ fuse ] must be bool type")
+
+        requested_op_nodes, requested_data_nodes = self._get_requested_nodes(args)
+        executor = self._get_executor(scheduler, max_workers, order, memory_budget, workers)
+
+        # the arguments are checked above, when run_iter is called, rather than when
+        # the first value is asked for
+        return self._run_iter(requested_op_nodes, requested_data_nodes, executor, fuse, scheduler)
+
+    def _run_iter(self, requested_op_nodes, requested_data_nodes, executor, fuse, scheduler):
+
+        plan = build_plan([v for k, v in requested_data_nodes + requested_op_nodes])
+
+        if fuse:
+            plan = fuse_plan(plan)
+
+        for k, v in requested_data_nodes:
+            if v.has_value():
+                yield ExtendedRef(v), v.get()
+
+        for data_node in executor.execute_iter(plan):
+
+            yield ExtendedRef(data_node), data_node.get()
+
+            # no longer kept as a target: released now, or by the executor once the
+            # op nodes consuming it have run
+            plan.target_node_ids.discard(id(data_node))
+
+            if plan.consumer_counts.get(id(data_node), 0) == 0 and is_releasable(plan, data_node):
+                data_node.release_memory()
+
+        if scheduler == 'distributed':
+            self.last_transfer_report = plan.transfer_report
+        self.timing_history.save()
+
+    def apply_groups(self, df, by, input, targets, max_workers=None, chunksize=1, fuse=False):
+        """Compute the targets once per group of df.groupby(by), with each group bound to 
+        the input placeholder (see placeholder), and return the outputs of every target 
+        concatenated across the groups under the group keys, like groupby.apply (values 
+        other than DataFrames and Series are returned as a Series indexed by the group keys).
+
+        The plan is built once, shipped once to each of max_workers worker processes, and
+        run there for every group, instead of rebuilding the graph per group (e.g. in a 
+        pandas UDF). With max_workers=1, the groups are run in this process. chunksize
+        groups are sent to a worker process at a time. The graph itself is left unchanged.
+        """
+        if not (isinstance(input, ExtendedRef) and isinstance(input(), DataNode) 
+                and not input().has_parent_node_weak_refs()):
+            raise TypeError("[ input ] must be a placeholder data node")
+
+        if not (isinstance(max_workers, int) or max_workers is None):
+            raise TypeError("[ max_workers ] must be either None or int type")
+
+        if not isinstance(chunksize, int):
+            raise TypeError("[ chunksize ] must be int type")
+
+        if not isinstance(fuse, bool):
+            raise TypeError("[ fuse ] must be bool type")
+
+        is_single_target = not isinstance(targets, (list, tuple))
+
+        _, requested_data_nodes = self._get_requested_nodes([targets] if is_single_target else targets)
+        target_nodes = [v for k, v in requested_data_nodes]
+
+        plan = build_plan(target_nodes)
+
+        if id(input()) not in set(id(elem) for elem in plan.data_nodes):
+            raise ValueError("Expected targets depending on the placeholder {}, "
+                             "instead got '{}'".format(input().node_uid, [elem.node_uid for elem in target_nodes]))
+
+        if fuse:
+            plan = fuse_plan(plan)
+
+        outputs = run_groups(GroupPlan(plan, input(), target_nodes), df, by, max_workers, chunksize)
+
+        return outputs[0] if is_single_target else outputs
+
+    def view_dependency(self, *args, summary=True, verbose=False, gap=None, engine=None, output='svg', max_nodes=None):
 
         if gap is not None:
             graph_attributes = {'graph_ranksep': gap}
@@ -446,23 +908,9 @@ class GraphBuilder():
             all_dependency_ancestor_node_uids.update(dependency_ancestor_node_uids)
             all_dependency_ancestor_node_uids.update([k])
 
-        graph_dict_copied = copy.deepcopy(self.graph_dict)
-
-        all_dependency_ancestor_node_uids = list(all_dependency_ancestor_node_uids)
-
-        for dependency_ancestor_node_uid in all_dependency_ancestor_node_uids:
-            
-            graph_dict_copied[dependency_ancestor_node_uid]['is_activated'] = True
-
-        preprocessed_graph_dict = preprocess_graph_dict(graph_dict_copied, self.graph_uid, self.graph_attributes, True)
-
-        if summary:
-
-            return view_summary(preprocessed_graph_dict, self._graph_attributes(), verbose=verbose, current_graph_uid=self.graph_uid)
-
-        else:
-            
-            return view_full(preprocessed_graph_dict, self._graph_attributes(), verbose=verbose, current_graph_uid=self.graph_uid)
+        # the activation is overlaid on the graph without copying it
+        return self._view(summary, verbose, engine, output, max_nodes, 
+                          activated_node_uids=all_dependency_ancestor_node_uids, activate_ext_graph=True)
 
     def run_only(self, *args, view_dependency=False, summary=True, verbose=False, gap=None):
 
@@ -470,32 +918,7 @@ class GraphBuilder():
             graph_attributes = {'graph_ranksep': gap}
             self.update_graph_attributes(graph_attributes)
 
-        requested_op_nodes = []
-        requested_data_nodes = []
-
-        for elem in args:
-            
-            if isinstance(elem, str):
-                
-                requested_node = query_dict_with_partial_key(self.strong_ref_dict, elem)
-
-            elif isinstance(elem, ExtendedRef):
-                
-                data_node_uid = elem().node_uid
-                requested_node = query_dict_with_partial_key(self.strong_ref_dict, data_node_uid)
-                
-            if len(requested_node) > 1:
-                node_uids = [k for k, v in requested_node]
-                warnings.warn('The requested output string "{output_str}" matches '
-                              'with more than 1 node uids: {node_uids}, only '
-                              'returning the first match: {first_match}.'.format(
-                              output_str=elem, node_uids=node_uids, first_match=node_uids[0]), 
-                              Ambiguous_Node_Name_Warning)
-                
-            if requested_node[0][1].node_type=='data':
-                requested_data_nodes.append(requested_node[0])
-            elif requested_node[0][1].node_type=='operation':
-                requested_op_nodes.append(requested_node[0])
+        requested_op_nodes, requested_data_nodes = self._get_requested_nodes(args)
 
         if view_dependency:
 
@@ -510,15 +933,9 @@ class GraphBuilder():
                 continue
 
             v.shallowly_persist()
-            v.activate_dependency_op_nodes()
 
-        for k, v in requested_op_nodes:
-            v.activate_dependency_op_nodes()
-
-        op_nodes = [(k, v) for k, v in self.strong_ref_dict.items() if v.node_type == 'operation' and v.is_activated()]
-
-        for k, v in op_nodes:
-            v.run()
+        target_nodes = [v for k, v in requested_data_nodes + requested_op_nodes]
+        SequentialExecutor().execute(build_plan(target_nodes))
 
         if len(requested_data_nodes) == 1:
             return requested_data_nodes[0][1].get()
@@ -546,6 +963,7 @@ class GraphBuilder():
                 
                 # remove the strong reference from memory
                 del self.strong_ref_dict[child_data_node_uid]
+                self.memory_ledger.remove(child_data_node_uid)
 
                 self.node_count -= 1
             
@@ -567,6 +985,7 @@ class GraphBuilder():
                     # we don't want to release its memory
                     if parent_data_node_uid in self.strong_ref_dict:
                         del self.strong_ref_dict[parent_data_node_uid]
+                        self.memory_ledger.remove(parent_data_node_uid)
 
                     self.node_count -= 1
                     
@@ -583,12 +1002,127 @@ class GraphBuilder():
                 
             # remove the op node from graph dict
             self.graph_dict.pop(k)
+
+            # the uid of the op node can be reused by the next op node added
+            self.dedupe_dict = {key: val for key, val in self.dedupe_dict.items() if val != k}
             
             # remove the strong reference to it
             del self.strong_ref_dict[k]
 
             self.node_count -= 1
             
+    def __getstate__(self):
+
+        # weak references cannot be pickled: the nodes of this graph, and the nodes of 
+        # grafted graphs it depends on, are pickled along with their links encoded as 
+        # node indices
+        nodes = get_ancestor_closure(list(self.strong_ref_dict.values()))
+
+        state = self.__dict__.copy()
+        state['strong_ref_dict'] = list(self.strong_ref_dict.keys())
+        state['packed_nodes'] = pack_nodes(nodes)
+        state.pop('external_nodes')
+
+        # keyed by the identities of objects that do not survive pickling
+        state['dedupe_dict'] = dict()
+
+        # the condition of the last add, a weak reference, is only needed by its call
+        state['when'] = None
+
+        return state
+
+    def __setstate__(self, state):
+
+        nodes = unpack_nodes(state.pop('packed_nodes'))
+        node_uids = state.pop('strong_ref_dict')
+
+        self.__dict__.update(state)
+
+        self.strong_ref_dict = dict(zip(node_uids, nodes))
+        self.external_nodes = nodes[len(node_uids):]
+
+    def serialize(self):
+        """Serialize the graph to bytes (with cloudpickle if it is installed, so that 
+        lambdas and functions defined in __main__ are shipped by value), e.g. to build it
+        once on the driver and ship it to every executor, rather than rebuilding it there.
+        The values held by its data nodes are included."""
+
+        return dumps(self)
+
+    @staticmethod
+    def deserialize(data):
+        """Rebuild a graph from the bytes of serialize"""
+
+        return loads(data)
+
+    def transfer_report(self):
+        """The bytes moved by the last distributed run: between workers, from the driver
+        to the workers and back, and consumed in place, with the number of op nodes run
+        by each worker. None before any distributed run."""
+
+        return self.last_transfer_report
+
+    @property
+    def live_bytes(self):
+        """Bytes currently held by the values of the data nodes of this graph"""
+
+        return self.memory_ledger.live_bytes
+
+    @property
+    def peak_bytes(self):
+        """Highest live_bytes since the graph was created, or since reset_peak_bytes"""
+
+        return self.memory_ledger.peak_bytes
+
+    def reset_peak_bytes(self):
+
+        self.memory_ledger.reset_peak()
+
+    def memory_report(self):
+        """The data nodes of this graph holding values, largest first, with their size
+        in bytes and the reason they are held:
+
+        input: raw input values, kept so the graph can be run again
+        persist: persisted with persist=True
+        run target: requested from run or run_only (shallowly persisted)
+        unreleased: not consumed yet, e.g. the outputs of a run, or values whose 
+                    consumers have not all run
+
+        Outputs computed but not needed by their last run (e.g. unused siblings of a
+        multi-output op node) are listed as dropped, with the size of the value that 
+        was not stored.
+        """
+        memory_report = []
+
+        for k, v in self.strong_ref_dict.items():
+
+            if v.node_type != 'data' or not v.has_value():
+                continue
+
+            if not v.has_parent_node_weak_refs():
+                persist_reason = 'input'
+            elif v.is_persisted():
+                persist_reason = 'persist'
+            elif v.is_shallowly_persisted():
+                persist_reason = 'run target'
+            else:
+                persist_reason = 'unreleased'
+
+            memory_report.append({'node_uid': k,
+                                  'alias': v.alias,
+                                  'persist_reason': persist_reason,
+                                  'nbytes': self.memory_ledger.nbytes.get(k, 0)})
+
+        for k, nbytes in self.memory_ledger.dropped_nbytes.items():
+
+            if k in self.strong_ref_dict and not self.strong_ref_dict[k].has_value():
+                memory_report.append({'node_uid': k,
+                                      'alias': self.strong_ref_dict[k].alias,
+                                      'persist_reason': 'dropped',
+                                      'nbytes': nbytes})
+
+        return sorted(memory_report, key=lambda elem: elem['nbytes'], reverse=True)
+
     @property
     def graph_attributes(self):
 
@@ -608,7 +1142,46 @@ class GraphBuilder():
 
         self.user_defined_graph_attributes = graph_attributes
 
-    def view(self, summary=True, graph_attributes=None, verbose=False, gap=None):
+    def _view(self, summary, verbose, engine, output, max_nodes=None, activated_node_uids=frozenset(), activate_ext_graph=False):
+
+        if engine not in [None, 'dot', 'layered']:
+            raise ValueError("Expected engine to be None, 'dot' or 'layered', "
+                             "instead got '{}'".format(engine))
+
+        if max_nodes is not None and (not isinstance(max_nodes, int) or max_nodes < 1):
+            raise ValueError("Expected max_nodes to be a positive integer, "
+                             "instead got '{}'".format(max_nodes))
+
+        graph_attributes = self._graph_attributes()
+
+        if engine is None:
+
+            # fall back to the built-in layered layout when graphviz dot is not available
+            # or when the graph is too large for dot to lay out in reasonable time
+            render_model = get_render_model(self.graph_dict, self.graph_uid, graph_attributes, summary, verbose, 
+                                            activated_node_uids, activate_ext_graph, max_nodes)
+
+            if (not is_dot_available()) or len(render_model['nodes']) > self.max_dot_nodes:
+                engine = 'layered'
+            else:
+                engine = 'dot'
+
+        if engine == 'layered':
+            return view_layered(self.graph_dict, self.graph_uid, graph_attributes, summary, verbose, 
+                                activated_node_uids, activate_ext_graph, output, max_nodes)
+        else:
+            return view_graph(self.graph_dict, self.graph_uid, graph_attributes, summary, verbose, 
+                              activated_node_uids, activate_ext_graph, max_nodes)
+
+    def view(self, summary=True, graph_attributes=None, verbose=False, gap=None, engine=None, output='svg', max_nodes=None):
+        """engine can be 'dot' (graphviz), 'layered' (built-in layout, displayed as 'svg' or 
+        interactive 'html' canvas depending on output) or None to pick 'layered' when the 
+        graph has more than max_dot_nodes nodes or dot is not available.
+
+        max_nodes collapses grafted graphs, op groups (G.add(func, group=...)) and then 
+        linear chains into single nodes until at most max_nodes nodes are left. The limit
+        is best-effort: once the chains are collapsed, the nodes left are all shown, and
+        groups whose collapse would create a cycle are never collapsed."""
 
         if gap is not None:
             graph_attributes = {'graph_ranksep': gap}
@@ -619,19 +1192,20 @@ class GraphBuilder():
         if graph_attributes:  # need validity check here
             self.update_graph_attributes(graph_attributes)
 
-        preprocessed_graph_dict = preprocess_graph_dict(self.graph_dict, self.graph_uid, self.graph_attributes, False)
-        
-        if summary:
-            return view_summary(preprocessed_graph_dict, self._graph_attributes(), verbose=verbose, current_graph_uid=self.graph_uid)
-        else:
-            return view_full(preprocessed_graph_dict, self._graph_attributes(), verbose=verbose, current_graph_uid=self.graph_uid)
+        return self._view(summary, verbose, engine, output, max_nodes)
 
     def save_view(self, summary=True, graph_attributes=None, dirpath=None, filename='digraph', fileformat='png'):
 
-        if fileformat not in ['pdf', 'png']:
-            raise TypeError("Expected fileformat to be 'pdf' or 'png', but instead "
+        if fileformat not in ['pdf', 'png', 'svg']:
+            raise TypeError("Expected fileformat to be 'pdf', 'png' or 'svg', but instead "
                             "got {}".format(fileformat))
 
-        graph = self.view(summary, graph_attributes)
+        # only svg can be produced by the layered layout engine
+        engine = None if fileformat == 'svg' else 'dot'
+        graph = self.view(summary, graph_attributes, engine=engine)
+
+        if isinstance(graph, LayeredGraph):
+            return graph.save(os.path.join(dirpath or os.getcwd(), filename + '.svg'))
+
         img_filepath = save_graph_image(graph, dirpath, filename, fileformat)
         return img_filepath
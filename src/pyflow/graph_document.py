@@ -1,67 +1,65 @@
-import numpy as np
 import struct
-import imghdr
 import base64
+import io
 import os
 
-from subprocess import check_call
+from .utils import render_graph
 
+# dpi of graphviz png output when none is set
+DEFAULT_DPI = 96
+MIN_DPI = 5
 
-TMP_DIGRAPH_FILEPATH = 'digraph.png'
-TMP_GRAPH_RENDER_FILEPATH = 'pyflow_tmp'
-TMP_GRAPH_RENDER_PDF_FILEPATH = 'pyflow_tmp.pdf'
-TMP_PNG_FILEPATH = 'OutputFile.png'
+# graphviz pads the drawing by 4 points on each side
+PAD_INCHES = 4 / 72
 
-def get_image_size(fname):
-    '''Determine the image type of fhandle and return its size.
+def get_image_size(image_bytes):
+    '''Determine the image type of image_bytes and return its size.
     from draco'''
-    with open(fname, 'rb') as fhandle:
-        head = fhandle.read(24)
-        if len(head) != 24:
+    fhandle = io.BytesIO(image_bytes)
+    head = fhandle.read(24)
+    if len(head) != 24:
+        return
+    if head[:8] == b'\x89PNG\r\n\x1a\n':
+        check = struct.unpack('>i', head[4:8])[0]
+        if check != 0x0d0a1a0a:
             return
-        if imghdr.what(fname) == 'png':
-            check = struct.unpack('>i', head[4:8])[0]
-            if check != 0x0d0a1a0a:
-                return
-            width, height = struct.unpack('>ii', head[16:24])
-        elif imghdr.what(fname) == 'gif':
-            width, height = struct.unpack('<HH', head[6:10])
-        elif imghdr.what(fname) == 'jpeg':
-            try:
-                fhandle.seek(0) # Read 0xff next
-                size = 2
-                ftype = 0
-                while not 0xc0 <= ftype <= 0xcf:
-                    fhandle.seek(size, 1)
+        width, height = struct.unpack('>ii', head[16:24])
+    elif head[:6] in (b'GIF87a', b'GIF89a'):
+        width, height = struct.unpack('<HH', head[6:10])
+    elif head[:2] == b'\xff\xd8':
+        try:
+            fhandle.seek(0) # Read 0xff next
+            size = 2
+            ftype = 0
+            while not 0xc0 <= ftype <= 0xcf:
+                fhandle.seek(size, 1)
+                byte = fhandle.read(1)
+                while ord(byte) == 0xff:
                     byte = fhandle.read(1)
-                    while ord(byte) == 0xff:
-                        byte = fhandle.read(1)
-                    ftype = ord(byte)
-                    size = struct.unpack('>H', fhandle.read(2))[0] - 2
-                # We are at a SOFn block
-                fhandle.seek(1, 1)  # Skip `precision' byte.
-                height, width = struct.unpack('>HH', fhandle.read(4))
-            except Exception: #IGNORE:W0703
-                return
-        else:
+                ftype = ord(byte)
+                size = struct.unpack('>H', fhandle.read(2))[0] - 2
+            # We are at a SOFn block
+            fhandle.seek(1, 1)  # Skip `precision' byte.
+            height, width = struct.unpack('>HH', fhandle.read(4))
+        except Exception: #IGNORE:W0703
             return
-        return width, height
+    else:
+        return
+    return width, height
     
 def add_graph_alias(graph_obj):
     
     html_str = "<h3>{}</h3>".format(graph_obj.graph_alias)
     return html_str
 
-def add_graph_image(graph_obj, dirpath=None, filename=None, summary=True, graph_attributes=None):
+def add_graph_image(graph_obj, summary=True, graph_attributes=None):
     
-    graph_img_path = graph_obj.save_view(summary=summary, graph_attributes=graph_attributes, 
-                                         dirpath=dirpath, filename=filename)
+    graph = graph_obj.view(summary=summary, graph_attributes=graph_attributes, engine='dot')
     
     html_str = "<html>\n"
-    data_uri = base64.b64encode(open(graph_img_path, 'rb').read()).decode('utf-8')
+    data_uri = base64.b64encode(render_graph(graph.source, 'png')).decode('utf-8')
     html_str += '<img src="data:image/png;base64,{}">'.format(data_uri)
     
-    os.remove(graph_img_path)
     return html_str
 
 def add_method_doc_string(graph_obj):
@@ -122,16 +120,51 @@ def add_method_doc_string(graph_obj):
 
     return html_str
 
-def get_layout_elements(graph_obj, pixel_offset):
-
-    graph_img_path = graph_obj.save_view(summary=True, graph_attributes=None, 
-                                         dirpath=None, filename=None)
+def get_image_layout(dot_source):
+    """Size of the graph image and of the frame it is shown in, in pixels"""
 
-    img_width_x, img_height_y = get_image_size(graph_img_path)
+    # a single layout pass gives the natural size of the graph, from which the
+    # image size at any dpi follows, so the graph is rendered to png only once
+    natural_width, natural_height = get_natural_size(dot_source)
+    img_width_x, img_height_y = natural_width * DEFAULT_DPI, natural_height * DEFAULT_DPI
     
     frame_width_x, frame_height_y = 975, max(550, min(img_height_y, 750))
 
-    graph_overview_header = Div(text="""<h2>Graphs Overview</h2>""", width=300, height=40)
+    MAX_RATIO = 1.25
+
+    if (img_width_x > frame_width_x) or (img_height_y > frame_height_y):
+        width_ratio = img_width_x / frame_width_x
+        height_ratio = img_height_y / frame_height_y
+
+        max_ratio = max(width_ratio, height_ratio)
+        if max_ratio > MAX_RATIO:
+            max_ratio = MAX_RATIO
+
+        img_width_x = img_width_x / max_ratio
+        img_height_y = img_height_y / max_ratio
+
+    return img_width_x, img_height_y, frame_width_x, frame_height_y
+
+def render_graph_image(dot_source, pixel_offset):
+    """Render the graph to png at the dpi fitting its frame. This only runs dot 
+    subprocesses, so that document can run it for several graphs concurrently."""
+
+    image_layout = get_image_layout(dot_source)
+    img_width_x, img_height_y = image_layout[0:2]
+
+    dpi = tune_dpi(dot_source, img_height_y, img_width_x)
+    graph_img_bytes = render_graph(dot_source, 'png', dpi=dpi+pixel_offset)
+
+    return image_layout, graph_img_bytes
+
+def get_layout_elements(graph_obj, image_layout, graph_img_bytes):
+
+    from bokeh.models.widgets import Div
+    from bokeh.models.widgets import PreText
+    from bokeh.plotting import figure
+
+    img_width_x, img_height_y, frame_width_x, frame_height_y = image_layout
+
     graph_alias = Div(text=add_graph_alias(graph_obj), width=500, height=40)
 
     method_docstrs = PreText(text=add_method_doc_string(graph_obj), width=630, height=frame_height_y, 
@@ -151,47 +184,42 @@ def get_layout_elements(graph_obj, pixel_offset):
     p.plot_width=frame_width_x
     p.plot_height=frame_height_y
 
-    MAX_RATIO = 1.25
+    # the png is embedded as is, without decoding it into an rgba array
+    data_uri = 'data:image/png;base64,{}'.format(base64.b64encode(graph_img_bytes).decode('utf-8'))
+    p.image_url(url=[data_uri], x=0, y=0, w=img_width_x, h=img_height_y, anchor='top_left')
+    
+    return graph_alias, p, method_docstrs
 
-    if (img_width_x > frame_width_x) or (img_height_y > frame_height_y):
-        width_ratio = img_width_x / frame_width_x
-        height_ratio = img_height_y / frame_height_y
+def render_graph_images(graph_objs, pixel_offset, max_workers=None):
+    """Render the graphs concurrently in a thread pool, reporting progress as each 
+    one completes. The renders are independent and spend their time in dot 
+    subprocesses, so threads are enough. Returns the results in the order of graph_objs."""
 
-        max_ratio = max(width_ratio, height_ratio)
-        if max_ratio > MAX_RATIO:
-            max_ratio = MAX_RATIO
+    from concurrent.futures import ThreadPoolExecutor
+    from concurrent.futures import as_completed
 
-        img_width_x = img_width_x / max_ratio
-        img_height_y = img_height_y / max_ratio
+    # the DOT sources are built in this thread, since viewing updates the graph caches
+    dot_sources = [graph_obj.view(engine='dot').source for graph_obj in graph_objs]
+    results = [None] * len(graph_objs)
 
-    graph = graph_obj.view()
-    filepath_ = graph.render('pyflow_tmp')
-    
-    print("\u2714 Rendering graph [ {} ]...          ".format(graph_obj.graph_alias), end="", flush=True)
-    dpi = tune_dpi(img_height_y, img_width_x)
-    dpi = int(dpi[0])
-    check_call(['dot','-Tpng', '-Gdpi={}'.format(dpi+pixel_offset), TMP_GRAPH_RENDER_FILEPATH, '-o', TMP_PNG_FILEPATH])
-
-    img = io.imread(TMP_PNG_FILEPATH)
-
-    if img.shape[-1]==3:
-        rgba = np.zeros([*img.shape[0:2], 4])
-        rgba[:, :, 3] = 255
-        rgba[:, :, 0:3] = img
-        img = rgba
-        img = img.astype(np.uint8)
-
-    p.image_rgba(image=[np.array(img)[::-1, :, :]], x=0, y=img_height_y, dw=img_width_x, dh=img_height_y, 
-                  dilate=False, global_alpha=10)
-    print('Completed!')
-    
-    return graph_alias, p, method_docstrs
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
 
-def document(*graph_objs, filename=None, pixel_offset=-1):
+        futures = {executor.submit(render_graph_image, dot_source, pixel_offset): i 
+                   for i, dot_source in enumerate(dot_sources)}
+
+        for n_completed, future in enumerate(as_completed(futures), 1):
+
+            i = futures[future]
+            results[i] = future.result()
+
+            print("\u2714 Rendered graph [ {} ] ({}/{})".format(
+                graph_objs[i].graph_alias, n_completed, len(graph_objs)), flush=True)
+
+    return results
+
+def document(*graph_objs, filename=None, pixel_offset=-1, max_workers=None):
 
     need_bokeh = False
-    need_scipy = False
-    need_skimage = False
 
     try:
         from bokeh.io import output_notebook, show, output_file
@@ -204,33 +232,24 @@ def document(*graph_objs, filename=None, pixel_offset=-1):
     except ModuleNotFoundError:
         need_bokeh = True
 
-    try:
-        from scipy import optimize
-    except ModuleNotFoundError:
-        need_scipy = True
-        
-    try:
-        from skimage import io
-    except ModuleNotFoundError:
-        need_skimage = True
-
-    if need_bokeh or need_scipy or need_skimage:
+    if need_bokeh:
         print('To use document functionalities, please install follwing package(s):')
-        if need_bokeh:
-            print('\npip install bokeh')
-        if need_scipy:
-            print('\npip install scipy')
-        if need_skimage:
-            print('\npip install scikit-image')
+        print('\npip install bokeh')
         return
 
-    filename = 'graphs_overview.html'
+    filename = filename or 'graphs_overview.html'
     graph_overview_header = Div(text="""<h2>Graphs Overview</h2>""", width=300, height=40)
     
     grid = [[graph_overview_header, None]]
     
-    for graph_obj in graph_objs:
-        graph_alias, p, method_docstrs = get_layout_elements(graph_obj, pixel_offset)
+    if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+        raise ValueError("Expected max_workers to be a positive integer, "
+                         "instead got '{}'".format(max_workers))
+
+    rendered_graph_images = render_graph_images(graph_objs, pixel_offset, max_workers)
+    
+    for graph_obj, (image_layout, graph_img_bytes) in zip(graph_objs, rendered_graph_images):
+        graph_alias, p, method_docstrs = get_layout_elements(graph_obj, image_layout, graph_img_bytes)
         grid.append([graph_alias, None])
         grid.append([p, method_docstrs])
         
@@ -241,31 +260,32 @@ def document(*graph_objs, filename=None, pixel_offset=-1):
 
     show(grids)
     
-    filepath = os.path.join(os.getcwd(), filename)
+    filepath = os.path.abspath(filename)
     print('\nRendered html file location: {}'.format(filepath))
 
-    cleanup_dir()
+def get_natural_size(dot_source):
+    """Width and height of the laid out graph in inches, including the pad graphviz 
+    adds around the drawing, from a single dot -Tplain pass."""
 
-def tune_dpi(height, width):
-    
-    def f(x, args):
-        if x[0] < 5:
-            return 999999999
-        check_call(['dot','-Tpng', '-Gdpi={}'.format(x[0]), TMP_GRAPH_RENDER_FILEPATH,'-o', TMP_PNG_FILEPATH])
-        img = io.imread(TMP_PNG_FILEPATH)
-        return mae(img.shape[0:2], args)
-        
-    re = optimize.minimize(f, x0=[50], 
-                           args=[height, width],  method="Nelder-Mead")
-    return re.x
+    # the first line of the plain output is: graph scale width height
+    graph_statement = render_graph(dot_source, 'plain').decode('utf-8').split('\n')[0].split()
+    width, height = float(graph_statement[2]), float(graph_statement[3])
 
-def mae(array1, array2):
-    
-    return np.average(np.abs(np.asarray(array1) - np.asarray(array2)), axis=0)
+    return width + 2 * PAD_INCHES, height + 2 * PAD_INCHES
+
+def tune_dpi(dot_source, height, width):
+    """The dpi at which the rendered image size is closest to height and width.
+
+    The image size is linear in dpi, so the mean absolute error is piecewise linear
+    with its minimum at the dpi fitting either the width or the height exactly."""
+
+    natural_width, natural_height = get_natural_size(dot_source)
 
-def cleanup_dir():
+    candidate_dpis = [max(MIN_DPI, int(round(width / natural_width))), 
+                      max(MIN_DPI, int(round(height / natural_height)))]
 
-    os.remove(TMP_DIGRAPH_FILEPATH)
-    os.remove(TMP_GRAPH_RENDER_FILEPATH)
-    os.remove(TMP_GRAPH_RENDER_PDF_FILEPATH)
-    os.remove(TMP_PNG_FILEPATH)
+    return min(candidate_dpis, key=lambda dpi: mae([natural_height * dpi, natural_width * dpi], [height, width]))
+
+def mae(array1, array2):
+    
+    return sum(abs(a - b) for a, b in zip(array1, array2)) / len(array1)
@@ -0,0 +1,102 @@
+from collections import defaultdict
+
+from .scheduler import SequentialExecutor
+from .serialization import dumps
+from .serialization import loads
+
+
+# the GroupPlan of apply_groups, unpickled once in each worker process
+GROUP_PLAN = None
+
+
+class GroupPlan(object):
+    """An execution plan computing the target nodes from the value bound to a
+    placeholder node, planned once and run again for every group.
+
+    Each run binds the group to the placeholder, runs the plan from fresh consumer
+    counts, and releases the values of the targets once they are returned, so that no
+    value is carried from one group to the next.
+    """
+    def __init__(self, plan, placeholder_node, target_nodes):
+
+        self.plan = plan
+        self.placeholder_node = placeholder_node
+        self.target_nodes = target_nodes
+
+        self.consumer_counts = dict(plan.consumer_counts)
+
+    def run(self, value):
+
+        self.plan.consumer_counts = defaultdict(int, self.consumer_counts)
+        self.placeholder_node.set_value(value)
+
+        SequentialExecutor().execute(self.plan)
+
+        output_values = [elem.get() for elem in self.target_nodes]
+
+        # persisted targets are overwritten by the next group instead
+        for target_node in self.target_nodes:
+            if not target_node.is_persisted():
+                target_node.release_memory()
+
+        return output_values
+
+
+def init_group_worker(data):
+
+    global GROUP_PLAN
+    GROUP_PLAN = loads(data)
+
+def run_group(value):
+
+    return GROUP_PLAN.run(value)
+
+def combine_group_outputs(keys, values, by):
+    """Concatenate the DataFrames or Series returned for each group, under the group
+    keys, like groupby.apply. Other values are returned as a Series indexed by the
+    group keys."""
+
+    import pandas as pd
+
+    # grouping by a list of columns gives tuple keys
+    names = list(by) if isinstance(by, (list, tuple)) else [by]
+
+    if len(values) > 0 and all(isinstance(elem, (pd.DataFrame, pd.Series)) for elem in values):
+        return pd.concat(values, keys=keys, names=names)
+
+    if isinstance(by, (list, tuple)):
+        index = pd.MultiIndex.from_tuples(keys, names=names)
+    else:
+        index = pd.Index(keys, name=by)
+
+    return pd.Series(values, index=index, dtype=object if len(values) == 0 else None)
+
+def run_groups(group_plan, df, by, max_workers=None, chunksize=1):
+    """Run the group plan on every group of df.groupby(by) and return the combined
+    outputs of each target node. With max_workers=1, the groups are run in this
+    process, otherwise in a pool of max_workers processes."""
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    keys = []
+    groups = []
+
+    for key, group in df.groupby(by):
+        keys.append(key)
+        groups.append(group)
+
+    # shipped once to each process (and copied here), so that the graph is left as is
+    data = dumps(group_plan)
+
+    if max_workers == 1:
+
+        local_group_plan = loads(data)
+        output_values = [local_group_plan.run(elem) for elem in groups]
+
+    else:
+
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_group_worker, initargs=(data,)) as executor:
+            output_values = list(executor.map(run_group, groups, chunksize=chunksize))
+
+    return [combine_group_outputs(keys, [elem[i] for elem in output_values], by)
+            for i in range(len(group_plan.target_nodes))]
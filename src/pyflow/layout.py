@@ -0,0 +1,440 @@
+from .utils import get_render_model
+from .utils import get_cached_render_output
+
+from collections import deque
+from html import escape
+import json
+
+
+CHAR_WIDTH_RATIO = 0.6
+NODE_PADDING = 8.0
+NODE_SEPARATION = 18.0
+POINTS_PER_INCH = 72.0
+MAX_DUMMY_SPAN = 8
+N_SWEEPS = 4
+
+def _get_label_fields(attributes):
+
+    label = str(attributes['label'])
+
+    # record labels are of the form {label|data_dim}, stacked vertically
+    if attributes['shape'] == 'record' and label.startswith('{') and label.endswith('}'):
+        return label[1:-1].split('|')
+
+    return [label]
+
+def _topological_order(n_nodes, children):
+
+    in_degrees = [0] * n_nodes
+    for node_children in children:
+        for child in node_children:
+            in_degrees[child] += 1
+
+    queue = deque(i for i in range(n_nodes) if in_degrees[i] == 0)
+    order = []
+
+    while len(queue) > 0:
+        node = queue.popleft()
+        order.append(node)
+        for child in children[node]:
+            in_degrees[child] -= 1
+            if in_degrees[child] == 0:
+                queue.append(child)
+
+    return order
+
+def _assign_layers(n_nodes, order, parents, children, ranks):
+    """Longest path layering, where op nodes sharing a rank attribute are put on the
+    same layer (as rank=same does for dot), and source nodes are pulled down next
+    to their children to avoid long edges. The layers are numbered from 0 with no
+    gaps, as either step can leave a layer empty.
+    """
+    layers = [0] * n_nodes
+
+    rank_groups = dict()
+    for i, rank in enumerate(ranks):
+        if rank is not None:
+            rank_groups.setdefault(rank, []).append(i)
+
+    for _ in range(len(rank_groups) + 1):
+
+        for node in order:
+            for parent in parents[node]:
+                if layers[parent] + 1 > layers[node]:
+                    layers[node] = layers[parent] + 1
+
+        is_changed = False
+
+        for members in rank_groups.values():
+            max_layer = max(layers[i] for i in members)
+            for i in members:
+                if layers[i] != max_layer:
+                    layers[i] = max_layer
+                    is_changed = True
+
+        if not is_changed:
+            break
+
+    for node in order:
+        if len(parents[node]) == 0 and len(children[node]) > 0 and ranks[node] is None:
+            layers[node] = min(layers[child] for child in children[node]) - 1
+
+    layer_numbers = {layer: i for i, layer in enumerate(sorted(set(layers)))}
+
+    return [layer_numbers[layer] for layer in layers]
+
+def compute_layered_layout(render_model, graph_attributes):
+    """Sugiyama style layered layout of the render model:
+
+    1. layering from the topological ranks and the rank attribute
+    2. dummy nodes on edges spanning several layers
+    3. crossing reduction with barycenter sweeps
+    4. coordinate assignment from the label sizes
+    """
+    import numpy as np
+
+    node_uids = list(render_model['nodes'].keys())
+    n_nodes = len(node_uids)
+    index = {node_uid: i for i, node_uid in enumerate(node_uids)}
+
+    edges = [(index[tail], index[head]) for tail, head in render_model['edges']
+             if tail in index and head in index]
+
+    parents = [[] for _ in range(n_nodes)]
+    children = [[] for _ in range(n_nodes)]
+    for tail, head in edges:
+        parents[head].append(tail)
+        children[tail].append(head)
+
+    order = _topological_order(n_nodes, children)
+    ranks = [render_model['nodes'][node_uid]['rank'] for node_uid in node_uids]
+    layers = _assign_layers(n_nodes, order, parents, children, ranks)
+
+    # node sizes in points
+    widths = []
+    heights = []
+    labels = []
+
+    for node_uid in node_uids:
+
+        attributes = render_model['nodes'][node_uid]['attributes']
+        fontsize = float(attributes['fontsize'])
+        fields = _get_label_fields(attributes)
+
+        widths.append(max(len(elem) for elem in fields) * fontsize * CHAR_WIDTH_RATIO + 2 * NODE_PADDING)
+        heights.append(len(fields) * (fontsize + NODE_PADDING) + NODE_PADDING / 2)
+        labels.append(fields)
+
+    # 2. dummy nodes, so that every edge used for crossing reduction spans one layer
+    all_layers = list(layers)
+    segments = []
+    edge_paths = []
+
+    for tail, head in edges:
+
+        span = all_layers[head] - all_layers[tail]
+
+        if span <= 1 or span > MAX_DUMMY_SPAN:
+            segments.append((tail, head))
+            edge_paths.append([tail, head])
+            continue
+
+        path = [tail]
+        for layer in range(all_layers[tail] + 1, all_layers[head]):
+            all_layers.append(layer)
+            path.append(len(all_layers) - 1)
+        path.append(head)
+
+        segments.extend(zip(path[:-1], path[1:]))
+        edge_paths.append(path)
+
+    n_all_nodes = len(all_layers)
+    all_layers = np.asarray(all_layers)
+    n_layers = int(all_layers.max()) + 1 if n_all_nodes > 0 else 0
+
+    all_widths = np.full(n_all_nodes, NODE_SEPARATION / 2)
+    all_widths[:n_nodes] = widths
+
+    # 3. crossing reduction
+    # initial order within each layer follows the topological order
+    initial_order = np.empty(n_all_nodes)
+    initial_order[order] = np.arange(n_nodes)
+    initial_order[n_nodes:] = np.arange(n_nodes, n_all_nodes)
+
+    positions = np.empty(n_all_nodes)
+    layer_members = []
+
+    for layer in range(n_layers):
+        members = np.flatnonzero(all_layers == layer)
+        members = members[np.argsort(initial_order[members], kind='stable')]
+        positions[members] = np.arange(len(members))
+        layer_members.append(members)
+
+    segments = np.asarray([elem for elem in segments if all_layers[elem[1]] - all_layers[elem[0]] == 1], dtype=int).reshape(-1, 2)
+    segment_layers = all_layers[segments[:, 1]]
+
+    segments_by_layer = [segments[segment_layers == layer] for layer in range(n_layers)]
+
+    def sweep(layer_range, fixed_column, free_column, segment_layer_offset):
+
+        for layer in layer_range:
+
+            layer_segments = segments_by_layer[layer + segment_layer_offset]
+            members = layer_members[layer]
+
+            if len(layer_segments) == 0 or len(members) < 2:
+                continue
+
+            free_nodes = layer_segments[:, free_column]
+            fixed_nodes = layer_segments[:, fixed_column]
+
+            barycenter_sums = np.bincount(free_nodes, weights=positions[fixed_nodes], minlength=n_all_nodes)[members]
+            barycenter_counts = np.bincount(free_nodes, minlength=n_all_nodes)[members]
+
+            # nodes without neighbors in the fixed layer keep their position
+            barycenters = np.where(barycenter_counts > 0,
+                                   barycenter_sums / np.maximum(barycenter_counts, 1),
+                                   positions[members])
+
+            members = members[np.lexsort((positions[members], barycenters))]
+            positions[members] = np.arange(len(members))
+            layer_members[layer] = members
+
+    for _ in range(N_SWEEPS):
+        # downward sweep: order layer l by its parents in layer l-1
+        sweep(range(1, n_layers), 0, 1, 0)
+        # upward sweep: order layer l by its children in layer l+1
+        sweep(range(n_layers - 2, -1, -1), 1, 0, 1)
+
+    # 4. coordinates: layers are stacked vertically, nodes packed left to right
+    # and each layer centered
+    xs = np.zeros(n_all_nodes)
+    ys = np.zeros(n_all_nodes)
+
+    max_heights = np.zeros(n_layers)
+    for node, layer in enumerate(all_layers[:n_nodes]):
+        max_heights[layer] = max(max_heights[layer], heights[node])
+
+    ranksep = float(graph_attributes['graph_ranksep']) * POINTS_PER_INCH
+    layer_ys = np.concatenate([[0], np.cumsum(max_heights + ranksep)[:-1]]) + max_heights / 2
+
+    for layer in range(n_layers):
+        members = layer_members[layer]
+        member_widths = all_widths[members]
+        lefts = np.concatenate([[0], np.cumsum(member_widths + NODE_SEPARATION)[:-1]])
+        total_width = lefts[-1] + member_widths[-1]
+        xs[members] = lefts + member_widths / 2 - total_width / 2
+        ys[members] = layer_ys[layer]
+
+    if n_all_nodes > 0:
+        xs -= (xs - all_widths / 2).min() - NODE_SEPARATION
+        width = float((xs + all_widths / 2).max() + NODE_SEPARATION)
+        height = float(layer_ys[-1] + max_heights[-1] / 2 + NODE_SEPARATION)
+        ys += NODE_SEPARATION
+    else:
+        width = height = 0.0
+
+    nodes = []
+    for i, node_uid in enumerate(node_uids):
+        nodes.append({'node_uid': node_uid,
+                      'type': render_model['nodes'][node_uid]['type'],
+                      'x': float(xs[i]), 'y': float(ys[i]),
+                      'width': float(widths[i]), 'height': float(heights[i]),
+                      'label': labels[i],
+                      'attributes': render_model['nodes'][node_uid]['attributes']})
+
+    # edges leave the bottom of the tail and enter the top of the head
+    all_heights = np.zeros(n_all_nodes)
+    all_heights[:n_nodes] = heights
+
+    edge_points = []
+    for path in edge_paths:
+        points = [(float(xs[path[0]]), float(ys[path[0]] + all_heights[path[0]] / 2))]
+        points += [(float(xs[elem]), float(ys[elem])) for elem in path[1:-1]]
+        points += [(float(xs[path[-1]]), float(ys[path[-1]] - all_heights[path[-1]] / 2))]
+        edge_points.append(points)
+
+    return {'nodes': nodes, 'edges': edge_points, 'width': width, 'height': height}
+
+def _get_node_style(attributes):
+
+    style = attributes.get('style') or ''
+    fill = attributes.get('fillcolor') if 'filled' in style.split(',') else None
+
+    if fill in (None, 'None'):
+        fill = 'none'
+
+    stroke = attributes.get('color') or 'black'
+    stroke_width = attributes.get('penwidth') or '1'
+
+    return fill, stroke, stroke_width
+
+def layout_to_svg(layout):
+
+    lines = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0:.0f}pt" height="{1:.0f}pt" '
+             'viewBox="0 0 {0:.1f} {1:.1f}">'.format(layout['width'], layout['height'])]
+    lines.append('<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="7" '
+                 'markerHeight="7" orient="auto"><path d="M0,0 L10,5 L0,10 z"/></marker></defs>')
+    lines.append('<rect width="100%" height="100%" fill="white"/>')
+
+    lines.append('<g fill="none" stroke="black">')
+    for points in layout['edges']:
+        path = ' '.join('{:.1f},{:.1f}'.format(x, y) for x, y in points)
+        lines.append('<polyline points="{}" marker-end="url(#arrow)"/>'.format(path))
+    lines.append('</g>')
+
+    lines.append('<g font-family="Times,serif" text-anchor="middle" dominant-baseline="central">')
+    for node in layout['nodes']:
+
+        fill, stroke, stroke_width = _get_node_style(node['attributes'])
+        left = node['x'] - node['width'] / 2
+        top = node['y'] - node['height'] / 2
+
+        lines.append('<g><title>{}</title>'.format(escape(node['node_uid'])))
+
+        # box3d (grafted graph nodes) is drawn with an offset back face
+        if node['attributes']['shape'] == 'box3d':
+            lines.append('<rect x="{:.1f}" y="{:.1f}" width="{:.1f}" height="{:.1f}" fill="{}" stroke="{}" stroke-width="{}"/>'.format(
+                left + 4, top - 4, node['width'], node['height'], escape(fill), escape(stroke), stroke_width))
+
+        lines.append('<rect x="{:.1f}" y="{:.1f}" width="{:.1f}" height="{:.1f}" fill="{}" stroke="{}" stroke-width="{}"/>'.format(
+            left, top, node['width'], node['height'], escape(fill), escape(stroke), stroke_width))
+
+        field_height = node['height'] / len(node['label'])
+
+        for i, field in enumerate(node['label']):
+
+            if i > 0:
+                lines.append('<line x1="{:.1f}" y1="{:.1f}" x2="{:.1f}" y2="{:.1f}" stroke="{}"/>'.format(
+                    left, top + i * field_height, left + node['width'], top + i * field_height, escape(stroke)))
+
+            lines.append('<text x="{:.1f}" y="{:.1f}" font-size="{}">{}</text>'.format(
+                node['x'], top + (i + 0.5) * field_height, node['attributes']['fontsize'], escape(field)))
+
+        lines.append('</g>')
+
+    lines.append('</g>')
+    lines.append('</svg>')
+
+    return '\n'.join(lines) + '\n'
+
+HTML_CANVAS_TEMPLATE = """<div style="width:100%;height:{height}px;border:1px solid #ddd">
+<canvas id="{canvas_id}" style="width:100%;height:100%;cursor:grab"></canvas>
+</div>
+<script>
+(function() {{
+  var data = {data};
+  var canvas = document.getElementById("{canvas_id}");
+  var ctx = canvas.getContext("2d");
+  var scale = 1, dx = 0, dy = 0, drag = null;
+  function resize() {{
+    canvas.width = canvas.clientWidth; canvas.height = canvas.clientHeight;
+    scale = Math.min(canvas.width / data.width, canvas.height / data.height, 1);
+    dx = (canvas.width - data.width * scale) / 2; dy = 0;
+  }}
+  function draw() {{
+    ctx.setTransform(1, 0, 0, 1, 0, 0);
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    ctx.setTransform(scale, 0, 0, scale, dx, dy);
+    ctx.strokeStyle = "black"; ctx.lineWidth = 1;
+    ctx.beginPath();
+    data.edges.forEach(function(p) {{
+      ctx.moveTo(p[0], p[1]);
+      for (var i = 2; i < p.length; i += 2) ctx.lineTo(p[i], p[i + 1]);
+    }});
+    ctx.stroke();
+    ctx.textAlign = "center"; ctx.textBaseline = "middle";
+    data.nodes.forEach(function(n) {{
+      var left = n[0] - n[2] / 2, top = n[1] - n[3] / 2;
+      if (n[4] !== "none") {{ ctx.fillStyle = n[4]; ctx.fillRect(left, top, n[2], n[3]); }}
+      ctx.strokeStyle = n[5]; ctx.lineWidth = n[6];
+      ctx.strokeRect(left, top, n[2], n[3]);
+      if (scale * n[7] < 4) return;
+      ctx.fillStyle = "black"; ctx.font = n[7] + "px serif";
+      var h = n[3] / n[8].length;
+      n[8].forEach(function(field, i) {{ ctx.fillText(field, n[0], top + (i + 0.5) * h); }});
+    }});
+  }}
+  canvas.addEventListener("wheel", function(e) {{
+    e.preventDefault();
+    var factor = e.deltaY < 0 ? 1.2 : 1 / 1.2;
+    dx = e.offsetX - (e.offsetX - dx) * factor; dy = e.offsetY - (e.offsetY - dy) * factor;
+    scale *= factor; draw();
+  }});
+  canvas.addEventListener("mousedown", function(e) {{ drag = [e.offsetX - dx, e.offsetY - dy]; }});
+  canvas.addEventListener("mousemove", function(e) {{
+    if (drag) {{ dx = e.offsetX - drag[0]; dy = e.offsetY - drag[1]; draw(); }}
+  }});
+  window.addEventListener("mouseup", function() {{ drag = null; }});
+  resize(); draw();
+}})();
+</script>
+"""
+
+def layout_to_html(layout, height=750):
+
+    nodes = []
+    for node in layout['nodes']:
+        fill, stroke, stroke_width = _get_node_style(node['attributes'])
+        nodes.append([round(node['x'], 1), round(node['y'], 1), round(node['width'], 1), round(node['height'], 1),
+                      fill, stroke, float(stroke_width), float(node['attributes']['fontsize']), node['label']])
+
+    edges = [[round(coord, 1) for point in points for coord in point] for points in layout['edges']]
+
+    data = {'nodes': nodes, 'edges': edges, 'width': layout['width'], 'height': layout['height']}
+
+    return HTML_CANVAS_TEMPLATE.format(height=height, canvas_id='pyflow_{}'.format(id(layout)),
+                                       data=json.dumps(data).replace('</', '<\\/'))
+
+
+class LayeredGraph(object):
+    """Graph laid out by the built-in layered layout engine, for graphs too large for
+    (or environments without) graphviz dot.
+
+    Displays in notebooks as SVG or as an interactive (zoom and pan) HTML canvas.
+    """
+    def __init__(self, layout, output='svg'):
+
+        if output not in ['svg', 'html']:
+            raise ValueError("Expected output to be 'svg' or 'html', "
+                             "instead got '{}'".format(output))
+
+        self.layout = layout
+        self.output = output
+
+    @property
+    def svg(self):
+        return layout_to_svg(self.layout)
+
+    @property
+    def html(self):
+        return layout_to_html(self.layout)
+
+    def _repr_mimebundle_(self, include=None, exclude=None):
+
+        if self.output == 'html':
+            return {'text/html': self.html}
+        else:
+            return {'image/svg+xml': self.svg}
+
+    def save(self, filepath):
+
+        with open(filepath, 'w') as f:
+            f.write(self.svg if filepath.endswith('.svg') else self.html)
+
+        return filepath
+
+
+def view_layered(graph_dict, current_graph_uid, graph_attributes, summary, verbose,
+                 activated_node_uids=frozenset(), activate_ext_graph=False, output='svg', max_nodes=None):
+
+    activated_node_uids = frozenset(activated_node_uids)
+    cache_key = ('layout', graph_dict.version, current_graph_uid, tuple(sorted(graph_attributes.items())),
+                 summary, verbose, activated_node_uids, activate_ext_graph, max_nodes)
+
+    layout = get_cached_render_output(
+        graph_dict, cache_key,
+        lambda: compute_layered_layout(get_render_model(graph_dict, current_graph_uid, graph_attributes, summary, verbose,
+                                                        activated_node_uids, activate_ext_graph, max_nodes), graph_attributes))
+
+    return LayeredGraph(layout, output)
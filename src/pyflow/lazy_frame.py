@@ -0,0 +1,53 @@
+class LazyFrameEngine(object):
+    """Protocol for values of lazily evaluated engines (e.g. Spark DataFrame).
+
+    Such a value only holds the lineage of its computation, so every consumer
+    re-executes that lineage unless the value is explicitly persisted. An engine
+    tells Pyflow how to recognize, persist and unpersist its values.
+    """
+
+    def matches(self, value):
+        raise NotImplementedError
+
+    def persist(self, value):
+        raise NotImplementedError
+
+    def unpersist(self, value):
+        raise NotImplementedError
+
+
+class SparkDataFrameEngine(LazyFrameEngine):
+
+    def matches(self, value):
+
+        try:
+            return (hasattr(value, 'rdd')
+                    and callable(getattr(value, 'persist', None))
+                    and callable(getattr(value, 'unpersist', None)))
+        except KeyError:
+            return False
+
+    def persist(self, value):
+        value.persist()
+
+    def unpersist(self, value):
+        value.unpersist()
+
+
+LAZY_FRAME_ENGINES = [SparkDataFrameEngine()]
+
+def register_lazy_frame_engine(engine):
+
+    if not isinstance(engine, LazyFrameEngine):
+        raise TypeError("[ engine ] must be a LazyFrameEngine instance")
+
+    # user registered engines take precedence over the built-in ones
+    LAZY_FRAME_ENGINES.insert(0, engine)
+
+def get_lazy_frame_engine(value):
+
+    for engine in LAZY_FRAME_ENGINES:
+        if engine.matches(value):
+            return engine
+
+    return None
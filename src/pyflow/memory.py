@@ -0,0 +1,195 @@
+import sys
+import warnings
+
+from . import metrics
+from .utils import is_instance_of
+from .utils import Memory_Ceiling_Warning
+from .utils import Memory_Ceiling_Error
+
+
+def sizeof_value(value, deep=False):
+    """Estimate the memory held by a value in bytes. Buffers of numpy arrays and
+    pandas objects are counted, containers are measured one level deep, and other
+    values fall back to sys.getsizeof. Lazily evaluated frames (e.g. Spark DataFrames)
+    hold no data on the driver and are counted as their python object only.
+
+    With deep=True, the python objects held by object columns of pandas objects (e.g.
+    strings) are measured too, which takes time proportional to the number of rows.
+    Otherwise only their pointers are counted.
+    """
+    if is_instance_of(value, 'numpy', 'ndarray'):
+        return int(value.nbytes)
+
+    if is_instance_of(value, 'pandas', 'DataFrame'):
+        return int(value.memory_usage(index=True, deep=deep).sum())
+
+    if is_instance_of(value, 'pandas', 'Series') or is_instance_of(value, 'pandas', 'Index'):
+        return int(value.memory_usage(index=True, deep=deep))
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(elem) for elem in value)
+
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+
+    return sys.getsizeof(value)
+
+
+class MemoryLedger(object):
+    """Bytes held by the values of the data nodes of a graph, by node uid, with the 
+    live and peak totals. When a value would bring the live bytes above the ceiling, 
+    a Memory_Ceiling_Warning is issued, or with on_ceiling='raise', a 
+    Memory_Ceiling_Error is raised before the value is stored.
+
+    dropped_nbytes holds, by node uid, the sizes of the values computed but dropped
+    because nothing needed them, until a value is stored for the node.
+
+    deep is passed to sizeof_value by the data nodes measuring their values."""
+
+    def __init__(self, ceiling=None, on_ceiling='warn', graph_alias=None, deep=False):
+
+        self.ceiling = ceiling
+        self.on_ceiling = on_ceiling
+        self.graph_alias = graph_alias
+        self.deep = deep
+
+        self.nbytes = dict()
+        self.dropped_nbytes = dict()
+        self.live_bytes = 0
+        self.peak_bytes = 0
+
+    def add(self, node_uid, nbytes):
+
+        live_bytes = self.live_bytes - self.nbytes.get(node_uid, 0) + nbytes
+
+        if self.ceiling is not None and live_bytes > self.ceiling:
+
+            message = ('Storing {} ({} bytes) brings the live memory of graph [ {} ] to {} bytes, '
+                       'above its ceiling of {} bytes'.format(node_uid, nbytes, self.graph_alias, live_bytes, self.ceiling))
+
+            if self.on_ceiling == 'raise':
+                raise Memory_Ceiling_Error(message)
+
+            warnings.warn(message, Memory_Ceiling_Warning)
+
+        self.nbytes[node_uid] = nbytes
+        self.dropped_nbytes.pop(node_uid, None)
+        self.live_bytes = live_bytes
+        self.peak_bytes = max(self.peak_bytes, live_bytes)
+
+        if metrics.METRICS_REGISTRY is not None:
+            metrics.METRICS_REGISTRY.record_live_bytes(self.graph_alias, self.live_bytes)
+
+    def drop(self, node_uid, nbytes):
+
+        self.dropped_nbytes[node_uid] = nbytes
+
+    def remove(self, node_uid):
+
+        self.live_bytes -= self.nbytes.pop(node_uid, 0)
+        self.dropped_nbytes.pop(node_uid, None)
+
+        if metrics.METRICS_REGISTRY is not None:
+            metrics.METRICS_REGISTRY.record_live_bytes(self.graph_alias, self.live_bytes)
+
+    def reset_peak(self):
+
+        self.peak_bytes = self.live_bytes
+
+
+class MemoryAwareOrder(object):
+    """Pick, among the op nodes ready to run, the one that increases the live bytes
+    the least: its estimated output size minus the size of the parent data nodes it
+    is the last consumer of (and that are released once it has run). Ties are broken
+    by the plan order.
+
+    The output size of an op node is the one measured on its previous run, or else
+    estimated as the total size of its inputs.
+    """
+    def __init__(self, plan, is_releasable):
+
+        self.plan = plan
+        self.is_releasable = is_releasable
+
+        self.plan_indices = {id(elem): i for i, elem in enumerate(plan.op_nodes)}
+
+        # sizes of the data nodes holding values, measured once
+        self.data_nbytes = dict()
+        self.live_bytes = 0
+
+        for data_node in plan.data_nodes:
+            if data_node.has_value():
+                self.add_data_node(data_node)
+
+        self.peak_live_bytes = self.live_bytes
+
+        # estimated sizes of data nodes not computed yet, in plan order
+        self.estimated_data_nbytes = dict()
+
+        for op_node in plan.op_nodes:
+
+            estimated_output_nbytes = self.estimate_output_nbytes(op_node)
+
+            for child_data_node_weak_ref in op_node.get_child_node_weak_refs():
+                self.estimated_data_nbytes[id(child_data_node_weak_ref())] = estimated_output_nbytes
+
+    def add_data_node(self, data_node):
+
+        if id(data_node) in self.data_nbytes:
+            return
+
+        # the size measured when the value was stored, if any
+        nbytes = data_node.nbytes if data_node.nbytes is not None else sizeof_value(data_node.value_holder.get())
+
+        self.data_nbytes[id(data_node)] = nbytes
+        self.live_bytes += self.data_nbytes[id(data_node)]
+
+    def remove_data_node(self, data_node):
+
+        self.live_bytes -= self.data_nbytes.pop(id(data_node), 0)
+
+    def get_data_nbytes(self, data_node):
+
+        if id(data_node) in self.data_nbytes:
+            return self.data_nbytes[id(data_node)]
+
+        return self.estimated_data_nbytes.get(id(data_node), 0)
+
+    def estimate_output_nbytes(self, op_node):
+
+        if getattr(op_node, 'output_nbytes', None) is not None:
+            return op_node.output_nbytes
+
+        return sum(self.get_data_nbytes(elem()) for elem in op_node.get_parent_node_weak_refs())
+
+    def get_live_bytes_delta(self, op_node, parent_data_nodes):
+
+        freed_nbytes = sum(self.get_data_nbytes(elem) for elem in parent_data_nodes
+                           if self.plan.consumer_counts[id(elem)] == 1 and self.is_releasable(self.plan, elem))
+
+        return self.estimate_output_nbytes(op_node) - freed_nbytes
+
+    def pop_next(self, ready_op_nodes, get_parent_data_nodes):
+
+        # the element op nodes of map op nodes are created while running
+        next_op_node = min(ready_op_nodes, key=lambda elem: (
+            self.get_live_bytes_delta(elem, get_parent_data_nodes(elem)), self.plan_indices.get(id(elem), -1)))
+
+        ready_op_nodes.remove(next_op_node)
+
+        return next_op_node
+
+    def on_op_node_stored(self, op_node):
+
+        # measured sizes are kept on the op node to order the next runs
+        op_node.output_nbytes = 0
+
+        for child_data_node_weak_ref in op_node.get_child_node_weak_refs():
+
+            child_data_node = child_data_node_weak_ref()
+
+            if child_data_node.has_value():
+                self.add_data_node(child_data_node)
+                op_node.output_nbytes += self.data_nbytes[id(child_data_node)]
+
+        self.peak_live_bytes = max(self.peak_live_bytes, self.live_bytes)
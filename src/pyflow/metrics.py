@@ -0,0 +1,242 @@
+from bisect import bisect_left
+import os
+import threading
+
+from .fusion import FusedOperationNode
+
+
+# the registry the execution path reports to, None while metrics are disabled, so that
+# the only cost of disabled metrics is checking it
+METRICS_REGISTRY = None
+
+# upper bounds (seconds) of the op duration histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+
+def enable_metrics(registry=None):
+    """Report the op nodes run, and the values released, to the registry (a new one by
+    default) until disable_metrics is called. Return the registry."""
+
+    global METRICS_REGISTRY
+
+    if not (registry is None or isinstance(registry, MetricsRegistry)):
+        raise TypeError("[ registry ] must be either None or MetricsRegistry type")
+
+    METRICS_REGISTRY = registry or MetricsRegistry()
+
+    return METRICS_REGISTRY
+
+def disable_metrics():
+
+    global METRICS_REGISTRY
+    METRICS_REGISTRY = None
+
+def get_metrics_registry():
+
+    return METRICS_REGISTRY
+
+def format_value(value):
+
+    if value == float('inf'):
+        return '+Inf'
+
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+def format_labels(label_names, label_values):
+
+    if len(label_names) == 0:
+        return ''
+
+    escaped_values = [str('' if elem is None else elem).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+                      for elem in label_values]
+
+    return '{' + ','.join('{}="{}"'.format(k, v) for k, v in zip(label_names, escaped_values)) + '}'
+
+def get_producer_name(data_node):
+
+    # data nodes are labeled by the op node computing them, raw inputs by nothing
+    if not data_node.has_parent_node_weak_refs():
+        return ''
+
+    return data_node.get_parent_node_weak_refs()[0]().alias
+
+
+class Counter(object):
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, label_names):
+
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+
+        self.values = dict()
+        self.lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, label_values):
+
+        return self.values.get(label_values, 0)
+
+    def get_samples(self):
+
+        with self.lock:
+            return [(self.name, label_values, value) for label_values, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+
+    type_name = 'gauge'
+
+    def set(self, label_values, value):
+
+        with self.lock:
+            self.values[label_values] = value
+
+
+class Histogram(Counter):
+    """Counts of the observed values by bucket upper bound, with their sum and count,
+    exported as cumulative buckets"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, label_names, buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, label_names)
+
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, label_values, value):
+
+        with self.lock:
+
+            if label_values not in self.values:
+                self.values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+
+            bucket_counts, _, _ = state = self.values[label_values]
+
+            bucket_counts[bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def get(self, label_values):
+
+        # the (sum, count) of the observed values
+        return tuple(self.values.get(label_values, [None, 0.0, 0])[1:])
+
+    def get_samples(self):
+
+        samples = []
+
+        with self.lock:
+
+            for label_values, (bucket_counts, total, count) in sorted(self.values.items()):
+
+                cumulative_count = 0
+
+                for bucket, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative_count += bucket_count
+                    samples.append((self.name + '_bucket', label_values + (format_value(bucket),), cumulative_count))
+
+                samples.append((self.name + '_sum', label_values, total))
+                samples.append((self.name + '_count', label_values, count))
+
+        return samples
+
+
+class MetricsRegistry(object):
+    """Counters and histograms of the runs of the graphs, labeled by graph alias and
+    op node name (data nodes by the op node computing them), exported in the
+    Prometheus text format:
+
+    - pyflow_ops_executed_total: op nodes run (the members of fused op nodes, and the
+      element op nodes of map op nodes, one by one)
+    - pyflow_op_duration_seconds: durations of the op nodes run
+    - pyflow_cache_hits_total: data nodes needed by a run that already held their value
+      (persisted, or not released since an earlier run)
+    - pyflow_cache_misses_total: data nodes a run had to compute
+    - pyflow_released_bytes_total: bytes of the values released
+    - pyflow_live_bytes: bytes held by the values of each graph (see memory_report)
+
+    Graphs sharing an alias share their metrics.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+
+        self.ops_executed = Counter('pyflow_ops_executed_total', 'Op nodes run.', ('graph', 'op'))
+        self.op_duration = Histogram('pyflow_op_duration_seconds', 'Duration of the op nodes run.', ('graph', 'op'), buckets)
+        self.cache_hits = Counter('pyflow_cache_hits_total', 'Data nodes needed by a run that already held their value.',
+                                  ('graph', 'op'))
+        self.cache_misses = Counter('pyflow_cache_misses_total', 'Data nodes computed by a run.', ('graph', 'op'))
+        self.released_bytes = Counter('pyflow_released_bytes_total', 'Bytes of the values released.', ('graph', 'op'))
+        self.live_bytes = Gauge('pyflow_live_bytes', 'Bytes held by the values of the graph.', ('graph',))
+
+        self.metrics = [self.ops_executed, self.op_duration, self.cache_hits, self.cache_misses,
+                        self.released_bytes, self.live_bytes]
+
+    def record_op_node(self, op_node, duration):
+
+        # the op nodes of a fused op node are timed one by one
+        if isinstance(op_node, FusedOperationNode):
+            for member_op_node, member_duration in zip(op_node.op_nodes, op_node.durations):
+                self.record_op_node(member_op_node, member_duration)
+            return
+
+        # the element op nodes of a map op node are recorded instead of its collection
+        if op_node.is_map:
+            return
+
+        label_values = (op_node.graph_alias, op_node.alias)
+
+        self.ops_executed.inc(label_values)
+        self.op_duration.observe(label_values, duration)
+
+    def record_plan(self, plan):
+
+        data_nodes = dict((id(elem), elem) for elem in plan.data_nodes + plan.target_nodes if elem.node_type == 'data')
+
+        for data_node in data_nodes.values():
+
+            # raw inputs and placeholders are never computed
+            if not data_node.has_parent_node_weak_refs():
+                continue
+
+            counter = self.cache_hits if data_node.has_value() else self.cache_misses
+            counter.inc((data_node.graph_alias, get_producer_name(data_node)))
+
+    def record_release(self, data_node, nbytes):
+
+        self.released_bytes.inc((data_node.graph_alias, get_producer_name(data_node)), nbytes)
+
+    def record_live_bytes(self, graph_alias, live_bytes):
+
+        self.live_bytes.set((graph_alias,), live_bytes)
+
+    def to_prometheus_text(self):
+
+        lines = []
+
+        for metric in self.metrics:
+
+            lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.type_name))
+
+            for name, label_values, value in metric.get_samples():
+
+                label_names = metric.label_names + (('le',) if name.endswith('_bucket') else ())
+                lines.append('{}{} {}'.format(name, format_labels(label_names, label_values), format_value(value)))
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus_text(self, filepath):
+
+        # write then rename, so that a textfile collector never reads a partial file
+        tmp_filepath = filepath + '.tmp'
+
+        with open(tmp_filepath, 'w') as f:
+            f.write(self.to_prometheus_text())
+
+        os.replace(tmp_filepath, filepath)
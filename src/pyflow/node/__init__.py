@@ -1,10 +1,12 @@
 from .data_holder_node import DataHolderNode
 from .data_node import DataNode
 from .operation_node import OperationNode  
+from .map_operation_node import MapOperationNode
 
 __all__ = [
 	"DataHolderNode",
 	"DataNode",
+	"MapOperationNode",
 	"OperationNode"
 	]
 	
\ No newline at end of file
@@ -53,61 +53,51 @@ class BaseNode(object):
 
         return self.node_uid
 
-    def get_dependency_ancestor_node_weak_refs(self):
+    def get_all_dependency_ancestor_node_weak_refs(self):
 
-        ancestors_weak_refs = list()
-        BaseNode._get_dependency_ancestor_node_weak_refs(self, ancestors_weak_refs)
-        return ancestors_weak_refs
-    
-    @staticmethod
-    def _get_dependency_ancestor_node_weak_refs(self, acc):
-        """
-        all data nodes needed that has no values,
-        all op until valued data nodes
-        """
-        for parent_node_weak_ref in self.get_parent_node_weak_refs():
+        return self._get_ancestor_node_weak_refs(stop_at_valued_data_nodes=False)
 
-            if parent_node_weak_ref().node_type == 'data' and parent_node_weak_ref().has_value():
-                continue
+    def _get_ancestor_node_weak_refs(self, stop_at_valued_data_nodes):
 
-            if parent_node_weak_ref().has_parent_node_weak_refs():
-                
-                if parent_node_weak_ref not in acc:
-                    acc.append(parent_node_weak_ref)
-                BaseNode._get_dependency_ancestor_node_weak_refs(parent_node_weak_ref(), acc)
+        # iterative traversal with visited set, so that deep graphs do not hit the 
+        # recursion limit and shared ancestors (diamonds) are walked only once
+        ancestors_weak_refs = list()
+        visited_node_ids = set()
+        stack = [self]
 
-            else:
+        while len(stack) > 0:
 
-                acc.append(parent_node_weak_ref)
+            node = stack.pop()
 
-    def get_all_dependency_ancestor_node_weak_refs(self):
+            for parent_node_weak_ref in node.get_parent_node_weak_refs():
 
-        ancestors_weak_refs = list()
-        BaseNode._get_all_dependency_ancestor_node_weak_refs(self, ancestors_weak_refs)
+                parent_node = parent_node_weak_ref()
 
-        return ancestors_weak_refs
-
-    @staticmethod
-    def _get_all_dependency_ancestor_node_weak_refs(self, acc):
-        """
-        all data nodes needed that has no values,
-        all op until valued data nodes
-        """
-        for parent_node_weak_ref in self.get_parent_node_weak_refs():
+                if stop_at_valued_data_nodes and parent_node.node_type == 'data' and parent_node.has_value():
+                    continue
 
-            if parent_node_weak_ref().has_parent_node_weak_refs():
-                
-                if parent_node_weak_ref not in acc:
-                    acc.append(parent_node_weak_ref)
-                BaseNode._get_all_dependency_ancestor_node_weak_refs(parent_node_weak_ref(), acc)
+                if id(parent_node) in visited_node_ids:
+                    continue
 
-            else:
+                visited_node_ids.add(id(parent_node))
+                ancestors_weak_refs.append(parent_node_weak_ref)
+                stack.append(parent_node)
 
-                acc.append(parent_node_weak_ref)
+        return ancestors_weak_refs
 
     def get_descendant_node_weak_refs(self):
 
         pass
+
+    def __getstate__(self):
+
+        # weak references cannot be pickled: nodes are pickled without their links,
+        # which are restored from the node indices of pack_nodes
+        state = self.__dict__.copy()
+        state['parent_node_weak_refs'] = []
+        state['child_node_weak_refs'] = []
+
+        return state
     
     def __del__(self):
 
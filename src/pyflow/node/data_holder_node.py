@@ -1,7 +1,5 @@
 from .base_node import BaseNode
-
-import numpy as np
-import pandas as pd
+from ..utils import is_instance_of
 
 
 class DataHolderNode(BaseNode):
@@ -19,7 +17,8 @@ class DataHolderNode(BaseNode):
         self.value = value
     
     def has_value(self):
-        return self.value != "__specialPFV__NoneData"
+        # comparing with != would compare elementwise for numpy arrays and pandas objects
+        return not (isinstance(self.value, str) and self.value == "__specialPFV__NoneData")
 
     def get_persisted_data_dim_as_str(self):
         """Currently supports dimensionality from:
@@ -51,10 +50,10 @@ class DataHolderNode(BaseNode):
             col_cnt = len(self.get().columns)
             self.dim = (row_cnt, col_cnt)
 
-        elif isinstance(self.value, np.ndarray):
+        elif is_instance_of(self.value, 'numpy', 'ndarray'):
             self.dim = self.value.shape
 
-        elif isinstance(self.value, pd.DataFrame):
+        elif is_instance_of(self.value, 'pandas', 'DataFrame'):
             self.dim = self.value.shape
 
         else:
@@ -1,15 +1,18 @@
 from .base_node import BaseNode
 from .data_holder_node import DataHolderNode
 
-from ..utils import view_full
-from ..utils import view_summary
+from ..utils import view_graph
+from ..lazy_frame import get_lazy_frame_engine
+from ..scheduler import build_plan
+from ..scheduler import SequentialExecutor
+from ..memory import sizeof_value
+from .. import metrics
 
 import warnings
-import copy
 
 class DataNode(BaseNode):
     
-    def __init__(self, graph_uid, graph_alias, node_uid, value="__specialPFV__NoneData", persist=False, verbose=False, alias=None, graph_dict=None):
+    def __init__(self, graph_uid, graph_alias, node_uid, value="__specialPFV__NoneData", persist=False, verbose=False, alias=None, graph_dict=None, memory_ledger=None):
         super(DataNode, self).__init__(graph_uid, graph_alias, node_uid, 'data', verbose, alias or 'data')
         
         self.value_holder = DataHolderNode(graph_uid, graph_alias, self.node_uid, value, self.verbose)
@@ -23,10 +26,60 @@ class DataNode(BaseNode):
         self.shallow_persist = False
         self.is_active = False
 
+        # the lazy frame engine used to persist the current value, if any
+        self.lazy_frame_engine = None
+
+        # the bytes of the current value are accounted in the memory ledger of the graph
+        self.memory_ledger = memory_ledger
+        self.nbytes = None
+
+        # the size of the last value computed for this node, kept after it is released
+        self.last_nbytes = None
+
+        # set when the op node computing this node was skipped by the last run (see
+        # GraphBuilder.add when=), until the node is computed again
+        self.skipped = False
+
     def set_value(self, value):
-        
+
+        nbytes = sizeof_value(value, self.is_deeply_sized())
+
+        if self.memory_ledger is not None:
+            self.memory_ledger.add(self.node_uid, nbytes)
+
+        self.nbytes = self.last_nbytes = nbytes
         self.value_holder.set_value(value)
+
+        if self.skipped:
+            self.unskip()
+
+    def is_deeply_sized(self):
+
+        return self.memory_ledger is not None and self.memory_ledger.deep
+
+    def drop_value(self, value):
+        """Discard a computed value that nothing needs, only recording its size in the
+        memory ledger"""
+
+        self.last_nbytes = sizeof_value(value, self.is_deeply_sized())
+
+        if self.memory_ledger is not None:
+            self.memory_ledger.drop(self.node_uid, self.last_nbytes)
         
+    def skip(self):
+
+        self.skipped = True
+        self.graph_dict.set_node_property(self.node_uid, 'is_skipped', True)
+
+    def unskip(self):
+
+        self.skipped = False
+        self.graph_dict.set_node_property(self.node_uid, 'is_skipped', False)
+
+    def is_skipped(self):
+
+        return self.skipped
+
     def has_value(self):
         
         return self.value_holder.has_value()
@@ -61,12 +114,6 @@ class DataNode(BaseNode):
 
         dependency_ancestor_node_uids += [self.node_uid]
 
-        graph_dict_copied = copy.deepcopy(self.graph_dict)
-
-        for dependency_ancestor_node_uid in dependency_ancestor_node_uids:
-            
-            graph_dict_copied[dependency_ancestor_node_uid]['is_activated'] = True
-
         _graph_attributes = {'data_node_fontsize': '10',
                              'data_node_shape': 'box',
                              'data_node_color': 'None',
@@ -80,10 +127,8 @@ class DataNode(BaseNode):
                              'graph_node_shapesize': '0.574',
                              'persist_record_shape': 'True'}
 
-        if summary :
-            return view_summary(graph_dict_copied, _graph_attributes, verbose=self.verbose, current_graph_uid=self.graph_uid)
-        else:
-            return view_full(graph_dict_copied, _graph_attributes, verbose=self.verbose, current_graph_uid=self.graph_uid)
+        return view_graph(self.graph_dict, self.graph_uid, _graph_attributes, summary, self.verbose, 
+                          activated_node_uids=dependency_ancestor_node_uids)
 
     def get(self, view_dependency=False, summary=True):
 
@@ -110,13 +155,22 @@ class DataNode(BaseNode):
             # as well as actually has data
             if self.is_persisted():
                 data_dim = self.get_persisted_data_dim_as_str()
-                self.graph_dict[self.node_uid]['data_dim'] = data_dim
+                self.graph_dict.set_node_property(self.node_uid, 'data_dim', data_dim)
 
             return self.value_holder.get()
 
         else:
 
-            self.activate_dependency_op_nodes()
+            # the value of a skipped node is None until it is computed again
+            if self.skipped:
+                return None
+
+            # a placeholder has no op node computing its value
+            if not self.has_parent_node_weak_refs():
+                raise ValueError("No value is bound to the placeholder {}, placeholders are bound "
+                                 "by apply_groups".format(self.node_uid))
+
+            plan = build_plan([self])
             
             if view_dependency:
 
@@ -125,30 +179,75 @@ class DataNode(BaseNode):
             if self.verbose:
                 print('computing for {}'.format(self.node_uid))
 
-            self.parent_node_weak_refs[0]().run()  # a data node can only have 1 op parent node
+            # the op nodes upstream, including those of grafted graphs, are run in a single 
+            # plan instead of through recursive get calls
+            SequentialExecutor().execute(plan)
 
             # update graph_dict
             if self.is_persisted():
                 data_dim = self.get_persisted_data_dim_as_str()
-                self.graph_dict[self.node_uid]['data_dim'] = data_dim
+                self.graph_dict.set_node_property(self.node_uid, 'data_dim', data_dim)
 
             return self.value_holder.get()
 
-    def activate_dependency_op_nodes(self):
-        
-        dependency_ancestor_node_weak_refs = self.get_dependency_ancestor_node_weak_refs()
-        dependency_op_nodes_weak_refs = [elem for elem in dependency_ancestor_node_weak_refs 
-                                  if elem().node_type == 'operation']
-        
-        for dependency_op_node_weak_ref in dependency_op_nodes_weak_refs:
-            dependency_op_node_weak_ref().activate()
+    def get_activated_child_op_node_count(self):
+
+        # the op nodes still awaiting their conditions may consume the value as well
+        return len([elem for elem in self.child_node_weak_refs if elem() is not None 
+                    and (elem().is_activated() or elem().is_awaiting_conditions)])
+
+    def persist_lazy_value(self):
+        """Persist a lazily evaluated value (e.g. Spark DataFrame) that is about to be 
+        consumed by more than one activated op node, or op node awaiting its conditions, 
+        so that its lineage is computed once.
+        """
+        if self.lazy_frame_engine is not None or not self.has_value():
+            return
+
+        if self.get_activated_child_op_node_count() < 2:
+            return
+
+        value = self.value_holder.get()
+        engine = get_lazy_frame_engine(value)
+
+        if engine is None:
+            return
+
+        if self.verbose:
+            print('persisting lazy value of {}'.format(self.node_uid))
+
+        engine.persist(value)
+        self.lazy_frame_engine = engine
+
+    def unpersist_lazy_value(self):
+
+        if self.lazy_frame_engine is None:
+            return
+
+        if self.verbose:
+            print('unpersisting lazy value of {}'.format(self.node_uid))
+
+        if self.has_value():
+            self.lazy_frame_engine.unpersist(self.value_holder.get())
+
+        self.lazy_frame_engine = None
 
     def release_memory(self):
         
         if self.is_persisted():
             warnings.warn("You are releasing a DataNode that was persisted!", RuntimeWarning)
 
-        self.graph_dict[self.node_uid]['data_dim'] = ''
+        self.unpersist_lazy_value()
+
+        self.graph_dict.set_node_property(self.node_uid, 'data_dim', '')
+
+        if self.memory_ledger is not None:
+            self.memory_ledger.remove(self.node_uid)
+
+        if metrics.METRICS_REGISTRY is not None and self.nbytes is not None:
+            metrics.METRICS_REGISTRY.record_release(self, self.nbytes)
+
+        self.nbytes = None
         
         del self.value_holder
 
@@ -0,0 +1,93 @@
+from .data_node import DataNode
+from .operation_node import CONDITION
+from .operation_node import OperationNode
+from ..utils import ExtendedRef
+
+
+class MapOperationNode(OperationNode):
+    """An op node calling its function on every element of the list-valued data node
+    passed as its first argument, along with its other arguments (see GraphBuilder.map_over).
+
+    The executors expand it, once its inputs are computed, into one element op node per
+    element, run like any other op node of the plan (see expand_map_op_node). The map
+    op node then runs to collect their outputs into the list of its child data node.
+    The element nodes are not part of the graph, and are dropped once collected.
+    """
+    def __init__(self, *args, **kwargs):
+        super(MapOperationNode, self).__init__(*args, **kwargs)
+
+        self.is_map = True
+
+        # the element op nodes of the current run, and the nodes they are linked to
+        self.element_op_nodes = None
+        self.element_nodes = []
+
+    def expand(self):
+        """Create, and return, an element op node for every element of the list: its
+        first parent is a data node holding the element, its other parents those of
+        the map op node. Its child data node holds the output for the element."""
+
+        parent_node_weak_refs = [elem for key, elem in zip(self.function_signature, self.parent_node_weak_refs)
+                                 if key != CONDITION]
+        function_signature = [elem for elem in self.function_signature if elem != CONDITION]
+
+        # the child data node holds the memory ledger of the graph
+        memory_ledger = self.child_node_weak_refs[0]().memory_ledger if self.has_child_node_weak_refs() else None
+
+        self.element_op_nodes = []
+
+        for i, value in enumerate(parent_node_weak_refs[0]().get()):
+
+            element_node_uid = '{}[{}]'.format(self.node_uid, i)
+
+            element_op_node = OperationNode(self.graph_uid, self.graph_alias, element_node_uid, self.function,
+                                            function_signature, 1, self.verbose, self.alias, self.graph_dict)
+
+            # the elements are already accounted for by the list holding them
+            input_data_node = DataNode(self.graph_uid, self.graph_alias, element_node_uid + '_input',
+                                       verbose=self.verbose, graph_dict=self.graph_dict)
+            input_data_node.set_value(value)
+
+            element_op_node.parent_node_weak_refs = [ExtendedRef(input_data_node)] + parent_node_weak_refs[1:]
+            input_data_node.child_node_weak_refs.append(ExtendedRef(element_op_node))
+
+            self.element_nodes += [element_op_node, input_data_node]
+
+            if self.has_child_node_weak_refs():
+
+                output_data_node = DataNode(self.graph_uid, self.graph_alias, element_node_uid + '_output',
+                                            verbose=self.verbose, graph_dict=self.graph_dict, memory_ledger=memory_ledger)
+
+                element_op_node.child_node_weak_refs.append(ExtendedRef(output_data_node))
+                output_data_node.parent_node_weak_refs.append(ExtendedRef(element_op_node))
+
+                self.element_nodes.append(output_data_node)
+
+            self.element_op_nodes.append(element_op_node)
+
+        return self.element_op_nodes
+
+    def gather_parent_values(self):
+        """Get the outputs of the element op nodes, as the only argument of compute"""
+
+        return [[elem.get_child_node_weak_refs()[0]().get() if elem.has_child_node_weak_refs() else None
+                 for elem in self.element_op_nodes]], {}
+
+    def compute(self, args, kwargs):
+
+        if self.verbose:
+            print('collecting {}'.format(self.node_uid))
+
+        return args[0]
+
+    def store_output_values(self, output_values, unneeded_data_node_ids=frozenset()):
+
+        super(MapOperationNode, self).store_output_values(output_values, unneeded_data_node_ids)
+
+        # the outputs of the element op nodes are now held by the list
+        for element_node in self.element_nodes:
+            if element_node.node_type == 'data' and element_node.has_value():
+                element_node.release_memory()
+
+        self.element_op_nodes = None
+        self.element_nodes = []
@@ -0,0 +1,809 @@
+from collections import defaultdict
+from collections import deque
+import heapq
+import os
+import time
+
+from . import metrics
+from .fusion import get_member_op_nodes
+from .serialization import pack_nodes
+from .serialization import unpack_nodes
+
+
+class ExecutionPlan(object):
+    """The op nodes to run, across every graph reachable from the target nodes,
+    in a topological order of the combined DAG.
+
+    Grafted graphs are not run through recursive DataNode.get calls: the plan walks
+    up the parent references of the target nodes regardless of the graph they belong
+    to, stopping at data nodes that already hold values.
+
+    consumer_counts holds, for every data node consumed in the plan, the number of
+    op nodes of the plan consuming it. Once they have all run, the data node is
+    released, unless it is persisted, shallowly persisted or a target.
+
+    unneeded_data_node_ids holds the outputs of the op nodes of the plan that are 
+    neither consumed in the plan, persisted, shallowly persisted nor targets (e.g. the
+    unused siblings of a multi-output op node). Their values are dropped as soon as
+    they are computed, instead of being stored.
+
+    The op nodes of a plan can be fused op nodes (see fuse_plan), standing for the
+    chains of op nodes they run.
+
+    gates holds the conditions (data node, expected truth value) each conditioned op
+    node runs under, see get_gates. The op nodes run after their conditions are 
+    computed, and are skipped when they are not met (see check_conditions).
+
+    map_op_node_ids holds the map op nodes of the plan, which the executors expand
+    into their element op nodes once ready (see expand_map_op_node).
+    """
+    def __init__(self, op_nodes, data_nodes, target_nodes):
+
+        self.op_nodes = op_nodes
+        self.data_nodes = data_nodes
+        self.target_nodes = target_nodes
+
+        self.target_node_ids = set(id(elem) for elem in target_nodes)
+
+        # measured by the executors ordering op nodes by memory
+        self.peak_live_bytes = None
+
+        self.consumer_counts = defaultdict(int)
+        self.dependencies = dict()
+
+        # the op node of the plan running each op node, fused or not
+        plan_op_nodes = dict()
+
+        for op_node in op_nodes:
+            for member_op_node in get_member_op_nodes(op_node):
+                plan_op_nodes[id(member_op_node)] = op_node
+
+        for op_node in op_nodes:
+
+            parent_data_nodes = get_unique_parent_data_nodes(op_node)
+
+            for parent_data_node in parent_data_nodes:
+                self.consumer_counts[id(parent_data_node)] += 1
+
+            # the op nodes of the plan producing the parent data nodes without values
+            # (placeholders have no op node, their values are bound before running)
+            self.dependencies[op_node] = set(
+                plan_op_nodes[id(elem.get_parent_node_weak_refs()[0]())] for elem in parent_data_nodes
+                if not elem.has_value() and elem.has_parent_node_weak_refs())
+
+        # conditions shared by every consumer of the outputs of an op node, which are
+        # not parents of the op node, are consumed by it as well
+        self.gates = get_gates(self, plan_op_nodes)
+        self.gate_data_nodes = dict()
+
+        for op_node, gates in self.gates.items():
+
+            parent_data_node_ids = set(id(elem) for elem in get_unique_parent_data_nodes(op_node))
+            gate_data_nodes = [elem for elem, _ in gates if id(elem) not in parent_data_node_ids]
+
+            if len(gate_data_nodes) == 0:
+                continue
+
+            self.gate_data_nodes[op_node] = gate_data_nodes
+
+            for gate_data_node in gate_data_nodes:
+
+                self.consumer_counts[id(gate_data_node)] += 1
+
+                if not gate_data_node.has_value() and gate_data_node.has_parent_node_weak_refs():
+                    self.dependencies[op_node].add(plan_op_nodes[id(gate_data_node.get_parent_node_weak_refs()[0]())])
+
+        if len(self.gate_data_nodes) > 0:
+            self.op_nodes = sort_op_nodes(self.op_nodes, self.dependencies)
+
+        self.map_op_node_ids = set(id(elem) for elem in self.op_nodes if getattr(elem, 'is_map', False))
+
+        self.unneeded_data_node_ids = set()
+
+        for op_node in op_nodes:
+            for child_data_node_weak_ref in op_node.get_child_node_weak_refs():
+
+                child_data_node = child_data_node_weak_ref()
+
+                if self.consumer_counts.get(id(child_data_node), 0) == 0 and is_releasable(self, child_data_node):
+                    self.unneeded_data_node_ids.add(id(child_data_node))
+
+    def get_graph_uids(self):
+
+        return set(elem.graph_uid for elem in self.op_nodes)
+
+    def get_nodes(self):
+
+        # the nodes of the plan, and the outputs of its op nodes (e.g. unneeded siblings)
+        nodes = []
+        node_ids = set()
+
+        for node in ([elem for op_node in self.op_nodes for elem in get_member_op_nodes(op_node)] + self.data_nodes + 
+                     [elem() for op_node in self.op_nodes for elem in op_node.get_child_node_weak_refs()]):
+
+            if id(node) not in node_ids:
+                node_ids.add(id(node))
+                nodes.append(node)
+
+        return nodes
+
+    def __getstate__(self):
+
+        # the links between nodes and the dicts keyed by node ids are encoded with node 
+        # indices, since ids change once unpickled
+        nodes = self.get_nodes()
+        node_indices = {id(elem): i for i, elem in enumerate(nodes)}
+
+        state = self.__dict__.copy()
+        state['packed_nodes'] = pack_nodes(nodes)
+        state['consumer_counts'] = {node_indices[k]: v for k, v in self.consumer_counts.items() if k in node_indices}
+        state['unneeded_data_node_ids'] = [node_indices[elem] for elem in self.unneeded_data_node_ids]
+        state.pop('target_node_ids')
+        state.pop('map_op_node_ids')
+
+        return state
+
+    def __setstate__(self, state):
+
+        nodes = unpack_nodes(state.pop('packed_nodes'))
+
+        self.__dict__.update(state)
+
+        # outputs of op nodes not otherwise held by the plan, e.g. unneeded siblings
+        self.nodes = nodes
+
+        self.target_node_ids = set(id(elem) for elem in self.target_nodes)
+        self.map_op_node_ids = set(id(elem) for elem in self.op_nodes if getattr(elem, 'is_map', False))
+        self.consumer_counts = defaultdict(int, {id(nodes[k]): v for k, v in state['consumer_counts'].items()})
+        self.unneeded_data_node_ids = set(id(nodes[elem]) for elem in state['unneeded_data_node_ids'])
+
+    def __len__(self):
+
+        return len(self.op_nodes)
+
+    def __repr__(self):
+
+        return 'ExecutionPlan({} op nodes across {} graph(s))'.format(len(self.op_nodes), len(self.get_graph_uids()))
+
+
+def get_unique_parent_data_nodes(op_node):
+
+    # the same data node can be passed more than once to an op node, e.g. f(a, a)
+    parent_data_nodes = []
+    parent_data_node_ids = set()
+
+    for parent_data_node_weak_ref in op_node.get_parent_node_weak_refs():
+
+        parent_data_node = parent_data_node_weak_ref()
+
+        if id(parent_data_node) not in parent_data_node_ids:
+            parent_data_node_ids.add(id(parent_data_node))
+            parent_data_nodes.append(parent_data_node)
+
+    return parent_data_nodes
+
+def get_consumed_data_nodes(plan, op_node):
+
+    return get_unique_parent_data_nodes(op_node) + plan.gate_data_nodes.get(op_node, [])
+
+def get_edge_gates(gates, consumer, parent_index, parent_data_node):
+
+    # the conditions under which the consumer needs the parent data node: its own, but
+    # those on the parent data node itself, which is needed to evaluate them
+    edge_gates = set(elem for elem in gates.get(consumer, []) if elem[0] is not parent_data_node)
+
+    first_op_node = get_member_op_nodes(consumer)[0]
+
+    # a branch op node needs its then value when the predicate holds, and its
+    # otherwise value when it does not
+    if first_op_node.is_branch and parent_index > 0:
+
+        predicate_node = first_op_node.get_parent_node_weak_refs()[0]()
+
+        if predicate_node is not parent_data_node:
+            edge_gates.add((predicate_node, parent_index == 1))
+
+    return edge_gates
+
+def get_gates(plan, plan_op_nodes):
+    """The conditions (data node, expected truth value) under which each op node of the
+    plan runs: the conditions it was added with (when=), and the conditions shared by 
+    all the consumers of its outputs in the plan, including the branch op nodes picking
+    its output. The op nodes only computing the inactive side of a branch are therefore
+    skipped along with it. 
+    
+    The op nodes downstream of conditioned op nodes have no conditions (an empty list).
+    The other op nodes are left out, and never skipped.
+    """
+    gates = dict()
+
+    if not any(get_member_op_nodes(elem)[0].is_conditioned() for elem in plan.op_nodes):
+        return gates
+
+    for op_node in reversed(plan.op_nodes):
+
+        op_node_gates = set((elem(), True) for elem in get_member_op_nodes(op_node)[0].get_condition_node_weak_refs())
+        inherited_gates = None
+
+        for child_data_node_weak_ref in op_node.get_child_node_weak_refs():
+
+            child_data_node = child_data_node_weak_ref()
+
+            # a requested output is needed whatever the conditions
+            if id(child_data_node) in plan.target_node_ids or child_data_node.is_shallowly_persisted():
+                inherited_gates = set()
+                break
+
+            for consumer_weak_ref in child_data_node.get_child_node_weak_refs():
+
+                consumer = plan_op_nodes.get(id(consumer_weak_ref()))
+
+                # consumers outside of the plan are not run by it
+                if consumer is None:
+                    continue
+
+                parent_index = [elem() for elem in consumer_weak_ref().get_parent_node_weak_refs()].index(child_data_node)
+                edge_gates = get_edge_gates(gates, consumer, parent_index, child_data_node)
+
+                inherited_gates = edge_gates if inherited_gates is None else inherited_gates & edge_gates
+
+        op_node_gates |= inherited_gates or set()
+
+        if len(op_node_gates) > 0:
+            gates[op_node] = sorted(op_node_gates, key=lambda elem: (elem[0].node_uid, elem[1]))
+
+    # the op nodes downstream of conditioned op nodes, without conditions of their own,
+    # are checked as well, since they are skipped along with them
+    for op_node in plan.op_nodes:
+
+        if op_node in gates:
+            continue
+
+        for parent_data_node in get_unique_parent_data_nodes(op_node):
+
+            producer = plan_op_nodes.get(id(parent_data_node.get_parent_node_weak_refs()[0]())) if (
+                parent_data_node.has_parent_node_weak_refs()) else None
+
+            if producer in gates:
+                gates[op_node] = []
+                break
+
+    return gates
+
+def sort_op_nodes(op_nodes, dependencies):
+
+    # topological order of the op nodes, keeping their order where possible
+    indices = {id(elem): i for i, elem in enumerate(op_nodes)}
+    remaining_dependency_counts = {k: len(v) for k, v in dependencies.items()}
+
+    dependents = defaultdict(list)
+
+    for op_node, op_node_dependencies in dependencies.items():
+        for dependency in op_node_dependencies:
+            dependents[dependency].append(op_node)
+
+    heap = [(indices[id(elem)], elem) for elem in op_nodes if remaining_dependency_counts[elem] == 0]
+    heapq.heapify(heap)
+
+    sorted_op_nodes = []
+
+    while len(heap) > 0:
+
+        _, op_node = heapq.heappop(heap)
+        sorted_op_nodes.append(op_node)
+
+        for dependent in dependents[op_node]:
+            remaining_dependency_counts[dependent] -= 1
+            if remaining_dependency_counts[dependent] == 0:
+                heapq.heappush(heap, (indices[id(dependent)], dependent))
+
+    return sorted_op_nodes
+
+def build_plan(target_nodes):
+    """Build the execution plan computing the target nodes (data nodes, or op nodes
+    without outputs), from an iterative depth first post-order traversal, which is
+    a topological order."""
+
+    op_nodes = []
+    data_nodes = []
+    visited_node_ids = set()
+
+    for target_node in target_nodes:
+
+        # a requested data node that already holds its value needs no computation
+        if target_node.node_type == 'data' and target_node.has_value():
+            continue
+
+        stack = [(target_node, False)]
+
+        while len(stack) > 0:
+
+            node, is_expanded = stack.pop()
+
+            if is_expanded:
+
+                if node.node_type == 'operation':
+                    op_nodes.append(node)
+                else:
+                    data_nodes.append(node)
+
+                continue
+
+            if id(node) in visited_node_ids:
+                continue
+
+            visited_node_ids.add(id(node))
+            stack.append((node, True))
+
+            if node.node_type == 'data':
+
+                if node.has_value():
+                    continue
+
+                # a data node can only have 1 op parent node
+                parents = node.get_parent_node_weak_refs()[0:1]
+
+            else:
+
+                parents = node.get_parent_node_weak_refs()
+
+            for parent_node_weak_ref in reversed(parents):
+                if id(parent_node_weak_ref()) not in visited_node_ids:
+                    stack.append((parent_node_weak_ref(), False))
+
+    return ExecutionPlan(op_nodes, data_nodes, list(target_nodes))
+
+
+ORDERS = [None, 'memory', 'critical_path']
+
+
+def validate_order(order, memory_budget):
+
+    if order not in ORDERS:
+        raise ValueError("Expected order to be None, 'memory' or 'critical_path', "
+                         "instead got '{}'".format(order))
+
+    if order == 'critical_path' and memory_budget is not None:
+        raise ValueError("memory_budget can only be used with the memory order")
+
+    if memory_budget is not None and (not isinstance(memory_budget, int) or memory_budget < 1):
+        raise ValueError("Expected memory_budget to be a positive integer (bytes), "
+                         "instead got '{}'".format(memory_budget))
+
+def get_dependents(plan):
+
+    dependents = defaultdict(list)
+
+    for op_node, dependencies in plan.dependencies.items():
+        for dependency in dependencies:
+            dependents[dependency].append(op_node)
+
+    return dependents
+
+
+class SequentialExecutor(object):
+    """Run the op nodes of the plan one after the other. 
+
+    With order=None, they run in the plan order. With order='memory', the next op 
+    node is the ready one increasing the live bytes the least (see MemoryAwareOrder), 
+    so that large intermediates are released as early as possible. The critical path
+    order makes no difference to a single worker, so it runs in the plan order.
+
+    With a timing_history, the duration of every op node is recorded.
+    """
+    def __init__(self, order=None, timing_history=None):
+
+        validate_order(order, None)
+        self.order = order
+        self.timing_history = timing_history
+
+    def execute(self, plan):
+
+        for _ in self.execute_iter(plan):
+            pass
+
+    def execute_iter(self, plan):
+        """Run the plan, yielding the target data nodes as soon as they are stored"""
+
+        start_plan(plan)
+
+        if self.order != 'memory':
+
+            for op_node in plan.op_nodes:
+
+                if not check_conditions(plan, op_node):
+                    continue
+
+                # the element op nodes of a map op node run before it collects their outputs
+                element_op_nodes = expand_map_op_node(plan, op_node) if id(op_node) in plan.map_op_node_ids else []
+
+                for elem in element_op_nodes + [op_node]:
+
+                    args, kwargs = elem.gather_parent_values()
+                    output_values, duration = timed_compute(elem, args, kwargs)
+                    finish_op_node(plan, elem, output_values, duration, self.timing_history)
+
+                yield from get_stored_target_nodes(plan, op_node)
+
+            return
+
+        from .memory import MemoryAwareOrder
+
+        memory_aware_order = MemoryAwareOrder(plan, is_releasable)
+
+        remaining_dependency_counts = {k: len(v) for k, v in plan.dependencies.items()}
+        dependents = get_dependents(plan)
+
+        ready_op_nodes = check_ready_op_nodes(plan, [elem for elem in plan.op_nodes if remaining_dependency_counts[elem] == 0], 
+                                              dependents, remaining_dependency_counts, memory_aware_order)
+
+        while len(ready_op_nodes) > 0:
+
+            op_node = memory_aware_order.pop_next(ready_op_nodes, get_unique_parent_data_nodes)
+
+            args, kwargs = op_node.gather_parent_values()
+            output_values, duration = timed_compute(op_node, args, kwargs)
+            finish_op_node(plan, op_node, output_values, duration, self.timing_history, memory_aware_order)
+
+            ready_op_nodes += get_ready_dependents(plan, op_node, dependents, remaining_dependency_counts, memory_aware_order)
+
+            yield from get_stored_target_nodes(plan, op_node)
+
+        plan.peak_live_bytes = memory_aware_order.peak_live_bytes
+
+
+class ThreadedExecutor(object):
+    """Run the op nodes of the plan in a thread pool, as soon as the op nodes
+    producing their inputs are done.
+
+    Only the function calls run in the worker threads: gathering the inputs, storing
+    the outputs and releasing memory happen in the calling thread, so the nodes and
+    graph_dict are never updated concurrently.
+
+    With order='memory', ready op nodes are launched in the order of MemoryAwareOrder,
+    at most max_workers at a time. With a memory_budget (bytes), implying the memory 
+    order, an op node is not launched while the live bytes plus the estimated outputs 
+    of the running op nodes and its own would exceed the budget, unless nothing is 
+    running.
+
+    With order='critical_path', ready op nodes are launched by decreasing remaining
+    critical path length, computed from the durations of the timing_history (see 
+    CriticalPathOrder), so that long chains of op nodes start first.
+    """
+    def __init__(self, max_workers=None, order=None, memory_budget=None, timing_history=None):
+
+        if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+            raise ValueError("Expected max_workers to be a positive integer, "
+                             "instead got '{}'".format(max_workers))
+
+        validate_order(order, memory_budget)
+
+        self.max_workers = max_workers
+        self.order = 'memory' if memory_budget is not None else order
+        self.memory_budget = memory_budget
+        self.timing_history = timing_history
+
+    def execute(self, plan):
+
+        for _ in self.execute_iter(plan):
+            pass
+
+    def execute_iter(self, plan):
+        """Run the plan, yielding the target data nodes in the order they are stored,
+        while the op nodes already launched keep running"""
+
+        from concurrent.futures import ThreadPoolExecutor
+        from concurrent.futures import wait
+        from concurrent.futures import FIRST_COMPLETED
+
+        start_plan(plan)
+
+        remaining_dependency_counts = {k: len(v) for k, v in plan.dependencies.items()}
+        dependents = get_dependents(plan)
+
+        ready_order = None
+        memory_aware_order = None
+
+        if self.order == 'memory':
+            from .memory import MemoryAwareOrder
+            memory_aware_order = ready_order = MemoryAwareOrder(plan, is_releasable)
+
+        elif self.order == 'critical_path':
+            from .timings import CriticalPathOrder
+            from .timings import OpTimingHistory
+            ready_order = CriticalPathOrder(plan, self.timing_history or OpTimingHistory(), dependents)
+
+        ready_op_nodes = check_ready_op_nodes(plan, [elem for elem in plan.op_nodes if remaining_dependency_counts[elem] == 0], 
+                                              dependents, remaining_dependency_counts, memory_aware_order)
+
+        # same default as concurrent.futures
+        n_workers = self.max_workers or min(32, (os.cpu_count() or 1) + 4)
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+
+            futures = dict()
+            reserved_nbytes = dict()
+
+            while len(ready_op_nodes) > 0 or len(futures) > 0:
+
+                if ready_order is None:
+
+                    for op_node in ready_op_nodes:
+                        args, kwargs = op_node.gather_parent_values()
+                        futures[executor.submit(timed_compute, op_node, args, kwargs)] = op_node
+
+                    ready_op_nodes = []
+
+                else:
+
+                    # launching one op node per free worker keeps the launch order meaningful
+                    while len(ready_op_nodes) > 0 and len(futures) < n_workers:
+
+                        op_node = ready_order.pop_next(ready_op_nodes, get_unique_parent_data_nodes)
+
+                        if memory_aware_order is not None:
+
+                            estimated_output_nbytes = memory_aware_order.estimate_output_nbytes(op_node)
+
+                            if (self.memory_budget is not None and len(futures) > 0 and 
+                                memory_aware_order.live_bytes + sum(reserved_nbytes.values()) + estimated_output_nbytes > self.memory_budget):
+                                ready_op_nodes.append(op_node)
+                                break
+
+                        args, kwargs = op_node.gather_parent_values()
+                        future = executor.submit(timed_compute, op_node, args, kwargs)
+                        futures[future] = op_node
+
+                        if memory_aware_order is not None:
+                            reserved_nbytes[future] = estimated_output_nbytes
+
+                done_futures, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+                for future in done_futures:
+
+                    op_node = futures.pop(future)
+                    reserved_nbytes.pop(future, None)
+
+                    try:
+                        output_values, duration = future.result()
+                    except BaseException:
+                        for elem in futures:
+                            elem.cancel()
+                        raise
+
+                    finish_op_node(plan, op_node, output_values, duration, self.timing_history, memory_aware_order)
+
+                    ready_op_nodes += get_ready_dependents(plan, op_node, dependents, remaining_dependency_counts, 
+                                                           memory_aware_order)
+
+                    yield from get_stored_target_nodes(plan, op_node)
+
+        if memory_aware_order is not None:
+            plan.peak_live_bytes = memory_aware_order.peak_live_bytes
+
+
+def start_plan(plan):
+
+    if metrics.METRICS_REGISTRY is not None:
+        metrics.METRICS_REGISTRY.record_plan(plan)
+
+    # activated op nodes are highlighted by view, and counted when deciding
+    # whether a lazily evaluated value needs to be persisted. Conditioned op nodes
+    # are only activated once their conditions are met (see check_conditions), and
+    # are counted as possible consumers until then
+    for op_node in plan.op_nodes:
+
+        if op_node not in plan.gates:
+            op_node.activate()
+            continue
+
+        get_member_op_nodes(op_node)[0].is_awaiting_conditions = True
+
+        # skipped by an earlier run
+        for member_op_node in get_member_op_nodes(op_node):
+            member_op_node.graph_dict.set_node_property(member_op_node.node_uid, 'is_skipped', False)
+
+        for child_data_node_weak_ref in op_node.get_child_node_weak_refs():
+            if child_data_node_weak_ref().is_skipped():
+                child_data_node_weak_ref().unskip()
+
+def get_condition_data_nodes(plan):
+    """The data nodes whose values are read to decide whether op nodes are skipped: the
+    conditions of the gates, and the predicates of the branch op nodes"""
+
+    condition_data_nodes = dict()
+
+    for op_node, gates in plan.gates.items():
+
+        for condition_node, _ in gates:
+            condition_data_nodes[id(condition_node)] = condition_node
+
+        first_op_node = get_member_op_nodes(op_node)[0]
+
+        if first_op_node.is_branch:
+            predicate_node = first_op_node.get_parent_node_weak_refs()[0]()
+            condition_data_nodes[id(predicate_node)] = predicate_node
+
+    return list(condition_data_nodes.values())
+
+def is_skipped(plan, op_node):
+
+    for condition_node, expected in plan.gates[op_node]:
+        if condition_node.is_skipped() or bool(condition_node.get()) != expected:
+            return True
+
+    first_op_node = get_member_op_nodes(op_node)[0]
+
+    # a branch op node only needs the predicate and the value it picks
+    if first_op_node.is_branch:
+
+        predicate_node, then_node, otherwise_node = [elem() for elem in first_op_node.get_parent_node_weak_refs()]
+
+        if predicate_node.is_skipped():
+            return True
+
+        return (then_node if bool(predicate_node.get()) else otherwise_node).is_skipped()
+
+    return any(elem.is_skipped() for elem in get_unique_parent_data_nodes(op_node))
+
+def skip_op_node(plan, op_node, memory_aware_order=None, release_result=None):
+
+    get_member_op_nodes(op_node)[0].is_awaiting_conditions = False
+
+    for member_op_node in get_member_op_nodes(op_node):
+        member_op_node.graph_dict.set_node_property(member_op_node.node_uid, 'is_skipped', True)
+
+    for child_data_node_weak_ref in op_node.get_child_node_weak_refs():
+        child_data_node_weak_ref().skip()
+
+    release_consumed_data_nodes(plan, op_node, memory_aware_order, release_result)
+
+def check_conditions(plan, op_node, memory_aware_order=None, release_result=None):
+    """Skip a ready op node whose conditions are not met, or consuming the outputs of 
+    skipped op nodes, else activate it. Return whether the op node is to be run."""
+
+    if op_node not in plan.gates:
+        return True
+
+    if is_skipped(plan, op_node):
+        skip_op_node(plan, op_node, memory_aware_order, release_result)
+        return False
+
+    op_node.activate()
+
+    return True
+
+def get_ready_dependents(plan, op_node, dependents, remaining_dependency_counts, memory_aware_order=None, 
+                         release_result=None):
+
+    ready_op_nodes = []
+
+    for dependent in dependents[op_node]:
+        remaining_dependency_counts[dependent] -= 1
+        if remaining_dependency_counts[dependent] == 0:
+            ready_op_nodes.append(dependent)
+
+    return check_ready_op_nodes(plan, ready_op_nodes, dependents, remaining_dependency_counts, memory_aware_order, 
+                                release_result)
+
+def expand_map_op_node(plan, op_node):
+    """Create the element op nodes of a ready map op node (see MapOperationNode.expand),
+    consuming the element data nodes and the other inputs of the map op node, and 
+    return them. They run like the op nodes of the plan, before the map op node."""
+
+    element_op_nodes = op_node.expand()
+
+    for element_op_node in element_op_nodes:
+
+        for parent_data_node in get_unique_parent_data_nodes(element_op_node):
+            plan.consumer_counts[id(parent_data_node)] += 1
+
+        element_op_node.activate()
+
+    return element_op_nodes
+
+def check_ready_op_nodes(plan, ready_op_nodes, dependents, remaining_dependency_counts, memory_aware_order=None, 
+                         release_result=None):
+    """Skip the ready op nodes not to be run (see check_conditions), and the op nodes 
+    becoming ready as a result that are not to be run either. Ready map op nodes are 
+    replaced by their element op nodes, and are ready again once these have run. Return
+    the ready op nodes left to run, in order."""
+
+    if len(plan.gates) == 0 and len(plan.map_op_node_ids) == 0:
+        return ready_op_nodes
+
+    checked_op_nodes = []
+    queue = deque(ready_op_nodes)
+
+    while len(queue) > 0:
+
+        op_node = queue.popleft()
+
+        if check_conditions(plan, op_node, memory_aware_order, release_result):
+
+            if id(op_node) in plan.map_op_node_ids and op_node.element_op_nodes is None:
+
+                element_op_nodes = expand_map_op_node(plan, op_node)
+
+                for element_op_node in element_op_nodes:
+                    dependents[element_op_node] = [op_node]
+
+                # an empty list is collected right away
+                if len(element_op_nodes) > 0:
+                    remaining_dependency_counts[op_node] = len(element_op_nodes)
+                    queue.extend(element_op_nodes)
+                    continue
+
+            checked_op_nodes.append(op_node)
+            continue
+
+        for dependent in dependents[op_node]:
+            remaining_dependency_counts[dependent] -= 1
+            if remaining_dependency_counts[dependent] == 0:
+                queue.append(dependent)
+
+    return checked_op_nodes
+
+def is_releasable(plan, data_node):
+
+    return not (data_node.is_persisted() or data_node.is_shallowly_persisted() 
+                or id(data_node) in plan.target_node_ids)
+
+def get_stored_target_nodes(plan, op_node):
+
+    return [elem() for elem in op_node.get_child_node_weak_refs() if id(elem()) in plan.target_node_ids]
+
+def timed_compute(op_node, args, kwargs):
+
+    start_time = time.perf_counter()
+    output_values = op_node.compute(args, kwargs)
+
+    return output_values, time.perf_counter() - start_time
+
+def finish_op_node(plan, op_node, output_values, duration, timing_history=None, memory_aware_order=None):
+
+    op_node.store_output_values(output_values, plan.unneeded_data_node_ids)
+
+    if timing_history is not None:
+        timing_history.record(op_node, duration)
+
+    if metrics.METRICS_REGISTRY is not None:
+        metrics.METRICS_REGISTRY.record_op_node(op_node, duration)
+
+    for child_data_node_weak_ref in op_node.get_child_node_weak_refs():
+
+        child_data_node = child_data_node_weak_ref()
+
+        if child_data_node.is_persisted():
+            child_data_node.graph_dict.set_node_property(
+                child_data_node.node_uid, 'data_dim', child_data_node.get_persisted_data_dim_as_str())
+
+    if memory_aware_order is not None:
+        memory_aware_order.on_op_node_stored(op_node)
+
+    release_consumed_data_nodes(plan, op_node, memory_aware_order)
+
+    op_node.deactivate()
+
+def release_consumed_data_nodes(plan, op_node, memory_aware_order=None, release_result=None):
+    """Release the data nodes consumed by an op node, run or skipped, once their 
+    consumers have all run. release_result is called with each of them, to release 
+    the copies held outside their data nodes (see DistributedExecutor)."""
+
+    for parent_data_node in get_consumed_data_nodes(plan, op_node):
+
+        plan.consumer_counts[id(parent_data_node)] -= 1
+
+        if plan.consumer_counts[id(parent_data_node)] > 0:
+            continue
+
+        if release_result is not None:
+            release_result(parent_data_node)
+
+        if not is_releasable(plan, parent_data_node) or not parent_data_node.has_value():
+            continue
+
+        parent_data_node.release_memory()
+
+        if memory_aware_order is not None:
+            memory_aware_order.remove_data_node(parent_data_node)
@@ -0,0 +1,65 @@
+from .utils import ExtendedRef
+
+
+def get_ancestor_closure(nodes):
+    """The nodes, followed by every ancestor of theirs not among them, across graphs"""
+
+    closure = list(nodes)
+    visited_node_ids = set(id(elem) for elem in nodes)
+    stack = list(nodes)
+
+    while len(stack) > 0:
+
+        for parent_node_weak_ref in stack.pop().get_parent_node_weak_refs():
+
+            parent_node = parent_node_weak_ref()
+
+            if id(parent_node) not in visited_node_ids:
+                visited_node_ids.add(id(parent_node))
+                closure.append(parent_node)
+                stack.append(parent_node)
+
+    return closure
+
+def pack_nodes(nodes):
+    """Encode the links between the nodes as indices into the list of nodes, since weak
+    references cannot be pickled (nodes are pickled without their links). Links to
+    nodes outside the list are dropped."""
+
+    node_indices = {id(elem): i for i, elem in enumerate(nodes)}
+
+    def get_indices(node_weak_refs):
+        return [node_indices[id(elem())] for elem in node_weak_refs
+                if elem() is not None and id(elem()) in node_indices]
+
+    return [(node, get_indices(node.get_parent_node_weak_refs()), get_indices(node.get_child_node_weak_refs()))
+            for node in nodes]
+
+def unpack_nodes(packed_nodes):
+    """Restore the links encoded by pack_nodes, and return the list of nodes"""
+
+    nodes = [elem[0] for elem in packed_nodes]
+
+    for node, parent_indices, child_indices in packed_nodes:
+        node.parent_node_weak_refs = [ExtendedRef(nodes[i]) for i in parent_indices]
+        node.child_node_weak_refs = [ExtendedRef(nodes[i]) for i in child_indices]
+
+    return nodes
+
+def dumps(obj):
+
+    import pickle
+
+    # cloudpickle also ships functions defined in __main__, lambdas and closures
+    try:
+        import cloudpickle
+    except ImportError:
+        return pickle.dumps(obj)
+
+    return cloudpickle.dumps(obj)
+
+def loads(data):
+
+    import pickle
+
+    return pickle.loads(data)
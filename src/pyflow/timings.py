@@ -0,0 +1,124 @@
+import json
+import os
+
+from .fusion import FusedOperationNode
+
+
+# weight of the latest duration in the moving average
+SMOOTHING = 0.3
+
+
+def get_function_key(function):
+
+    # functions are identified by where they are defined, so that the durations
+    # recorded for a function apply to every op node and graph using it
+    key = '{}.{}'.format(getattr(function, '__module__', None),
+                         getattr(function, '__qualname__', getattr(function, '__name__', repr(function))))
+
+    # lambdas of the same scope share their qualified name, so they are told apart
+    # by the line defining them
+    if getattr(function, '__name__', None) == '<lambda>' and hasattr(function, '__code__'):
+        key += ':{}'.format(function.__code__.co_firstlineno)
+
+    return key
+
+
+class OpTimingHistory(object):
+    """Moving average of the duration of op nodes across runs, keyed by function
+    identity. With a filepath, the history is loaded from and saved to that json
+    file, so that it survives restarts."""
+
+    def __init__(self, filepath=None):
+
+        self.filepath = filepath
+        self.durations = dict()
+
+        if filepath is not None and os.path.exists(filepath):
+            self.load()
+
+    def record(self, op_node, duration):
+
+        # the op nodes of a fused op node are timed one by one
+        if isinstance(op_node, FusedOperationNode):
+            for member_op_node, member_duration in zip(op_node.op_nodes, op_node.durations):
+                self.record(member_op_node, member_duration)
+            return
+
+        # the element op nodes of a map op node are timed instead of its collection
+        if op_node.is_map:
+            return
+
+        key = get_function_key(op_node.function)
+
+        if key in self.durations:
+            self.durations[key] = (1 - SMOOTHING) * self.durations[key] + SMOOTHING * duration
+        else:
+            self.durations[key] = duration
+
+    def get(self, op_node, default=None):
+
+        if isinstance(op_node, FusedOperationNode):
+            durations = [self.get(elem, default) for elem in op_node.op_nodes]
+            return None if None in durations else sum(durations)
+
+        return self.durations.get(get_function_key(op_node.function), default)
+
+    def get_default_duration(self):
+
+        # op nodes never run before are assumed to take the average duration
+        if len(self.durations) == 0:
+            return 1.0
+
+        return sum(self.durations.values()) / len(self.durations)
+
+    def load(self):
+
+        with open(self.filepath) as f:
+            self.durations.update(json.load(f))
+
+    def save(self):
+
+        if self.filepath is None:
+            return
+
+        # write then rename, so that an interrupted save does not corrupt the history
+        tmp_filepath = self.filepath + '.tmp'
+
+        with open(tmp_filepath, 'w') as f:
+            json.dump(self.durations, f, indent=1, sort_keys=True)
+
+        os.replace(tmp_filepath, self.filepath)
+
+    def __len__(self):
+
+        return len(self.durations)
+
+
+class CriticalPathOrder(object):
+    """Pick, among the op nodes ready to run, the one with the longest remaining
+    critical path: its own duration plus the longest path of durations through the
+    op nodes depending on it (HEFT upward rank). Ties are broken by the plan order.
+    """
+    def __init__(self, plan, timing_history, dependents):
+
+        self.plan_indices = {id(elem): i for i, elem in enumerate(plan.op_nodes)}
+        self.upward_ranks = dict()
+
+        default_duration = timing_history.get_default_duration()
+
+        # the dependents of an op node come after it in the plan order
+        for op_node in reversed(plan.op_nodes):
+
+            self.upward_ranks[id(op_node)] = timing_history.get(op_node, default_duration) + max(
+                [self.upward_ranks[id(elem)] for elem in dependents[op_node]], default=0)
+
+    def pop_next(self, ready_op_nodes, get_parent_data_nodes=None):
+
+        # the element op nodes of map op nodes, created while running, go first: the
+        # rest of the path waits for all of them (see expand_map_op_node)
+        next_op_node = min(ready_op_nodes, key=lambda elem: (
+            -self.upward_ranks.get(id(elem), float('inf')), self.plan_indices.get(id(elem), -1)))
+
+        ready_op_nodes.remove(next_op_node)
+
+        return next_op_node
@@ -1,11 +1,16 @@
 import weakref
-import copy
 import os
 import ast
 import inspect
 import textwrap
 import sys
-import warnings
+import hashlib
+import shutil
+import threading
+
+from collections import defaultdict
+from collections import deque
+from collections import OrderedDict
 
 
 MAX_INTEGER = sys.maxsize 
@@ -24,11 +29,75 @@ class ExtendedRef(weakref.ref):
     def has_value(self):
         return self().has_value()
     
+def is_instance_of(value, module_name, class_name):
+    """isinstance check against a class of an optional heavy dependency (numpy, pandas), 
+    without importing it: if the module was never imported, value cannot be one of its 
+    instances."""
+
+    module = sys.modules.get(module_name)
+
+    if module is None:
+        return False
+
+    return isinstance(value, getattr(module, class_name))
+
+def get_raw_input_key(value):
+    """Key identifying a raw input value for deduplication: equal hashable values 
+    (of the same type) share a key, other values (e.g. lists, numpy arrays, DataFrames)
+    are identified by the object itself."""
+
+    try:
+        hash(value)
+    except TypeError:
+        return ('object', id(value))
+
+    return ('value', type(value), value)
+
 def contains_return_statement(func):
     func = textwrap.dedent(inspect.getsource(func))
     func_source_tree = ast.walk(ast.parse(func))
     return any(isinstance(node, ast.Return) for node in func_source_tree)
 
+class GraphDict(defaultdict):
+    """The graph_dict shared by a GraphBuilder and its nodes.
+
+    Every change to the graph bumps its version, which keys the caches of the 
+    topologically sorted node uids and of the render models and DOT sources.
+    """
+    def __init__(self, *args, **kwargs):
+        super(GraphDict, self).__init__(dict, *args, **kwargs)
+
+        self.version = 0
+        self.sorted_node_uids_cache = (None, None)
+        self.render_cache = dict()
+
+        # views can run from several threads, e.g. document and a user thread
+        self.render_cache_lock = threading.Lock()
+
+    def __setitem__(self, key, value):
+        super(GraphDict, self).__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super(GraphDict, self).__delitem__(key)
+        self.version += 1
+
+    def pop(self, *args):
+        self.version += 1
+        return super(GraphDict, self).pop(*args)
+
+    def __reduce__(self):
+        return (self.__class__, (), None, None, iter(self.items()))
+
+    def set_node_property(self, node_uid, key, value):
+
+        # nodes not shown in the graph, e.g. the element nodes of a map op node
+        if node_uid not in self or self[node_uid].get(key) == value:
+            return
+
+        self[node_uid][key] = value
+        self.version += 1
+
 def get_rank(node_properties_dict):
     node_graph_attributes_dict = node_properties_dict['attributes']
     rank = node_graph_attributes_dict['rank']
@@ -38,389 +107,409 @@ def get_type(node_properties_dict):
     node_type = node_properties_dict['type']
     return node_type
 
-def view_full(graph_dict, graph_attributes, verbose, current_graph_uid):
+def get_sorted_node_uids(graph_dict):
+    """Topologically sorted uids of the nodes of the graph_dict, cached per graph version"""
 
-    try:
-        from graphviz import Digraph
-        from graphviz import Source
-    except ModuleNotFoundError:
-        print('To use visualization functionalities, please install graphviz:')
-        print('\npip install graphviz')
-        return
-    
-    ranks = set()
+    version, sorted_node_uids = graph_dict.sorted_node_uids_cache
 
-    for node_properties_dict in graph_dict.values():
-        
-        rank = get_rank(node_properties_dict)
-        if rank is not None:
-            ranks.add(rank)
+    if version != graph_dict.version:
+
+        # UPDATED: 0.35
+        typed_graph_dict = {k: v for k, v in graph_dict.items() if 'type' in v}
+        sorted_node_uids = list(topological_sort(typed_graph_dict).keys())
+        graph_dict.sorted_node_uids_cache = (graph_dict.version, sorted_node_uids)
+
+    return sorted_node_uids
+
+def _dot_quote(value):
+    return '"{}"'.format(str(value).replace('"', '\\"'))
+
+def _dot_node_statement(node_uid, attributes):
+
+    attributes_str = ' '.join('{}={}'.format(k, _dot_quote(v)) for k, v in sorted(attributes.items()) if v is not None)
+    return '{} [{}]'.format(_dot_quote(node_uid), attributes_str)
+
+def _dot_edge_statement(tail_node_uid, head_node_uid):
+    return '{} -> {}'.format(_dot_quote(tail_node_uid), _dot_quote(head_node_uid))
+
+def _activation_attributes(is_activated):
+
+    # UPDATED: 0.35
+    if is_activated:
+        return {'color': 'lawngreen', 'penwidth': '1.75'}
+    else:
+        return {}
+
+def _skip_attributes(v, attributes):
+
+    # nodes skipped by the last run (see GraphBuilder.add when=) are greyed out
+    if v.get('is_skipped'):
+        return {'color': 'gray', 'fontcolor': 'gray', 'style': ','.join(
+            [elem for elem in [attributes.get('style'), 'dashed'] if elem])}
+    else:
+        return {}
+
+def _op_node_attributes(v, graph_attributes, verbose, current_graph_uid, is_activated, is_persisted, data_dim):
+
+    label = v['node_uid'] if verbose else v['alias']
+
+    if v['attributes']['shape'] is not None:
+        shape = str(v['attributes']['shape'])
+    else:
+        shape = graph_attributes['op_node_shape']
+
+    if v['attributes']['color'] is not None:
+        color = str(v['attributes']['color'])
+    else:
+        color = graph_attributes['op_node_color']
+
+    if v['attributes']['fontsize'] is not None:
+        fontsize = str(v['attributes']['fontsize'])
+    else:
+        fontsize = graph_attributes['op_node_fontsize']
+
+    if v['attributes']['shapesize'] is not None:
+        shapesize = str(v['attributes']['shapesize'])
+    else:
+        shapesize = '0.0'
+
+    # we added the condition to check that this op node belongs to the same graph
+    # this is so that we keep the graph_node_shape shape in the multi graph setting
+    if current_graph_uid==v['graph_uid'] and graph_attributes['persist_record_shape']=='True' and is_persisted:
+        shape = 'record'
+        label = "{{{}|{}}}".format(label, data_dim)
+
+    attributes = dict(label=label, shape=shape, fontsize=fontsize, height=shapesize, width=shapesize, 
+                      fillcolor=color, style='filled')
+    attributes.update(_activation_attributes(is_activated))
+    attributes.update(_skip_attributes(v, attributes))
+
+    return attributes
+
+def _data_node_attributes(v, graph_attributes, verbose, is_activated):
+
+    label = v['node_uid'] if verbose else v['alias']
+
+    if graph_attributes['persist_record_shape']=='True' and v['is_persisted']:
+        shape = 'record'
+        label = "{{{}|{}}}".format(label, v['data_dim'])
+    else:
+        shape = graph_attributes['data_node_shape']
+
+    attributes = dict(label=label, shape=shape, fontsize=graph_attributes['data_node_fontsize'], 
+                      height='0.0', width='0.0')
+    attributes.update(_activation_attributes(is_activated))
+    attributes.update(_skip_attributes(v, attributes))
+
+    return attributes
+
+def _get_data_node_group(graph_dict, v):
+
+    # a data node belongs to the group of the op node producing it, 
+    # or for raw inputs, to the group of the op nodes consuming it
+    if len(v['parents']) > 0:
+        neighbor_node_uids = v['parents']
+    else:
+        neighbor_node_uids = v['children']
+
+    groups = set(graph_dict[elem]['attributes'].get('group') for elem in neighbor_node_uids)
+
+    if len(groups) == 1:
+        return groups.pop()
+
+    return None
+
+def build_render_model(graph_dict, current_graph_uid, graph_attributes, summary, verbose, 
+                       activated_node_uids=frozenset(), activate_ext_graph=False):
+    """Build the nodes (with their DOT attributes) and edges to render, in a single 
+    pass over the topologically sorted nodes, visiting each node exactly once.
+
+    1. support for multi graph
+    - data nodes from other graphs are given an appendage of graph (ghost) node 
+    2. support for activation highlighting
+    - activated_node_uids overlays the is_activated flags without copying graph_dict
+    3. summary
+    - only op nodes are kept, connected through their child data nodes
+    """
+    nodes = dict()
+    edges = []
+
+    for node_uid in get_sorted_node_uids(graph_dict):
+
+        v = graph_dict[node_uid]
+
+        is_external = v['graph_uid'] != current_graph_uid
+        is_activated = v['is_activated'] or (node_uid in activated_node_uids) or (is_external and activate_ext_graph)
+
+        if v['type'] == 'operation':
+
+            is_persisted = v['is_persisted']
+            data_dim = v['data_dim']
+
+            if summary:
+
+                for child_data_node_uid in v['children']:
+
+                    child_data_node_prop_dict = graph_dict[child_data_node_uid]
+
+                    is_persisted = child_data_node_prop_dict['is_persisted']
+                    data_dim = child_data_node_prop_dict['data_dim']
+
+                    for child_op_node_uid in child_data_node_prop_dict['children']:
+                        edges.append((node_uid, child_op_node_uid))
+
+            else:
+
+                for child_data_node_uid in v['children']:
+                    edges.append((node_uid, child_data_node_uid))
+
+                for parent_data_node_uid in v['parents']:
+                    edges.append((parent_data_node_uid, node_uid))
+
+            rank = get_rank(v)
+
+            nodes[node_uid] = {'type': 'operation',
+                               'rank': rank if rank != MAX_INTEGER else None,
+                               'group': v['attributes'].get('group'),
+                               'graph_uid': v['graph_uid'],
+                               'attributes': _op_node_attributes(v, graph_attributes, verbose, current_graph_uid, 
+                                                                 is_activated, is_persisted, data_dim)}
 
-    ranks = list(ranks)
-    ranks.sort()
-    
-    subgraphs = []
-
-    for rank in ranks:
-        subgraph = {k: v for k, v in graph_dict.items() if rank == get_rank(v)}
-        subgraphs.append(subgraph)
-        
-    ranked_subgraphs = subgraphs[0:-1]
-    unranked_subgraph = subgraphs[-1]
-
-    graph = Digraph()
-    graph.attr(splines='true', overlap='false', ranksep=graph_attributes['graph_ranksep'])
-
-    for ranked_subgraph in ranked_subgraphs:
-
-        with graph.subgraph() as subg:
-
-            subg.attr(rank='same')
-
-            for k, v in ranked_subgraph.items():
-
-                if v['type'] != 'operation':
-                    continue
-
-                label = v['node_uid'] if verbose else v['alias']
-
-                if v['attributes']['shape'] is not None:
-                    shape = str(v['attributes']['shape'])
-                else:
-                    shape = graph_attributes['op_node_shape']
-
-                if v['attributes']['color'] is not None:
-                    color = str(v['attributes']['color'])
-                else:
-                    color = graph_attributes['op_node_color']
-
-                if v['attributes']['fontsize'] is not None:
-                    fontsize = str(v['attributes']['fontsize'])
-                else:
-                    fontsize = graph_attributes['op_node_fontsize']
-
-                if v['attributes']['shapesize'] is not None:
-                    shapesize = str(v['attributes']['shapesize'])
-                else:
-                    shapesize = '0.0'
-
-                if current_graph_uid==v['graph_uid'] and graph_attributes['persist_record_shape'] and v['is_persisted']:
-                    shape = 'record'
-                    data_dim = v['data_dim']
-                    label = "{{{}|{}}}".format(label, data_dim)
-
-                # UPDATED: 0.35
-                if v['is_activated']:
-                    pencolor = 'lawngreen'
-                    penwidth = '1.75'
-                else:
-                    pencolor = None
-                    penwidth = None
-                            
-                subg.node(
-                    k, 
-                    label=label, 
-                    shape=shape, 
-                    fontsize=fontsize, 
-                    height=shapesize, width=shapesize, fillcolor=color, style='filled', color=pencolor, penwidth=penwidth)
-
-                for child in v['children']:
-
-                    label = graph_dict[child]['node_uid'] if verbose else graph_dict[child]['alias']
-
-                    if graph_attributes['persist_record_shape'] and graph_dict[child]['is_persisted']:
-                        shape = 'record'
-                        data_dim = graph_dict[child]['data_dim']
-                        label = "{{{}|{}}}".format(label, data_dim)
-
-                    else:
-                        shape = graph_attributes['data_node_shape']
-
-                    # UPDATED: 0.35
-                    if graph_dict[child]['is_activated']:
-                        pencolor = 'lawngreen'
-                        penwidth = '1.75'
-                    else:
-                        pencolor = None
-                        penwidth = None
-                    
-                    graph.node(
-                        child, 
-                        label=label,
-                        shape=graph_attributes['data_node_shape'], 
-                        fontsize=graph_attributes['data_node_fontsize'], 
-                        height='0.0', width='0.0',
-                        color=pencolor, penwidth=penwidth)
-                    graph.edge(k, child)
-
-                for parent in v['parents']:
-
-                    label = graph_dict[parent]['node_uid'] if verbose else graph_dict[parent]['alias']
-
-                    if graph_attributes['persist_record_shape'] and graph_dict[parent]['is_persisted']:
-                        shape = 'record'
-                        data_dim = graph_dict[parent]['data_dim']
-                        label = "{{{}|{}}}".format(label, data_dim)
-
-                    else:
-                        shape = graph_attributes['data_node_shape']
-
-                    # UPDATED: 0.35
-                    if graph_dict[parent]['is_activated']:
-                        pencolor = 'lawngreen'
-                        penwidth = '1.75'
-                    else:
-                        pencolor = None
-                        penwidth = None
-
-                    graph.node(
-                        parent, 
-                        label=label,
-                        shape=graph_attributes['data_node_shape'], 
-                        fontsize=graph_attributes['data_node_fontsize'], 
-                        height='0.0', width='0.0',
-                        color=pencolor, penwidth=penwidth)
-                    graph.edge(parent, k)
-
-    for k, v in unranked_subgraph.items():
-
-        if v['type'] != 'operation':
             continue
-        
-        # determine the op node shape here
 
-        label = v['node_uid'] if verbose else v['alias']
+        if not summary:
+            nodes[node_uid] = {'type': 'data', 
+                               'rank': None,
+                               'group': _get_data_node_group(graph_dict, v),
+                               'graph_uid': v['graph_uid'],
+                               'attributes': _data_node_attributes(v, graph_attributes, verbose, is_activated)}
 
-        if v['attributes']['shape'] is not None:
-            shape = str(v['attributes']['shape'])
-        else:
-            shape = graph_attributes['op_node_shape']
+        if not is_external:
+            continue
 
-        if v['attributes']['color'] is not None:
-            color = str(v['attributes']['color'])
+        # the data node comes from a different graph, which is summarized into a graph node
+        ghost_node_uid = node_uid + "_ghost"
+
+        ghost_node_properties_dict = {'alias': v['graph_alias'],
+                                      'node_uid': ghost_node_uid,
+                                      'graph_uid': v['graph_uid'],
+                                      'attributes': {'color': graph_attributes['graph_node_color'], 
+                                                     'shape': graph_attributes['graph_node_shape'],
+                                                     'fontsize': graph_attributes['graph_node_fontsize'],
+                                                     'shapesize': graph_attributes['graph_node_shapesize']}}
+
+        nodes[ghost_node_uid] = {'type': 'graph',
+                                 'rank': None,
+                                 'group': None,
+                                 'graph_uid': v['graph_uid'],
+                                 'attributes': _op_node_attributes(ghost_node_properties_dict, graph_attributes, verbose, current_graph_uid, 
+                                                                   v['is_activated'] or activate_ext_graph, False, '')}
+
+        if summary:
+            for child_op_node_uid in v['children']:
+                edges.append((ghost_node_uid, child_op_node_uid))
         else:
-            color = graph_attributes['op_node_color']
+            edges.append((ghost_node_uid, node_uid))
 
-        if v['attributes']['fontsize'] is not None:
-            fontsize = str(v['attributes']['fontsize'])
-        else:
-            fontsize = graph_attributes['op_node_fontsize']
+    return {'nodes': nodes, 'edges': edges}
 
-        if v['attributes']['shapesize'] is not None:
-            shapesize = str(v['attributes']['shapesize'])
-        else:
-            shapesize = '0.0'
-
-        # we added the condition to check that this op node belongs to the same graph
-        # this is so that we keep the graph_node_shape shape in the multi graph setting
-        # we do not add this condition for data node, which means we will see the 
-        # persist node shape shift when viewed with summary=False
-        if current_graph_uid==v['graph_uid'] and graph_attributes['persist_record_shape'] and v['is_persisted']:
-            shape = 'record'
-            data_dim = v['data_dim']
-            label = "{{{}|{}}}".format(label, data_dim)
+def build_dot_source(render_model, graph_attributes):
 
-        # UPDATED: 0.35
-        if v['is_activated']:
-            pencolor = 'lawngreen'
-            penwidth = '1.75'
+    ranked_node_statements = defaultdict(list)
+    node_statements = []
+
+    for node_uid, node in render_model['nodes'].items():
+
+        node_statement = _dot_node_statement(node_uid, node['attributes'])
+
+        if node['rank'] is not None:
+            ranked_node_statements[node['rank']].append(node_statement)
         else:
-            pencolor = None
-            penwidth = None
+            node_statements.append(node_statement)
 
-        graph.node(
-            k, 
-            label=label, 
-            shape=shape, 
-            fontsize=fontsize, 
-            height=shapesize, width=shapesize, fillcolor=color, style='filled', color=pencolor, penwidth=penwidth)
+    lines = ['digraph {']
+    lines.append('\tgraph [overlap=false ranksep={} splines=true]'.format(_dot_quote(graph_attributes['graph_ranksep'])))
 
-        for child in v['children']:
+    for rank in sorted(ranked_node_statements.keys()):
+        lines.append('\t{')
+        lines.append('\t\trank=same')
+        lines.extend('\t\t' + elem for elem in ranked_node_statements[rank])
+        lines.append('\t}')
 
-            # determine the data node shape here
+    lines.extend('\t' + elem for elem in node_statements)
+    lines.extend('\t' + _dot_edge_statement(*elem) for elem in render_model['edges'])
+    lines.append('}')
 
-            label = graph_dict[child]['node_uid'] if verbose else graph_dict[child]['alias']
+    return '\n'.join(lines) + '\n'
 
-            if graph_attributes['persist_record_shape'] and graph_dict[child]['is_persisted']:
-                shape = 'record'
-                data_dim = graph_dict[child]['data_dim']
-                label = "{{{}|{}}}".format(label, data_dim)
+MAX_CACHED_RENDER_OUTPUTS = 32
 
-            else:
-                shape = graph_attributes['data_node_shape']
+def get_cached_render_output(graph_dict, cache_key, build):
 
-            # UPDATED: 0.35
-            if graph_dict[child]['is_activated']:
-                pencolor = 'lawngreen'
-                penwidth = '1.75'
-            else:
-                pencolor = None
-                penwidth = None
+    render_cache = graph_dict.render_cache
 
-            graph.node(
-                child,
-                label=label,
-                shape=shape, 
-                fontsize=graph_attributes['data_node_fontsize'], 
-                height='0.0', width='0.0', fillcolor=color,
-                color=pencolor, penwidth=penwidth)
-            graph.edge(k, child)
+    with graph_dict.render_cache_lock:
+        if cache_key in render_cache:
+            return render_cache[cache_key]
 
-        for parent in v['parents']:
+    # built outside of the lock, since builds can use the cache themselves (e.g. the 
+    # collapsed render model is built from the render model)
+    render_output = build()
 
-            label = graph_dict[parent]['node_uid'] if verbose else graph_dict[parent]['alias']
+    with graph_dict.render_cache_lock:
 
-            if graph_attributes['persist_record_shape'] and graph_dict[parent]['is_persisted']:
-                shape = 'record'
-                data_dim = graph_dict[parent]['data_dim']
-                label = "{{{}|{}}}".format(label, data_dim)
+        # the outputs of previous graph versions will never be requested again
+        stale_cache_keys = [k for k in render_cache if k[1] != graph_dict.version]
+        for k in stale_cache_keys:
+            del render_cache[k]
 
-            else:
-                shape = graph_attributes['data_node_shape']
+        if len(render_cache) >= MAX_CACHED_RENDER_OUTPUTS:
+            render_cache.pop(next(iter(render_cache)))
 
-            # UPDATED: 0.35
-            if graph_dict[parent]['is_activated']:
-                pencolor = 'lawngreen'
-                penwidth = '1.75'
-            else:
-                pencolor = None
-                penwidth = None
+        render_cache[cache_key] = render_output
 
-            graph.node(
-                parent,
-                label=label,
-                shape=shape, 
-                fontsize=graph_attributes['data_node_fontsize'], 
-                height='0.0', width='0.0', fillcolor=color,
-                color=pencolor, penwidth=penwidth)
-            graph.edge(parent, k)
+    return render_output
 
-    return graph
+def get_render_model(graph_dict, current_graph_uid, graph_attributes, summary, verbose, 
+                     activated_node_uids=frozenset(), activate_ext_graph=False, max_nodes=None):
+    """Cached build_render_model, keyed by graph version, summary flag, graph attributes,
+    activation overlay and max_nodes. 
 
-def view_summary(graph_dict, graph_attributes, verbose, current_graph_uid):
-    
-    op_subgraphs = {k: v for k, v in graph_dict.items() if 'type' in v and 'operation' == v['type']}
+    With max_nodes, grafted graphs, op groups and linear chains are collapsed, in that
+    order, until the model has at most max_nodes nodes, or nothing is left to collapse:
+    the limit is best-effort (see collapse_to_max_nodes)."""
 
-    data_subgraphs = {k: v for k, v in graph_dict.items() if 'type' in v and 'data' == v['type']}
+    activated_node_uids = frozenset(activated_node_uids)
+    cache_key = ('model', graph_dict.version, current_graph_uid, tuple(sorted(graph_attributes.items())), 
+                 summary, verbose, activated_node_uids, activate_ext_graph, max_nodes)
 
-    op_graph_dict = copy.deepcopy(op_subgraphs)
+    if max_nodes is None:
 
-    for k, v in op_graph_dict.items():
-        v['children'] = []
-        v['parents'] = []
+        return get_cached_render_output(
+            graph_dict, cache_key, 
+            lambda: build_render_model(graph_dict, current_graph_uid, graph_attributes, summary, verbose, 
+                                       activated_node_uids, activate_ext_graph))
 
-    for k, v in op_subgraphs.items():
+    from .collapse import collapse_to_max_nodes
 
-        for child_data_node_uid in v['children']:
+    return get_cached_render_output(
+        graph_dict, cache_key, 
+        lambda: collapse_to_max_nodes(get_render_model(graph_dict, current_graph_uid, graph_attributes, summary, verbose, 
+                                                       activated_node_uids, activate_ext_graph), 
+                                      current_graph_uid, graph_attributes, max_nodes))
 
-            data_node_prop_dict = data_subgraphs[child_data_node_uid]
+def get_dot_source(graph_dict, current_graph_uid, graph_attributes, summary, verbose, 
+                   activated_node_uids=frozenset(), activate_ext_graph=False, max_nodes=None):
+    """Cached DOT source, keyed by graph version, summary flag, graph attributes,
+    activation overlay and max_nodes."""
 
-            is_persisted = data_node_prop_dict['is_persisted']
-            data_dim = data_node_prop_dict['data_dim']
-            
-            op_graph_dict[k]['is_persisted'] = is_persisted
-            op_graph_dict[k]['data_dim'] = data_dim
+    activated_node_uids = frozenset(activated_node_uids)
+    cache_key = ('dot', graph_dict.version, current_graph_uid, tuple(sorted(graph_attributes.items())), 
+                 summary, verbose, activated_node_uids, activate_ext_graph, max_nodes)
 
-            for child_op_node_uid in data_node_prop_dict['children']:
+    return get_cached_render_output(
+        graph_dict, cache_key, 
+        lambda: build_dot_source(get_render_model(graph_dict, current_graph_uid, graph_attributes, summary, verbose, 
+                                                  activated_node_uids, activate_ext_graph, max_nodes), graph_attributes))
 
-                if child_op_node_uid is not None:
+def is_dot_available():
 
-                    op_graph_dict[k]['children'].append(child_op_node_uid)
+    try:
+        import graphviz
+    except ModuleNotFoundError:
+        return False
 
-    return view_full(op_graph_dict, graph_attributes, verbose, current_graph_uid)
+    return shutil.which('dot') is not None
 
-def preprocess_graph_dict(graph_dict, graph_uid, graph_attributes, activate_ext_graph):
-    """
-    1. support for multi graph
-    - need to create a copy of graph dict so that we can give it an appendage of graph node
-    """
-    copied_graph_dict = copy.deepcopy(graph_dict)
+def view_graph(graph_dict, current_graph_uid, graph_attributes, summary, verbose, 
+               activated_node_uids=frozenset(), activate_ext_graph=False, max_nodes=None):
 
-    # UPDATED: 0.35
-    copied_graph_dict = {k: v for k, v in copied_graph_dict.items() if 'type' in v}
+    try:
+        from graphviz import Source
+    except ModuleNotFoundError:
+        print('To use visualization functionalities, please install graphviz:')
+        print('\npip install graphviz')
+        return
 
-    external_graphs_dict = {k: v for k, v in copied_graph_dict.items() if v['graph_uid']!=graph_uid}
+    dot_source = get_dot_source(graph_dict, current_graph_uid, graph_attributes, summary, verbose, 
+                                activated_node_uids, activate_ext_graph, max_nodes)
 
-    for k, v in external_graphs_dict.items():
+    return Source(dot_source)
 
-        node_graph_attributes_dict = {'rank': MAX_INTEGER, 
-                                      'color': graph_attributes['graph_node_color'], 
-                                      'shape': graph_attributes['graph_node_shape'],
-                                      'fontsize': graph_attributes['graph_node_fontsize'],
-                                      'shapesize': graph_attributes['graph_node_shapesize']}
+MAX_CACHED_RENDERED_GRAPHS = 64
+RENDERED_GRAPH_CACHE = OrderedDict()
 
-        op_node_properties_dict = {'children': [k], 
-                                   'parents': [], 
-                                   'type': 'operation', 
-                                   'is_activated': activate_ext_graph,
-                                   'alias': v['graph_alias'],
-                                   'node_uid': k + "_ghost",
-                                   'graph_alias': v['graph_alias'],
-                                   'graph_uid': v['graph_uid'],
-                                   'attributes': node_graph_attributes_dict}
+# graphs are rendered from several threads by document
+RENDERED_GRAPH_CACHE_LOCK = threading.Lock()
 
-        # UPDATED: 0.35
-        if activate_ext_graph:
+def set_dot_dpi(dot_source, dpi):
 
-            v['is_activated'] = activate_ext_graph
+    # equivalent to the -Gdpi command line flag of dot
+    return dot_source.replace('{', '{{\n\tgraph [dpi={}]'.format(_dot_quote(dpi)), 1)
 
-        v['parents'].append(k+"_ghost")
-        copied_graph_dict[k+"_ghost"] = op_node_properties_dict
+def render_graph(dot_source, fileformat='png', dpi=None):
+    """Render the DOT source in memory through graphviz pipe and return the bytes. 
 
-    sorted_graph_dict = topological_sort(copied_graph_dict)
-    return sorted_graph_dict
+    The rendered bytes are cached by the hash of the DOT source, so that rendering
+    an unchanged graph again does not spawn a dot subprocess.
+    """
+    from graphviz import Source
+
+    if dpi is not None:
+        dot_source = set_dot_dpi(dot_source, dpi)
+
+    cache_key = (hashlib.sha1(dot_source.encode('utf-8')).hexdigest(), fileformat)
+
+    with RENDERED_GRAPH_CACHE_LOCK:
+        if cache_key in RENDERED_GRAPH_CACHE:
+            RENDERED_GRAPH_CACHE.move_to_end(cache_key)
+            return RENDERED_GRAPH_CACHE[cache_key]
+
+    # the dot subprocess runs outside of the lock, so that renders run concurrently
+    rendered_bytes = Source(dot_source).pipe(format=fileformat)
+
+    with RENDERED_GRAPH_CACHE_LOCK:
+        RENDERED_GRAPH_CACHE[cache_key] = rendered_bytes
+        if len(RENDERED_GRAPH_CACHE) > MAX_CACHED_RENDERED_GRAPHS:
+            RENDERED_GRAPH_CACHE.popitem(last=False)
+
+    return rendered_bytes
 
 def save_graph_image(graph, dirpath=None, filename=None, fileformat=None):
     
-    graph.format = fileformat or 'png'
-    try:
-        dirpath = dirpath or os.getcwd()
-        filename = filename or 'digraph' 
-        filepath = os.path.join(dirpath, filename)
-
-
-        graph = Source(graph, format='png')
-        filepath_ = graph.render(filepath)
-        return filepath_
-
-        graph.view(filename=filename, directory=dirpath, quiet=True)
-
-    except FileNotFoundError:
-        pass
-    finally:
-        img_filepath = os.path.join(dirpath, filename + '.' + graph.format)
-        dot_filepath = os.path.join(dirpath, filename)
-        if not os.path.exists(img_filepath):
-            raise FileNotFoundError('{} image file not found!'.format(img_filepath))
-        if os.path.exists(dot_filepath):
-            os.remove(dot_filepath)
+    fileformat = fileformat or 'png'
+    dirpath = dirpath or os.getcwd()
+    filename = filename or 'digraph' 
+
+    rendered_bytes = render_graph(graph.source, fileformat)
+
+    # only the requested file is written; no intermediate DOT file touches the disk
+    img_filepath = os.path.join(dirpath, filename + '.' + fileformat)
+    with open(img_filepath, 'wb') as f:
+        f.write(rendered_bytes)
     
     return img_filepath
     
-def _recursive_topological_sort(node_uid, graph_dict, stack, visited_flags):
-    
-    # we have visited this node
-    visited_flags[node_uid] = True
-    
-    for child_node_uid in graph_dict[node_uid]['children']:
-        if not visited_flags[child_node_uid]:
-            _recursive_topological_sort(child_node_uid, graph_dict, stack, visited_flags)
-        
-    stack.append(node_uid)
-    
 def topological_sort(graph_dict):
     
-    stack = []
-    visited_flags = {k:False for k in graph_dict.keys()}
+    # Kahn's algorithm: iterative, so that long chains do not hit the recursion limit
+    in_degrees = {k: 0 for k in graph_dict.keys()}
 
-    for node_uid in graph_dict.keys():
-        if not visited_flags[node_uid]:
-            _recursive_topological_sort(node_uid, graph_dict, stack, visited_flags)
-            
+    for node_properties_dict in graph_dict.values():
+        for child_node_uid in node_properties_dict['children']:
+            in_degrees[child_node_uid] += 1
+
+    queue = deque(k for k, v in in_degrees.items() if v == 0)
     sorted_graph_dict = {}
-    while len(stack)>0:
-        node_uid = stack.pop()
+
+    while len(queue) > 0:
+        node_uid = queue.popleft()
         sorted_graph_dict[node_uid] = graph_dict[node_uid]
+
+        for child_node_uid in graph_dict[node_uid]['children']:
+            in_degrees[child_node_uid] -= 1
+            if in_degrees[child_node_uid] == 0:
+                queue.append(child_node_uid)
     
     return sorted_graph_dict
 
@@ -432,3 +521,9 @@ def format_Warning(message, category, filename, lineno, line=''):
 
 class Ambiguous_Node_Name_Warning(UserWarning):
     pass
+
+class Memory_Ceiling_Warning(ResourceWarning):
+    pass
+
+class Memory_Ceiling_Error(MemoryError):
+    pass
@@ -0,0 +1,441 @@
+"""A pyflow worker process, running op node functions sent over TCP.
+
+Start one per machine (or several per machine) with:
+
+    PYFLOW_WORKER_AUTHKEY=<secret> python -m pyflow.worker --host 0.0.0.0 --port 8786
+
+and pass their addresses to GraphBuilder.run(scheduler='distributed', workers=[...]),
+from a driver with the same PYFLOW_WORKER_AUTHKEY.
+
+Unpickling a message can run arbitrary code, so workers listen on the loopback
+interface unless given a --host. With an authkey, the worker and its clients prove to
+each other that they hold it (HMAC-SHA256 challenge-response) before any message is
+sent. Workers reachable from other machines should always be given one.
+
+Messages are pickled with cloudpickle (protocol 5): large buffers such as numpy arrays
+are sent out-of-band, framed as raw bytes after the pickle payload, so they are never
+copied into it. Results stay on the worker that produced them, under their keys, until
+they are fetched by the driver, fetched by another worker running a consumer, or
+released.
+"""
+import argparse
+import hashlib
+import hmac
+import os
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+from .memory import sizeof_value
+
+
+# payload length and number of out-of-band buffers
+HEADER = struct.Struct('!QI')
+BUFFER_LENGTH = struct.Struct('!Q')
+
+# the shared secret of the workers and their clients
+AUTHKEY_ENV = 'PYFLOW_WORKER_AUTHKEY'
+
+# sent by a worker before the handshake: whether an authkey is required
+AUTH_REQUIRED = b'A'
+AUTH_NONE = b'N'
+
+NONCE_LENGTH = 32
+
+LOOPBACK_HOSTS = ['127.0.0.1', 'localhost', '::1']
+
+
+class Remote_Traceback(Exception):
+    """The traceback of an exception raised on a worker, chained to it on the driver"""
+
+    def __init__(self, tb):
+        self.tb = tb
+
+    def __str__(self):
+        return self.tb
+
+
+def send_message(sock, message):
+
+    import cloudpickle
+
+    buffers = []
+    payload = cloudpickle.dumps(message, protocol=5, buffer_callback=buffers.append)
+    raw_buffers = [elem.raw() for elem in buffers]
+
+    header = HEADER.pack(len(payload), len(raw_buffers)) + b''.join(
+        BUFFER_LENGTH.pack(elem.nbytes) for elem in raw_buffers)
+
+    sock.sendall(header)
+    sock.sendall(payload)
+
+    for raw_buffer in raw_buffers:
+        sock.sendall(raw_buffer)
+
+def recv_exactly(sock, n):
+
+    # received into a writable buffer, so numpy arrays rebuilt on it are writable
+    buf = bytearray(n)
+    view = memoryview(buf)
+    pos = 0
+
+    while pos < n:
+
+        n_received = sock.recv_into(view[pos:], n - pos)
+
+        if n_received == 0:
+            raise ConnectionError('Connection closed by peer')
+
+        pos += n_received
+
+    return buf
+
+def recv_message(sock):
+
+    import pickle
+
+    payload_length, n_buffers = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    buffer_lengths = [BUFFER_LENGTH.unpack(recv_exactly(sock, BUFFER_LENGTH.size))[0]
+                      for _ in range(n_buffers)]
+
+    payload = recv_exactly(sock, payload_length)
+    buffers = [recv_exactly(sock, elem) for elem in buffer_lengths]
+
+    return pickle.loads(payload, buffers=buffers)
+
+def get_authkey():
+
+    authkey = os.environ.get(AUTHKEY_ENV)
+
+    return authkey.encode('utf-8') if authkey else None
+
+def get_digest(authkey, nonce):
+
+    return hmac.new(authkey, nonce, hashlib.sha256).digest()
+
+def answer_challenge(sock, authkey):
+    """Client side of the handshake: prove to the worker that we hold the authkey, and
+    check that it holds it as well, since its replies are unpickled too"""
+
+    mode = recv_exactly(sock, 1)
+
+    if mode == AUTH_NONE:
+
+        if authkey is not None:
+            raise ConnectionError('The worker does not require an authkey, but {} is set'.format(AUTHKEY_ENV))
+
+        return
+
+    if authkey is None:
+        raise ConnectionError('The worker requires an authkey, set {}'.format(AUTHKEY_ENV))
+
+    worker_nonce = recv_exactly(sock, NONCE_LENGTH)
+    client_nonce = os.urandom(NONCE_LENGTH)
+
+    sock.sendall(get_digest(authkey, bytes(worker_nonce)) + client_nonce)
+
+    if not hmac.compare_digest(bytes(recv_exactly(sock, hashlib.sha256().digest_size)), get_digest(authkey, client_nonce)):
+        raise ConnectionError('The worker failed to prove that it holds the authkey')
+
+def deliver_challenge(sock, authkey):
+    """Worker side of the handshake. Return whether the client holds the authkey."""
+
+    if authkey is None:
+        sock.sendall(AUTH_NONE)
+        return True
+
+    worker_nonce = os.urandom(NONCE_LENGTH)
+    sock.sendall(AUTH_REQUIRED + worker_nonce)
+
+    response = recv_exactly(sock, hashlib.sha256().digest_size + NONCE_LENGTH)
+    digest, client_nonce = bytes(response[:-NONCE_LENGTH]), bytes(response[-NONCE_LENGTH:])
+
+    if not hmac.compare_digest(digest, get_digest(authkey, worker_nonce)):
+        return False
+
+    sock.sendall(get_digest(authkey, client_nonce))
+
+    return True
+
+def parse_address(address):
+
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+class WorkerClient(object):
+    """A connection to a worker, sending one request at a time. The authkey defaults
+    to PYFLOW_WORKER_AUTHKEY."""
+
+    def __init__(self, address, timeout=None, authkey=None):
+
+        self.address = address
+        self.sock = socket.create_connection(parse_address(address), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lock = threading.Lock()
+
+        try:
+            answer_challenge(self.sock, authkey or get_authkey())
+        except BaseException:
+            self.sock.close()
+            raise
+
+    def request(self, message):
+
+        with self.lock:
+            send_message(self.sock, message)
+            status, result = recv_message(self.sock)
+
+        if status == 'error':
+            exception, tb = result
+            raise exception from Remote_Traceback(tb)
+
+        return result
+
+    def run(self, functions, inputs, output_keys, n_out):
+
+        return self.request(('run', functions, inputs, output_keys, n_out))
+
+    def get(self, key):
+
+        return self.request(('get', key))
+
+    def release(self, keys):
+
+        return self.request(('release', keys))
+
+    def ping(self):
+
+        return self.request(('ping',))
+
+    def close(self):
+
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Worker(object):
+    """Holds the results produced on this worker, by key"""
+
+    def __init__(self, address, authkey=None):
+
+        self.address = address
+        self.authkey = authkey
+        self.results = dict()
+        self.lock = threading.Lock()
+
+    def resolve_input(self, spec):
+
+        # ('value', value) sent by the driver, or ('ref', address, key) of a result
+        # held by this worker or by a peer
+        if spec[0] == 'value':
+            return spec[1]
+
+        _, address, key = spec
+
+        if address == self.address:
+            with self.lock:
+                return self.results[key]
+
+        with WorkerClient(address, authkey=self.authkey) as client:
+            return client.get(key)
+
+    def run(self, functions, inputs, output_keys, n_out):
+        """Run a chain of functions (a single one unless fused): the first one on the
+        inputs, each next one on the output of the previous one, passed by position or
+        by name. Outputs with a None key are not needed and dropped."""
+
+        args = []
+        kwargs = {}
+
+        for name, spec in inputs:
+
+            if name is None:
+                args.append(self.resolve_input(spec))
+            else:
+                kwargs[name] = self.resolve_input(spec)
+
+        durations = []
+
+        for i, (function, input_name) in enumerate(functions):
+
+            if i > 0:
+                if input_name is None:
+                    args, kwargs = [output_values], {}
+                else:
+                    args, kwargs = [], {input_name: output_values}
+
+            start_time = time.perf_counter()
+            output_values = function(*args, **kwargs)
+            durations.append(time.perf_counter() - start_time)
+
+        if len(output_keys) == 0:
+            outputs = []
+        elif n_out > 1:
+            outputs = list(zip(output_keys, output_values))
+        else:
+            outputs = [(output_keys[0], output_values)]
+
+        nbytes = dict()
+
+        with self.lock:
+            for key, value in outputs:
+                if key is not None:
+                    self.results[key] = value
+                    nbytes[key] = sizeof_value(value)
+
+        return {'durations': durations, 'nbytes': nbytes}
+
+    def handle(self, message):
+
+        if message[0] == 'run':
+            return self.run(*message[1:])
+
+        if message[0] == 'get':
+            with self.lock:
+                return self.results[message[1]]
+
+        if message[0] == 'release':
+            with self.lock:
+                for key in message[1]:
+                    self.results.pop(key, None)
+            return None
+
+        if message[0] == 'ping':
+            with self.lock:
+                return {'pid': os.getpid(), 'n_results': len(self.results)}
+
+        raise ValueError("Expected a run, get, release or ping message, instead got '{}'".format(message[0]))
+
+
+class WorkerRequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        # nothing is unpickled from a client that failed the handshake
+        try:
+            if not deliver_challenge(self.request, self.server.worker.authkey):
+                return
+        except ConnectionError:
+            return
+
+        while True:
+
+            try:
+                message = recv_message(self.request)
+            except ConnectionError:
+                return
+
+            try:
+                reply = ('ok', self.server.worker.handle(message))
+            except BaseException as e:
+                reply = ('error', (e, traceback.format_exc()))
+
+            try:
+                send_message(self.request, reply)
+            except Exception as e:
+                # e.g. an unpicklable result or exception
+                send_message(self.request, ('error', (RuntimeError(repr(e)), traceback.format_exc())))
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host, port, authkey=None):
+
+        socketserver.ThreadingTCPServer.__init__(self, (host, port), WorkerRequestHandler)
+
+        # the address peers use to reach this worker
+        self.address = '{}:{}'.format(host if host not in ['', '0.0.0.0'] else socket.gethostname(),
+                                      self.server_address[1])
+        self.worker = Worker(self.address, authkey)
+
+
+class LocalWorkers(object):
+    """Start n_workers worker processes on this machine, e.g. to test distributed runs:
+
+        with LocalWorkers(4) as workers:
+            G.run(scheduler='distributed', workers=workers.addresses)
+    """
+    def __init__(self, n_workers, host='127.0.0.1'):
+
+        self.processes = []
+        self.addresses = []
+
+        # the workers import the same pyflow as this process
+        pythonpath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+            [pythonpath] + [elem for elem in [os.environ.get('PYTHONPATH')] if elem]))
+
+        try:
+            for _ in range(n_workers):
+
+                process = subprocess.Popen([sys.executable, '-m', 'pyflow.worker', '--host', host, '--port', '0'],
+                                           stdout=subprocess.PIPE, env=env, text=True)
+                self.processes.append(process)
+
+            # each worker prints its address once it is listening
+            for process in self.processes:
+                self.addresses.append(process.stdout.readline().split()[-1])
+
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+
+        for process in self.processes:
+            process.terminate()
+
+        for process in self.processes:
+            process.wait()
+            process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Run a pyflow worker')
+    parser.add_argument('--host', default='127.0.0.1', 
+                        help='interface to listen on, e.g. 0.0.0.0 for remote drivers (set {} as well)'.format(AUTHKEY_ENV))
+    parser.add_argument('--port', type=int, default=8786)
+    options = parser.parse_args()
+
+    authkey = get_authkey()
+
+    if authkey is None and options.host not in LOOPBACK_HOSTS:
+        print('WARNING: pyflow worker listening on {} without {}. Messages are unpickled, so anyone '
+              'who can reach this port can run arbitrary code on this machine.'.format(options.host, AUTHKEY_ENV), 
+              file=sys.stderr, flush=True)
+
+    with WorkerServer(options.host, options.port, authkey) as server:
+
+        print('pyflow worker listening on {}'.format(server.address), flush=True)
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
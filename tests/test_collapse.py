@@ -0,0 +1,106 @@
+import pytest
+
+from pyflow import GraphBuilder
+from pyflow.utils import get_render_model
+
+def adding(a, b):
+    return a + b
+
+def increment(a):
+    return a + 1
+
+def _render_model(G, summary=False, max_nodes=None, **kwargs):
+    return get_render_model(G.graph_dict, G.graph_uid, G._graph_attributes(), summary, False, max_nodes=max_nodes, **kwargs)
+
+def test_collapse_groups():
+    """Test that op groups are collapsed into a single node, largest group first"""
+
+    G = GraphBuilder()
+    a = G.add(increment)(0)
+    for i in range(5):
+        a = G.add(adding, group='features')(a, i)
+    b = G.add(increment, group='model')(a)
+    c = G.add(adding, group='model')(b, 1)
+
+    n_nodes = len(_render_model(G)['nodes'])
+    render_model = _render_model(G, max_nodes=n_nodes - 1)
+
+    assert('group features' in render_model['nodes'])
+    assert('group model' not in render_model['nodes'])
+    assert(render_model['nodes']['group features']['attributes']['label'] == 'features (15)')
+
+    # edges into and out of the collapsed group are kept, edges inside it are dropped
+    assert(('data_2', 'group features') in render_model['edges'])
+    assert(('group features', 'increment_18') in render_model['edges'])
+    assert(all(tail != head for tail, head in render_model['edges']))
+
+def test_collapse_grafted_graphs():
+    """Test that data nodes from another graph are collapsed with their ghost node"""
+
+    G = GraphBuilder(alias='source')
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding)(a1, 2)
+
+    H = GraphBuilder()
+    a3 = H.add(adding)(a1, a2)
+    a4 = H.add(increment)(a3)
+
+    render_model = _render_model(H, max_nodes=5)
+    graph_node_uid = 'graph {}'.format(G.graph_uid)
+
+    assert(len(render_model['nodes']) == 5)
+    assert(render_model['nodes'][graph_node_uid]['n_collapsed'] == 4)
+    assert(len([elem for elem in render_model['edges'] if elem[0] == graph_node_uid]) == 1)
+
+def test_collapse_chains():
+    """Test that long linear chains are compressed when groups are not enough"""
+
+    G = GraphBuilder()
+    a = G.add(increment)(0)
+    for i in range(100):
+        a = G.add(increment)(a)
+
+    render_model = _render_model(G, summary=True, max_nodes=10)
+
+    assert(len(render_model['nodes']) == 1)
+    assert(render_model['nodes']['chain increment_0']['attributes']['label'] == 'increment ... increment (101)')
+
+def test_collapse_activation_and_cache():
+    """Test collapsed nodes inherit activation and are cached per max_nodes"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding, group='prep')(1, 2)
+    a2 = G.add(adding, group='prep')(a1, 2)
+    a3 = G.add(adding)(3, 4)
+    a4 = G.add(adding)(a2, a3)
+
+    render_model = _render_model(G, max_nodes=8, activated_node_uids={'adding_0'})
+    assert(render_model['nodes']['group prep']['attributes']['color'] == 'lawngreen')
+
+    assert(_render_model(G, max_nodes=8) is _render_model(G, max_nodes=8))
+    assert(_render_model(G, max_nodes=100) is _render_model(G))
+
+    graph = G.view(engine='layered', max_nodes=3)
+    assert(len(graph.layout['nodes']) <= 3)
+
+    with pytest.raises(ValueError):
+        G.view(max_nodes=0)
+
+def test_collapse_skips_cyclic_groups():
+    """Test that a group linked through an op outside of it is not collapsed, which
+    would create a cycle"""
+
+    from pyflow.layout import compute_layered_layout
+
+    G = GraphBuilder()
+    a = G.add(increment, group='g')(0)
+    b = G.add(increment)(a)
+    c = G.add(increment, group='g')(b)
+    d = G.add(increment)(c)
+
+    render_model = _render_model(G, summary=True, max_nodes=3)
+
+    assert('group g' not in render_model['nodes'])
+    compute_layered_layout(render_model, G._graph_attributes())
+
+    G.view(max_nodes=3, engine='layered')
@@ -0,0 +1,82 @@
+import pytest
+
+from pyflow import GraphBuilder
+
+dask = pytest.importorskip("dask")
+
+def adding(a, b):
+    return a + b
+
+def multioutput_adding(a, b):
+    return a + b, a
+
+def adding_kwarg(a, b, c=4):
+    return a + b + c
+
+def test_to_dask():
+    """Test lowering to a dask task graph"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2, a3 = G.add(multioutput_adding, n_out=2)(a1, 3)
+    a4 = G.add(adding_kwarg)(a2, b=a3, c=10)
+
+    dsk, keys = G.to_dask(a4, a3)
+
+    assert(keys == [a4.get_node_uid(), a3.get_node_uid()])
+    assert(dask.get(dsk, keys) == (19, 3))
+
+def test_to_dask_persisted_values_are_literals():
+    """Test that data nodes holding values are not recomputed by dask"""
+
+    calls = []
+
+    def counting(a):
+        calls.append(a)
+        return a
+
+    G = GraphBuilder()
+    a1 = G.add(counting, persist=True)(1)
+    a2 = G.add(adding)(a1, 2)
+    a1.get()
+
+    dsk, keys = G.to_dask(a2)
+
+    assert(dask.get(dsk, keys) == (3, ))
+    assert(len(calls) == 1)
+
+def test_run_dask_scheduler():
+    """Test run with the dask scheduler"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding, persist=True)(a1, 2)
+    a3 = G.add(adding)(a1, a2)
+
+    assert(G.run(a3, scheduler='dask') == 8)
+    assert(not a1.has_value())
+    assert(a2.has_value())
+
+def test_run_dask_scheduler_multi_graph():
+    """Test run with the dask scheduler across grafted graphs"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding)(a1, 2)
+    a3 = G.add(adding, persist=True)(a1, a2)
+
+    H = GraphBuilder()
+    a4 = H.add(adding)(a3, 1)
+    a5 = H.add(adding)(a4, 2)
+    a6 = H.add(adding)(a4, a5)
+
+    assert(H.run(a6, scheduler='dask', dask_get=dask.get) == 20)
+    assert(a3.has_value())
+
+def test_run_invalid_scheduler():
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+
+    with pytest.raises(ValueError):
+        G.run(a1, scheduler='spark')
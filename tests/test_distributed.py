@@ -0,0 +1,203 @@
+import pytest
+import os
+
+import numpy as np
+
+from pyflow import GraphBuilder
+
+cloudpickle = pytest.importorskip("cloudpickle")
+
+from pyflow.worker import LocalWorkers
+from pyflow.worker import WorkerClient
+
+@pytest.fixture(scope='module')
+def workers():
+
+    with LocalWorkers(3) as local_workers:
+        yield local_workers.addresses
+
+def test_distributed_run(workers):
+
+    # defined locally so that cloudpickle sends them by value
+    def make(n):
+        return np.arange(n, dtype=np.float64)
+
+    def scaling(a, factor=1):
+        return a * factor
+
+    def adding(a, b):
+        return a + b
+
+    def splitting(a):
+        return a[:2], a[2:]
+
+    def pid(a):
+        return os.getpid()
+
+    G = GraphBuilder()
+    a1 = G.add(make)(1000)
+    a2 = G.add(scaling)(a1, factor=2)
+    a3 = G.add(scaling)(a1, factor=3)
+    a4 = G.add(adding)(a2, a3)
+    b1, b2 = G.add(splitting, n_out=2)(a4)
+    p1 = G.add(pid)(a2)
+    p2 = G.add(pid)(a3)
+    p3 = G.add(pid)(a4)
+
+    result = G.run(a4, b1, scheduler='distributed', workers=workers)
+
+    assert(np.array_equal(result[0], np.arange(1000) * 5.0))
+    assert(np.array_equal(result[1], [0.0, 5.0]))
+
+    # the op nodes ran on the worker processes, and the intermediates stayed there
+    assert(os.getpid() not in [p1.get(), p2.get(), p3.get()])
+    assert(not a2().has_value())
+    assert(not a3().has_value())
+
+    # every result was released from the workers
+    for address in workers:
+        with WorkerClient(address) as client:
+            assert(client.ping()['n_results'] == 0)
+
+def test_distributed_run_fused_and_errors(workers):
+
+    def increment(a):
+        return a + 1
+
+    def failing(a):
+        raise KeyError('failed remotely')
+        return a
+
+    G = GraphBuilder()
+    a1 = G.add(increment)(1)
+    a2 = G.add(increment)(a1)
+    a3 = G.add(increment)(a2)
+
+    assert(G.run(a3, scheduler='distributed', workers=workers, fuse=True) == 4)
+    assert(len(G.timing_history) == 1)
+
+    H = GraphBuilder()
+    b1 = H.add(failing)(1)
+
+    with pytest.raises(KeyError):
+        H.run(b1, scheduler='distributed', workers=workers)
+
+    with pytest.raises(ValueError):
+        H.run(b1, scheduler='distributed', workers=[])
+
+def test_locality_aware_placement(workers):
+
+    def make(i):
+        return np.full(100000, i, dtype=np.float64)
+
+    def scaling(a):
+        return a * 2
+
+    def adding(a, b):
+        return a + b
+
+    def reduce(a):
+        return float(a.sum())
+
+    G = GraphBuilder()
+    a1 = G.add(make)(1)
+    a2 = G.add(scaling)(a1)
+    a3 = G.add(scaling)(a2)
+    b1 = G.add(make)(2)
+    b2 = G.add(scaling)(b1)
+    b3 = G.add(scaling)(b2)
+    c1 = G.add(adding)(a3, b3)
+    r1 = G.add(reduce)(c1)
+
+    assert(G.transfer_report() is None)
+    assert(G.run(r1, scheduler='distributed', workers=workers) == 1200000.0)
+
+    transfer_report = G.transfer_report()
+
+    # each chain stays on the worker that started it, only one of the two inputs of 
+    # adding moves
+    assert(transfer_report['worker_to_worker'] == 8 * 100000)
+    assert(transfer_report['local'] == 6 * 8 * 100000)
+    assert(sorted(transfer_report['n_op_nodes'].values())[-2:] == [3, 5])
+
+def test_distributed_run_iter(workers):
+
+    def make(n):
+        return np.arange(n)
+
+    def summing(a):
+        return int(a.sum())
+
+    G = GraphBuilder()
+    a1 = G.add(make)(10)
+    a2 = G.add(summing)(a1)
+
+    results = dict((node().node_uid, value) for node, value in G.run_iter(a1, a2, scheduler='distributed', workers=workers))
+
+    assert(np.array_equal(results[a1().node_uid], np.arange(10)))
+    assert(results[a2().node_uid] == 45)
+    assert(not a1().has_value())
+    assert(G.transfer_report()['worker_to_driver'] > 0)
+
+def test_distributed_skip_releases_results():
+    """Test that the inputs of a skipped op node are released from the workers during the run"""
+
+    def make(n):
+        return np.arange(n)
+
+    def is_empty(a):
+        return len(a) == 0
+
+    def summing(a):
+        return int(a.sum())
+
+    def negating(a):
+        return not a
+
+    G = GraphBuilder()
+    a1 = G.add(make)(1000)
+    c1 = G.add(is_empty)(a1)
+    a2 = G.add(summing, when=c1)(a1)
+    a3 = G.add(negating)(c1)
+
+    # a single worker runs every op node, and releases the results queued before it
+    with LocalWorkers(1) as local_workers:
+
+        for node, value in G.run_iter(a2, a3, scheduler='distributed', workers=local_workers.addresses):
+
+            # a1 was released once a2 was skipped: left are a3, and c1 whose release
+            # is queued for the next op node
+            with WorkerClient(local_workers.addresses[0]) as client:
+                assert(client.ping()['n_results'] == 2)
+
+    assert(value is True)
+    assert(a2().is_skipped())
+
+def test_worker_authkey(monkeypatch):
+
+    def increment(a):
+        return a + 1
+
+    monkeypatch.setenv('PYFLOW_WORKER_AUTHKEY', 'secret')
+
+    # the workers are started with the authkey of this process
+    with LocalWorkers(1) as local_workers:
+
+        G = GraphBuilder()
+        a1 = G.add(increment)(1)
+
+        assert(G.run(a1, scheduler='distributed', workers=local_workers.addresses) == 2)
+
+        # clients without the authkey are rejected before any message is unpickled
+        with pytest.raises(ConnectionError):
+            WorkerClient(local_workers.addresses[0], authkey=b'wrong').ping()
+
+        monkeypatch.delenv('PYFLOW_WORKER_AUTHKEY')
+
+        with pytest.raises(ConnectionError):
+            WorkerClient(local_workers.addresses[0])
+
+    # nor do clients holding an authkey trust workers without one
+    with LocalWorkers(1) as local_workers:
+        with pytest.raises(ConnectionError):
+            WorkerClient(local_workers.addresses[0], authkey=b'secret')
@@ -0,0 +1,86 @@
+import pytest
+
+from pyflow import GraphBuilder
+from pyflow.fusion import FusedOperationNode
+
+def adding(a, b):
+    return a + b
+
+def increment(a):
+    return a + 1
+
+def doubling(a):
+    return a * 2
+
+def test_fuse_linear_chain():
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(increment)(a1)
+    a3 = G.add(doubling)(a2)
+    a4 = G.add(increment)(a3)
+
+    plan = G.plan(a4, fuse=True)
+
+    assert(len(plan) == 1)
+    assert(isinstance(plan.op_nodes[0], FusedOperationNode))
+    assert(len(plan.op_nodes[0].op_nodes) == 4)
+
+    assert(G.run(a4, fuse=True) == 9)
+
+    # the intermediates were never materialized
+    assert(not a1.has_value())
+    assert(not a2.has_value())
+    assert(not a3.has_value())
+
+def test_fusion_stops_at_persisted_requested_and_fanned_out_nodes():
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(increment, persist=True)(a1)
+    a3 = G.add(increment)(a2)
+    a4 = G.add(doubling)(a3)
+    a5 = G.add(increment)(a4)
+    a6 = G.add(adding)(a4, a5)
+    a7 = G.add(increment)(a6)
+
+    plan = G.plan(a5, a7, fuse=True)
+
+    # a2 is persisted, a4 fans out, a5 is requested, a6 has a single consumer
+    assert([[elem.node_uid for elem in getattr(op_node, 'op_nodes', [op_node])] for op_node in plan.op_nodes] ==
+           [['adding_0', 'increment_4'], ['increment_6', 'doubling_8'], ['increment_10'], ['adding_12', 'increment_14']])
+
+    assert(G.run(a5, a7, fuse=True) == [11, 22])
+    assert(a2.get() == 4)
+    assert(not a4.has_value())
+
+def test_fused_run_matches_unfused_run():
+
+    def splitting(a):
+        return a, a + 1
+
+    G = GraphBuilder()
+    a1 = G.add(increment)(1)
+    a2 = G.add(doubling)(a1)
+    b1, b2 = G.add(splitting, n_out=2)(a2)
+    a3 = G.add(increment)(b1)
+    a4 = G.add(adding)(a3, b2)
+    a5 = G.add(doubling)(a4)
+
+    assert(len(G.plan(a5, fuse=True)) == 3)
+    assert(G.run(a5, fuse=True) == 20)
+
+    # durations are recorded for every op node of the fused chains
+    assert(len(G.timing_history) == 4)
+
+    for scheduler in [None, 'threads']:
+        a5.release_memory()
+        assert(G.run(a5, scheduler=scheduler, fuse=True) == G.run(a5, scheduler=scheduler))
+
+def test_fuse_must_be_bool():
+
+    G = GraphBuilder()
+    a1 = G.add(increment)(1)
+
+    with pytest.raises(TypeError):
+        G.run(a1, fuse='yes')
@@ -254,4 +254,72 @@ def test_kwargs_None_arguments_multi_graph_with_persist():
     assert(a6.has_value())
 
     assert(a6.get() == 20)
-    
\ No newline at end of file
+    
+def test_dedupe():
+
+    counts = []
+
+    def counting(a, b):
+        counts.append(1)
+        return a + b
+
+    G = GraphBuilder(dedupe=True)
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(counting)(a1, 3)
+    a3 = G.add(counting)(a1, 3)
+    a4 = G.add(counting)(a1, b=3)
+    a5 = G.add(counting)([1], [2])
+    a6 = G.add(counting)([1], [2])
+    b1, b2 = G.add(multioutput_adding, n_out=2)(a2, 1)
+    b3, b4 = G.add(multioutput_adding, n_out=2)(a3, 1)
+
+    assert(a2() is a3())
+    assert(a4() is not a2())
+    assert(a6() is not a5())
+    assert(b3() is b1() and b4() is b2())
+
+    assert(G.run(a3, a4, b4) == [6, 6, 6])
+    # a2, a4, a5 and a6, the terminal nodes included
+    assert(len(counts) == 4)
+
+    # a removed op node is not reused
+    G.remove(1)
+    b5, b6 = G.add(multioutput_adding, n_out=2)(a2, 1)
+    assert(b5() is not b1())
+
+def test_no_dedupe_by_default():
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding)(1, 2)
+
+    assert(a1() is not a2())
+
+def test_source():
+
+    loads = []
+
+    def loading(path, scale=1):
+        loads.append(path)
+        return len(path) * scale
+
+    G = GraphBuilder()
+    s1 = G.source(loading, 'a/b/c', scale=2)
+    a1 = G.add(adding)(s1, 1)
+    a2 = G.add(adding)(s1, 2)
+
+    # nothing is loaded at build time, and the loader arguments are not data nodes
+    assert(len(loads) == 0)
+    assert(not s1().has_value())
+    assert(len([k for k, v in G.strong_ref_dict.items() if v.node_type == 'data' and v.has_value()]) == 2)
+
+    assert(G.run(a1, a2) == [11, 12])
+    assert(len(loads) == 1)
+
+    # released once consumed, and loaded again when needed
+    assert(not s1().has_value())
+    assert(s1.get() == 10)
+    assert(len(loads) == 2)
+
+    with pytest.raises(TypeError):
+        G.source('a/b/c')
@@ -0,0 +1,70 @@
+import pytest
+import shutil
+
+from pyflow import GraphBuilder
+from pyflow.graph_document import get_image_size
+from pyflow.graph_document import get_natural_size
+from pyflow.graph_document import tune_dpi
+from pyflow.graph_document import render_graph_image
+from pyflow.graph_document import render_graph_images
+from pyflow.utils import render_graph
+
+pytest.importorskip("graphviz")
+
+def adding(a, b):
+    return a + b
+
+@pytest.mark.skipif(shutil.which('dot') is None, reason="requires the graphviz dot executable")
+def test_tune_dpi():
+    """Test that the analytic dpi renders the image at about the requested size"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding)(a1, 2)
+
+    dot_source = G.view(engine='dot').source
+    natural_width, natural_height = get_natural_size(dot_source)
+
+    dpi = tune_dpi(dot_source, natural_height * 50, natural_width * 50)
+    assert(dpi == 50)
+
+    width, height = get_image_size(render_graph(dot_source, 'png', dpi=dpi))
+    assert(abs(width - natural_width * 50) <= 2)
+    assert(abs(height - natural_height * 50) <= 2)
+
+@pytest.mark.skipif(shutil.which('dot') is None, reason="requires the graphviz dot executable")
+def test_render_graph_images_concurrently():
+    """Test that graphs rendered in the thread pool come back in order"""
+
+    graph_objs = []
+    for i in range(6):
+        G = GraphBuilder(alias='graph_{}'.format(i))
+        a = G.add(adding)(1, 2)
+        for j in range(i):
+            a = G.add(adding)(a, j)
+        graph_objs.append(G)
+
+    rendered_graph_images = render_graph_images(graph_objs, pixel_offset=-1, max_workers=3)
+
+    assert(len(rendered_graph_images) == 6)
+    for graph_obj, (image_layout, graph_img_bytes) in zip(graph_objs, rendered_graph_images):
+        assert(graph_img_bytes == render_graph_image(graph_obj.view(engine='dot').source, -1)[1])
+
+def test_render_graph_cache_is_thread_safe(monkeypatch):
+
+    from concurrent.futures import ThreadPoolExecutor
+    from graphviz import Source
+    from pyflow import utils
+
+    # dot is replaced by a fast fake, so that evictions race
+    monkeypatch.setattr(Source, 'pipe', lambda self, format: self.source.encode('utf-8'))
+    monkeypatch.setattr(utils, 'MAX_CACHED_RENDERED_GRAPHS', 4)
+    monkeypatch.setattr(utils, 'RENDERED_GRAPH_CACHE', utils.OrderedDict())
+
+    dot_sources = ['digraph {{ a{} }}'.format(i % 12) for i in range(2000)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        rendered_graphs = list(executor.map(lambda elem: render_graph(elem, 'plain'), dot_sources))
+
+    assert([elem.decode('utf-8').strip() for elem in rendered_graphs] == dot_sources)
+    assert(len(utils.RENDERED_GRAPH_CACHE) == 4)
@@ -0,0 +1,70 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from pyflow import GraphBuilder
+
+def scaling(df, k):
+    return df.assign(y=df['x'] * k)
+
+def summing(df):
+    return df['y'].sum()
+
+def build_graph():
+
+    G = GraphBuilder()
+    inp = G.placeholder('group')
+    a1 = G.add(scaling)(inp, 2)
+    a2 = G.add(summing)(a1)
+
+    return G, inp, a1, a2
+
+def get_frame():
+
+    return pd.DataFrame({'g': [3, 1, 1, 2, 3, 3], 'h': [0, 0, 1, 0, 0, 1], 'x': np.arange(6)})
+
+def test_apply_groups():
+
+    G, inp, a1, a2 = build_graph()
+    df = get_frame()
+
+    a1_val, a2_val = G.apply_groups(df, by='g', input=inp, targets=[a1, a2], max_workers=1)
+
+    pd.testing.assert_frame_equal(a1_val, pd.concat({k: scaling(v, 2) for k, v in df.groupby('g')}, names=['g']))
+    pd.testing.assert_series_equal(a2_val, df.assign(y=df['x'] * 2).groupby('g')['y'].sum(), check_names=False)
+
+    # the graph is left unchanged
+    assert(not inp().has_value())
+    assert(not a1().has_value())
+
+    # the plan is run again for every group, by a single process
+    a2_val = G.apply_groups(df, by=['g', 'h'], input=inp, targets=a2, max_workers=1, fuse=True)
+
+    assert(list(a2_val.index) == [(1, 0), (1, 1), (2, 0), (3, 0), (3, 1)])
+    assert(list(a2_val) == [2, 4, 6, 8, 10])
+
+def test_apply_groups_processes():
+
+    G, inp, a1, a2 = build_graph()
+    df = get_frame()
+
+    a2_val = G.apply_groups(df, by='g', input=inp, targets=a2, max_workers=2, chunksize=2)
+
+    assert(a2_val.to_dict() == {1: 6, 2: 6, 3: 18})
+
+def test_placeholder():
+
+    G, inp, a1, a2 = build_graph()
+
+    with pytest.raises(ValueError):
+        a2().get()
+
+    with pytest.raises(TypeError):
+        G.apply_groups(get_frame(), by='g', input=a1, targets=a2)
+
+    H = GraphBuilder()
+    b1 = H.add(summing)(get_frame().assign(y=1))
+
+    with pytest.raises(ValueError):
+        H.apply_groups(get_frame(), by='g', input=inp, targets=b1)
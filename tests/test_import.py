@@ -0,0 +1,31 @@
+import subprocess
+import sys
+import os
+
+import pyflow
+
+SRC_DIRPATH = os.path.dirname(os.path.dirname(os.path.abspath(pyflow.__file__)))
+
+def test_import_does_not_load_heavy_dependencies():
+    """Test that numpy, pandas and the other optional dependencies are only imported
+    when needed, keeping import pyflow fast"""
+
+    heavy_modules = ['numpy', 'pandas', 'pyspark', 'graphviz', 'dask', 'bokeh', 'cloudpickle']
+    script = ("import sys, pyflow; "
+              "print(','.join(m for m in {} if m in sys.modules))".format(heavy_modules))
+
+    completed = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, 
+                               env=dict(os.environ, PYTHONPATH=SRC_DIRPATH), check=True)
+
+    assert(completed.stdout.strip() == '')
+
+def test_data_dim_of_lazily_checked_types():
+
+    import numpy as np
+    import pandas as pd
+
+    from pyflow import DataHolderNode
+
+    assert(DataHolderNode('g', 'g', 'data_0', np.zeros((2, 3))).get_persisted_data_dim_as_str() == '(2, 3)')
+    assert(DataHolderNode('g', 'g', 'data_1', pd.DataFrame({'a': [1]})).get_persisted_data_dim_as_str() == '(1, 1)')
+    assert(DataHolderNode('g', 'g', 'data_2', 3).get_persisted_data_dim_as_str() == '(1, )')
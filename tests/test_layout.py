@@ -0,0 +1,102 @@
+import pytest
+import os
+
+from pyflow import GraphBuilder
+from pyflow.layout import LayeredGraph
+
+def adding(a, b):
+    return a + b
+
+def increment(a):
+    return a + 1
+
+def _node_positions(graph):
+    return {elem['node_uid']: (elem['x'], elem['y']) for elem in graph.layout['nodes']}
+
+def test_layered_layout_layers():
+    """Test that nodes are laid out top to bottom in topological order"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding)(a1, 2)
+    a3 = G.add(adding)(a1, a2)
+
+    positions = _node_positions(G.view(engine='layered'))
+
+    assert(positions['adding_0'][1] < positions['adding_4'][1] < positions['adding_7'][1])
+
+def test_layered_layout_rank_attribute():
+    """Test that op nodes sharing a rank are put on the same layer"""
+
+    G = GraphBuilder()
+    a1 = G.add(increment)(1)
+    a2 = G.add(increment)(a1)
+    a3 = G.add(increment, rank=1)(a2)
+    a4 = G.add(increment, rank=1)(3)
+
+    positions = _node_positions(G.view(engine='layered'))
+
+    assert(positions['increment_5'][1] == positions['increment_7'][1])
+    assert(positions['increment_5'][0] != positions['increment_7'][0])
+
+def test_layered_layout_empty_rank_layers():
+    """Test that ranks emptying the layers between them do not break the layout"""
+
+    G = GraphBuilder()
+    a1 = G.add(increment)(1)
+    a2 = G.add(increment, rank=1)(a1)
+    a3 = G.add(increment)(a2)
+    a4 = G.add(increment, rank=1)(a3)
+
+    positions = _node_positions(G.view(summary=False, engine='layered'))
+
+    assert(positions['increment_3'][1] == positions['increment_7'][1])
+    assert(positions['increment_0'][1] < positions['increment_5'][1] < positions['increment_7'][1])
+
+def test_layered_layout_outputs(tmp_path):
+    """Test the svg and html canvas outputs"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding, persist=True)(a1, 2)
+
+    graph = G.view(summary=False, engine='layered')
+
+    assert(graph.svg.count('<title>') == len(graph.layout['nodes']))
+    assert('<canvas' in graph.html)
+    assert('image/svg+xml' in graph._repr_mimebundle_())
+    assert('text/html' in G.view(engine='layered', output='html')._repr_mimebundle_())
+
+    filepath = graph.save(os.path.join(str(tmp_path), 'graph.svg'))
+    assert(open(filepath).read().startswith('<svg'))
+
+    with pytest.raises(ValueError):
+        G.view(engine='layered', output='png')
+
+def test_view_falls_back_to_layered_layout(tmp_path):
+    """Test that view switches to the layered layout above max_dot_nodes"""
+
+    G = GraphBuilder(max_dot_nodes=10)
+    a = G.add(increment)(0)
+    for i in range(10):
+        a = G.add(increment)(a)
+
+    assert(isinstance(G.view(), LayeredGraph))
+
+    img_filepath = G.save_view(dirpath=str(tmp_path), fileformat='svg')
+    assert(os.listdir(str(tmp_path)) == ['digraph.svg'])
+
+    with pytest.raises(ValueError):
+        G.view(engine='neato')
+
+def test_layered_layout_large_graph():
+    """Test the layered layout of a graph far beyond what dot handles"""
+
+    G = GraphBuilder()
+    a = G.add(increment)(0)
+    for i in range(5000):
+        a = G.add(adding)(a, i)
+
+    graph = G.view(summary=False, engine='layered')
+
+    assert(len(graph.layout['nodes']) == len([v for v in G.graph_dict.values() if 'type' in v]))
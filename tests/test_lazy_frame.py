@@ -0,0 +1,122 @@
+import pytest
+
+from pyflow import GraphBuilder
+from pyflow import LazyFrameEngine
+from pyflow import register_lazy_frame_engine
+from pyflow.lazy_frame import LAZY_FRAME_ENGINES
+
+class LazyFrame(object):
+    """Stand-in for a Spark DataFrame"""
+
+    def __init__(self):
+        self.rdd = None
+        self.persist_count = 0
+        self.unpersist_count = 0
+
+    def persist(self):
+        self.persist_count += 1
+        return self
+
+    def unpersist(self):
+        self.unpersist_count += 1
+        return self
+
+def make_frame():
+    return LazyFrame()
+
+def consume(frame):
+    return frame.persist_count
+
+def test_fan_out_lazy_frame_persisted():
+    """Test a lazy frame with several activated consumers is persisted then unpersisted"""
+
+    G = GraphBuilder()
+    a1 = G.add(make_frame)()
+    a2 = G.add(consume)(a1)
+    a3 = G.add(consume)(a1)
+
+    assert(G.run(a2, a3) == [1, 1])
+    assert(not a1.has_value())
+
+def test_fan_out_lazy_frame_unpersisted_on_release():
+    """Test the lazy frame is unpersisted once its consumers are done"""
+
+    G = GraphBuilder()
+    a1 = G.add(make_frame)()
+    a2 = G.add(consume)(a1)
+    a3 = G.add(consume)(a1)
+
+    frames = []
+    a1().release_memory = _spy(a1().release_memory, a1, frames)
+    G.run(a2, a3)
+
+    assert(len(frames) == 1)
+    assert(frames[0].persist_count == 1)
+    assert(frames[0].unpersist_count == 1)
+
+def test_conditioned_consumer_lazy_frame_persisted():
+    """Test a lazy frame consumed by an op node awaiting its condition is persisted"""
+
+    def is_enabled(flag):
+        return flag
+
+    G = GraphBuilder()
+    a1 = G.add(make_frame)()
+    a2 = G.add(consume)(a1)
+    c1 = G.add(is_enabled)(True)
+    a3 = G.add(consume, when=c1)(a1)
+
+    assert(G.run(a2, a3) == [1, 1])
+    assert(not a1.has_value())
+
+def test_single_consumer_lazy_frame_not_persisted():
+    """Test a lazy frame with a single consumer is left alone"""
+
+    G = GraphBuilder()
+    a1 = G.add(make_frame)()
+    a2 = G.add(consume)(a1)
+
+    assert(a2.get() == 0)
+
+def test_register_lazy_frame_engine():
+    """Test user defined lazy frame engine"""
+
+    class Deferred(object):
+        def __init__(self):
+            self.cached = False
+
+    class DeferredEngine(LazyFrameEngine):
+        def matches(self, value):
+            return isinstance(value, Deferred)
+        def persist(self, value):
+            value.cached = True
+        def unpersist(self, value):
+            value.cached = False
+
+    def make_deferred():
+        return Deferred()
+
+    def is_cached(value):
+        return value.cached
+
+    register_lazy_frame_engine(DeferredEngine())
+
+    try:
+        G = GraphBuilder()
+        a1 = G.add(make_deferred)()
+        a2 = G.add(is_cached)(a1)
+        a3 = G.add(is_cached)(a1)
+        assert(G.run(a2, a3) == [True, True])
+    finally:
+        LAZY_FRAME_ENGINES.pop(0)
+
+    with pytest.raises(TypeError):
+        register_lazy_frame_engine(object())
+
+def _spy(release_memory, node_ref, acc):
+
+    def wrapper():
+        acc.append(node_ref().value_holder.get())
+        release_memory()
+
+    return wrapper
@@ -0,0 +1,197 @@
+import pytest
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from pyflow import GraphBuilder
+from pyflow.memory import sizeof_value
+from pyflow.scheduler import SequentialExecutor
+
+N_BYTES = 8 * 100000
+
+def make(i):
+    return np.full(100000, i, dtype=np.float64)
+
+def reduce(a):
+    return float(a.sum())
+
+def adding(a, b):
+    return a + b
+
+def test_sizeof_value():
+
+    assert(sizeof_value(np.zeros(1000)) == 8000)
+    assert(sizeof_value(pd.DataFrame({'a': np.zeros(1000)})) >= 8000)
+    assert(sizeof_value([b'a' * 1000]) > 1000)
+    assert(sizeof_value(3) > 0)
+
+def test_memory_order_frees_large_parents_early():
+    """Test that the reduction of a large intermediate runs before the next large
+    intermediate is made"""
+
+    calls = []
+
+    def logged(func):
+        def wrapper(a):
+            calls.append(func.__name__)
+            return func(a)
+        wrapper.__name__ = func.__name__
+        return wrapper
+
+    G = GraphBuilder()
+    b1 = G.add(logged(make))(1)
+    b2 = G.add(logged(make))(2)
+    r1 = G.add(logged(reduce))(b1)
+    r2 = G.add(logged(reduce))(b2)
+    out = G.add(adding)(r1, r2)
+
+    # the op nodes in insertion order: both large intermediates are alive at once
+    plan = G.plan(out)
+    plan.op_nodes = [v for k, v in G.strong_ref_dict.items() if v.node_type == 'operation']
+
+    SequentialExecutor(order='memory').execute(plan)
+
+    assert(calls == ['make', 'reduce', 'make', 'reduce'])
+    assert(N_BYTES <= plan.peak_live_bytes < 2 * N_BYTES)
+    assert(out.get() == 3 * 100000)
+
+def test_memory_budget_throttles_parallel_launches():
+
+    lock = threading.Lock()
+    n_running = [0]
+    max_n_running = [0]
+
+    def slow_make(i):
+        with lock:
+            n_running[0] += 1
+            max_n_running[0] = max(max_n_running[0], n_running[0])
+        time.sleep(0.05)
+        with lock:
+            n_running[0] -= 1
+        return make(i)
+
+    G = GraphBuilder()
+    reduced = []
+    for i in range(4):
+        b = G.add(slow_make)(i)
+        reduced.append(G.add(reduce)(b))
+
+    G.run(*reduced, scheduler='threads', max_workers=4, order='memory')
+    assert(max_n_running[0] > 1)
+
+    # the output sizes measured on the first memory ordered run are used to honor the budget
+    for elem in reduced:
+        elem().release_memory()
+    max_n_running[0] = 0
+    assert(G.run(*reduced, scheduler='threads', max_workers=4, memory_budget=int(1.5 * N_BYTES)) == [0, 100000, 200000, 300000])
+    assert(max_n_running[0] == 1)
+
+def test_invalid_memory_options():
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+
+    with pytest.raises(ValueError):
+        G.run(a1, order='size')
+
+    with pytest.raises(ValueError):
+        G.run(a1, scheduler='threads', memory_budget=-1)
+
+def test_memory_ledger():
+    """Test live and peak bytes, and the memory report of a graph"""
+
+    G = GraphBuilder()
+    b1 = G.add(make)(1)
+    b2 = G.add(make, persist=True)(b1)
+    r1 = G.add(reduce)(b2)
+
+    G.run(r1)
+
+    assert(b2().nbytes == N_BYTES)
+    assert(N_BYTES <= G.live_bytes < 2 * N_BYTES)
+    assert(2 * N_BYTES <= G.peak_bytes)
+
+    memory_report = G.memory_report()
+
+    assert(memory_report[0]['node_uid'] == b2().node_uid)
+    assert(memory_report[0]['persist_reason'] == 'persist')
+    assert(memory_report[0]['nbytes'] == N_BYTES)
+    assert(set(elem['persist_reason'] for elem in memory_report) == {'input', 'persist', 'run target'})
+
+    with pytest.warns(RuntimeWarning):
+        b2().release_memory()
+    G.reset_peak_bytes()
+    assert(G.peak_bytes == G.live_bytes < N_BYTES)
+
+def test_memory_ceiling():
+
+    from pyflow.utils import Memory_Ceiling_Warning
+    from pyflow.utils import Memory_Ceiling_Error
+
+    G = GraphBuilder(memory_ceiling=N_BYTES // 2)
+    b1 = G.add(make)(1)
+
+    with pytest.warns(Memory_Ceiling_Warning):
+        b1.get()
+
+    H = GraphBuilder(memory_ceiling=N_BYTES // 2, on_memory_ceiling='raise')
+    b2 = H.add(make)(1)
+
+    with pytest.raises(Memory_Ceiling_Error):
+        b2.get()
+
+    assert(not b2.has_value())
+    assert(H.live_bytes < N_BYTES // 2)
+
+    with pytest.raises(ValueError):
+        GraphBuilder(on_memory_ceiling='ignore')
+
+def test_unneeded_sibling_outputs_are_dropped():
+
+    def splitting(i):
+        return i, make(i)
+
+    def increment(a):
+        return a + 1
+
+    G = GraphBuilder()
+    b1, b2 = G.add(splitting, n_out=2)(1)
+    a1 = G.add(increment)(b1)
+    r1 = G.add(reduce)(b2)
+
+    assert(G.run_only(a1) == 2)
+
+    # b2 is only consumed by r1, which was not requested
+    assert(not b2().has_value())
+    assert(G.peak_bytes < N_BYTES)
+    assert({'node_uid': b2().node_uid, 'alias': 'data', 'persist_reason': 'dropped', 'nbytes': N_BYTES} in G.memory_report())
+
+    # once needed, it is computed again, and b1 is the unneeded one
+    assert(G.run_only(r1) == 100000.0)
+    assert([elem['node_uid'] for elem in G.memory_report() if elem['persist_reason'] == 'dropped'] == [b1().node_uid])
+
+def test_deep_memory_sizing():
+
+    def identity(a):
+        return a
+
+    df = pd.DataFrame({'a': ['x' * 100] * 1000})
+
+    # only the pointers of object columns are counted by default
+    assert(sizeof_value(df) < 100 * 1000 < sizeof_value(df, deep=True))
+
+    G = GraphBuilder()
+    a1 = G.add(identity, persist=True)(df)
+    G.run(a1)
+
+    H = GraphBuilder(deep_memory_sizing=True)
+    b1 = H.add(identity, persist=True)(df)
+    H.run(b1)
+
+    assert(a1().nbytes == sizeof_value(df))
+    assert(b1().nbytes == sizeof_value(df, deep=True))
+
+    with pytest.raises(TypeError):
+        GraphBuilder(deep_memory_sizing=1)
@@ -0,0 +1,75 @@
+import pytest
+
+import pyflow
+from pyflow import GraphBuilder
+from pyflow.metrics import get_metrics_registry
+
+def adding(a, b):
+    return a + b
+
+def listing(n):
+    return list(range(n))
+
+def build_graph():
+
+    G = GraphBuilder(alias='service')
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding, method_alias='last_adding')(a1, 3)
+
+    return G, a1, a2
+
+def test_metrics():
+
+    registry = pyflow.enable_metrics()
+
+    try:
+        G, a1, a2 = build_graph()
+
+        assert(G.run(a2) == 6)
+        assert(G.run(a2) == 6)
+
+        assert(registry.ops_executed.get(('service', 'adding')) == 1)
+        assert(registry.op_duration.get(('service', 'last_adding'))[1] == 1)
+        assert(registry.cache_misses.get(('service', 'adding')) == 1)
+        assert(registry.cache_hits.get(('service', 'last_adding')) == 1)
+        assert(registry.released_bytes.get(('service', 'adding')) > 0)
+        assert(registry.live_bytes.get(('service',)) == G.live_bytes)
+
+        # fused op nodes and map op nodes are recorded by the op nodes they run
+        a2().release_memory()
+        G.run(a2, fuse=True)
+
+        b1 = G.add(listing)(3)
+        b2 = G.map_over(adding)(b1, 1)
+        G.run(b2)
+
+        assert(registry.ops_executed.get(('service', 'adding')) == 5)
+        assert(registry.ops_executed.get(('service', 'last_adding')) == 2)
+
+    finally:
+        pyflow.disable_metrics()
+
+    text = registry.to_prometheus_text()
+
+    assert('# TYPE pyflow_op_duration_seconds histogram\n' in text)
+    assert('pyflow_ops_executed_total{graph="service",op="adding"} 5\n' in text)
+    assert('pyflow_op_duration_seconds_bucket{graph="service",op="adding",le="+Inf"} 5\n' in text)
+
+def test_metrics_disabled(tmp_path):
+
+    registry = pyflow.MetricsRegistry()
+
+    G, a1, a2 = build_graph()
+    G.run(a2)
+
+    assert(get_metrics_registry() is None)
+    assert(registry.ops_executed.values == {})
+
+    filepath = str(tmp_path / 'pyflow.prom')
+    registry.write_prometheus_text(filepath)
+
+    with open(filepath) as f:
+        assert(f.read() == registry.to_prometheus_text())
+
+    with pytest.raises(TypeError):
+        pyflow.enable_metrics(registry=dict())
@@ -0,0 +1,310 @@
+import pytest
+import threading
+import time
+
+from pyflow import GraphBuilder
+
+def adding(a, b):
+    return a + b
+
+def increment(a):
+    return a + 1
+
+def test_plan_spans_grafted_graphs():
+    """Test that the plan of H includes the op nodes of G it depends on"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding)(a1, 2)
+    a3 = G.add(adding)(a1, 4)
+
+    H = GraphBuilder()
+    a4 = H.add(adding)(a2, 1)
+    a5 = H.add(adding)(a4, 2)
+
+    plan = H.plan(a5)
+
+    assert(len(plan) == 4)
+    assert(plan.get_graph_uids() == {G.graph_uid, H.graph_uid})
+    assert([elem.node_uid for elem in plan.op_nodes] == ['adding_0', 'adding_4', 'adding_0', 'adding_3'])
+
+    assert(H.run(a5) == 8)
+    assert(not a1.has_value())
+    assert(not a2.has_value())
+    assert(not a4.has_value())
+
+def test_plan_stops_at_computed_values():
+
+    G = GraphBuilder()
+    a1 = G.add(adding, persist=True)(1, 2)
+    a2 = G.add(adding)(a1, 2)
+
+    a1.get()
+
+    assert([elem.node_uid for elem in G.plan(a2).op_nodes] == ['adding_4'])
+    assert(len(G.plan(a1)) == 0)
+
+def test_threaded_scheduler_runs_independent_ops_concurrently():
+
+    barrier = threading.Barrier(3, timeout=5)
+
+    def waiting(a):
+        # only passes once all three branches are running at the same time
+        barrier.wait()
+        return a
+
+    G = GraphBuilder()
+    b1 = G.add(waiting)(1)
+    b2 = G.add(waiting)(2)
+    b3 = G.add(waiting)(3)
+    a1 = G.add(adding)(b1, b2)
+    a2 = G.add(adding)(a1, b3)
+
+    assert(G.run(a2, scheduler='threads', max_workers=3) == 6)
+    assert(not b1.has_value())
+    assert(not a1.has_value())
+    assert(not any(v.is_activated() for v in G.strong_ref_dict.values() if v.node_type == 'operation'))
+
+def test_threaded_scheduler_matches_sequential():
+
+    def build():
+        G = GraphBuilder()
+        a = G.add(increment)(0)
+        outputs = []
+        for i in range(3):
+            a = G.add(adding)(a, i)
+            outputs.append(G.add(increment)(a))
+        return G, outputs
+
+    G1, outputs1 = build()
+    G2, outputs2 = build()
+
+    assert(G1.run(*outputs1) == G2.run(*outputs2, scheduler='threads', max_workers=4))
+
+def test_threaded_scheduler_raises_op_errors():
+
+    def failing(a):
+        raise RuntimeError('failed')
+
+    G = GraphBuilder()
+    a1 = G.add(failing)(1)
+    a2 = G.add(adding)(a1, 2)
+
+    with pytest.raises(RuntimeError):
+        G.run(a2, scheduler='threads')
+
+    with pytest.raises(ValueError):
+        G.run(a2, scheduler='threads', max_workers=0)
+
+def test_get_long_chain():
+    """Test computing a chain deeper than the recursion limit"""
+
+    G = GraphBuilder()
+    a = G.add(increment)(0)
+    for i in range(3000):
+        a = G.add(increment)(a)
+
+    assert(a.get() == 3001)
+
+def test_run_iter():
+
+    def sleeping(a, duration):
+        time.sleep(duration)
+        return a + 1
+
+    G = GraphBuilder()
+    a1 = G.add(sleeping)(1, 0.3)
+    a2 = G.add(sleeping)(1, 0.01)
+    a3 = G.add(adding)(a1, a2)
+
+    results = []
+
+    for node, value in G.run_iter(a1, a2, a3, scheduler='threads'):
+
+        # a yielded value is released once yielded, or once its consumers have run
+        if node == a3:
+            assert(not a1().has_value() and not a2().has_value())
+
+        results.append((node().node_uid, value))
+
+    # yielded in the order they are computed
+    assert(results == [(a2().node_uid, 2), (a1().node_uid, 2), (a3().node_uid, 4)])
+    assert(not any(elem().has_value() for elem in [a1, a2, a3]))
+
+    # persisted and previously requested values are kept
+    G.run_only(a1)
+
+    assert([value for node, value in G.run_iter(a1, a3)] == [2, 4])
+    assert(a1().has_value())
+    assert(not a3().has_value())
+
+def test_run_iter_checks_arguments():
+    """Test that the arguments of run_iter are checked when it is called"""
+
+    G = GraphBuilder()
+    a1 = G.add(increment)(1)
+
+    with pytest.raises(ValueError):
+        G.run_iter(a1, scheduler='bogus')
+
+    with pytest.raises(ValueError):
+        G.run_iter(a1, scheduler='distributed', order='memory')
+
+    with pytest.raises(TypeError):
+        G.run_iter(a1, fuse=1)
+
+    with pytest.raises(ValueError):
+        G.run_iter(a1, scheduler='distributed', workers=[])
+
+def test_branch_skips_inactive_side():
+
+    import importlib.util
+
+    schedulers = [None, 'threads']
+
+    if importlib.util.find_spec('cloudpickle') is not None:
+        schedulers.append('distributed')
+
+    for scheduler in schedulers:
+        check_branch_skips_inactive_side(scheduler)
+
+def check_branch_skips_inactive_side(scheduler):
+
+    from pyflow.worker import LocalWorkers
+
+    calls = []
+
+    def counting(a):
+        return len(a)
+
+    def is_small(n):
+        calls.append('is_small')
+        return n < 5
+
+    def expensive(a):
+        calls.append('expensive')
+        return sum(a) * 100
+
+    def cheap(a):
+        calls.append('cheap')
+        return sum(a)
+
+    def reporting(a):
+        calls.append('reporting')
+        return 'total {}'.format(a)
+
+    with LocalWorkers(2 if scheduler == 'distributed' else 0) as local_workers:
+
+        for data in [[1, 2], list(range(10))]:
+
+            calls.clear()
+
+            G = GraphBuilder()
+            a0 = G.add(counting)(data)
+            a1 = G.add(is_small)(a0)
+            b1 = G.add(expensive)(data)
+            a2 = G.add(increment)(b1)
+            a3 = G.add(cheap)(data)
+            a4 = G.branch(a1, then=a3, otherwise=a2)
+            a5 = G.add(reporting, when=a1)(a4)
+
+            a4_val, a5_val = G.run(a4, a5, scheduler=scheduler, workers=local_workers.addresses or None)
+
+            # the op nodes only computing the inactive side, and the op nodes conditioned
+            # on an unmet condition, are skipped
+            if len(data) < 5:
+                assert((a4_val, a5_val) == (3, 'total 3'))
+                assert(a2().is_skipped() and not a3().is_skipped())
+            else:
+                assert((a4_val, a5_val) == (4501, None))
+                assert(a3().is_skipped() and a5().is_skipped())
+
+            # the functions sent to the workers append to copies of calls: the conditions
+            # evaluated by the driver are fetched, not computed again in this process
+            if scheduler == 'distributed':
+                assert(calls == [])
+            elif len(data) < 5:
+                assert(sorted(calls) == ['cheap', 'is_small', 'reporting'])
+            else:
+                assert(sorted(calls) == ['expensive', 'is_small'])
+
+            assert(G.graph_dict[b1().get_parent_node_weak_refs()[0]().node_uid].get('is_skipped') == (len(data) < 5))
+
+def test_when_is_evaluated_on_every_run():
+
+    from pyflow.utils import get_render_model
+
+    G = GraphBuilder()
+    a1 = G.add(adding, persist=True)(1, 2)
+    a2 = G.add(increment, when=a1)(a1)
+    a3 = G.add(increment)(a2)
+
+    assert(G.run(a3) == 5)
+
+    # the condition is a parent data node, not passed to the function
+    op_node = a2().get_parent_node_weak_refs()[0]()
+    assert(len(op_node.get_parent_node_weak_refs()) == 2)
+
+    a1().set_value(0)
+    a2().release_memory()
+    a3().release_memory()
+
+    assert(G.run(a3) is None)
+    assert(a2().is_skipped() and a3().is_skipped())
+
+    render_model = get_render_model(G.graph_dict, G.graph_uid, G._graph_attributes(), False, False)
+    assert('dashed' in render_model['nodes'][a3().node_uid]['attributes']['style'])
+
+    with pytest.raises(TypeError):
+        G.add(increment, when=0)
+
+def test_map_over():
+
+    from pyflow.timings import OpTimingHistory
+    from pyflow.timings import get_function_key
+
+    barrier = threading.Barrier(4, timeout=5)
+
+    def waiting_increment(a, b):
+        # returns only once every element is running
+        barrier.wait()
+        return a + b
+
+    def listing(n):
+        return list(range(n))
+
+    def summing(a):
+        return sum(a)
+
+    G = GraphBuilder()
+    a1 = G.add(listing)(4)
+    a2 = G.map_over(waiting_increment)(a1, b=10)
+    a3 = G.add(summing)(a2)
+
+    timing_history = OpTimingHistory()
+
+    # one op node per element, run in parallel
+    assert(G.run(a2, a3, scheduler='threads', max_workers=4) == [[10, 11, 12, 13], 46])
+    assert(not a1().has_value())
+    assert(len(G.memory_ledger.nbytes) == len([elem for elem in G.strong_ref_dict.values() 
+                                               if elem.node_type == 'data' and elem.has_value()]))
+
+    # the element op nodes are timed under the function
+    barrier = threading.Barrier(1)
+    a2().release_memory()
+    a3().release_memory()
+
+    from pyflow.scheduler import SequentialExecutor
+    from pyflow.scheduler import build_plan
+
+    SequentialExecutor(timing_history=timing_history).execute(build_plan([a3()]))
+
+    assert(a3().get() == 46)
+    assert(get_function_key(waiting_increment) in timing_history.durations)
+
+    H = GraphBuilder()
+    b1 = H.map_over(increment)([])
+    assert(H.run(b1) == [])
+
+    with pytest.raises(ValueError):
+        H.map_over(increment)(a=[1])
@@ -0,0 +1,87 @@
+import pytest
+import pickle
+
+import numpy as np
+
+from pyflow import GraphBuilder
+from pyflow.scheduler import SequentialExecutor
+
+def adding(a, b):
+    return a + b
+
+def splitting(a):
+    return a, a + 1
+
+def test_pickle_graph():
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(np.arange(3), 1)
+    a2 = G.add(adding, persist=True)(a1, 2)
+
+    H = GraphBuilder()
+    b1, b2 = H.add(splitting, n_out=2)(a2)
+    b3 = H.add(adding)(b1, b2)
+
+    H2 = pickle.loads(pickle.dumps(H))
+
+    # the linked structure is rebuilt, including the grafted graph it depends on
+    assert(sorted(H2.strong_ref_dict.keys()) == sorted(H.strong_ref_dict.keys()))
+    assert(len(H2.external_nodes) == 7)
+    assert(H2.graph_dict.keys() == H.graph_dict.keys())
+
+    b3_val = H2.run(b3().node_uid)
+
+    assert(np.array_equal(b3_val, [7, 9, 11]))
+    assert(not a2().has_value())
+    assert(not b3().has_value())
+
+def test_serialize_closures():
+
+    pytest.importorskip("cloudpickle")
+
+    factor = 2
+
+    def scaling(a):
+        return a * factor
+
+    G = GraphBuilder()
+    a1 = G.add(scaling)(4)
+
+    G2 = GraphBuilder.deserialize(G.serialize())
+
+    assert(G2.run('data_2') == 8)
+
+def test_serialize_conditioned_graph():
+
+    pytest.importorskip("cloudpickle")
+
+    def is_positive(a):
+        return a > 0
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    c1 = G.add(is_positive)(a1)
+    a2 = G.add(adding, when=c1)(a1, 3)
+
+    # the condition of the last add is kept by its op node, not by the builder
+    G2 = GraphBuilder.deserialize(G.serialize())
+
+    assert(G2.run(a2().node_uid) == 6)
+
+def test_pickle_plan():
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    b1, b2 = G.add(splitting, n_out=2)(a1)
+    a2 = G.add(adding)(b1, 1)
+    a3 = G.add(adding)(a2, 3)
+
+    plan = pickle.loads(pickle.dumps(G.plan(a3, fuse=True)))
+
+    assert(len(plan) == 3)
+    assert(len(plan.unneeded_data_node_ids) == 1)
+
+    SequentialExecutor().execute(plan)
+
+    assert(plan.target_nodes[0].get() == 7)
+    assert(not a3().has_value())
@@ -0,0 +1,95 @@
+import pytest
+import os
+
+from pyflow import GraphBuilder
+from pyflow.timings import get_function_key
+
+def increment(a):
+    return a + 1
+
+def slow(a):
+    return a
+
+def fast(a):
+    return a
+
+def test_timing_history_persists(tmp_path):
+    """Test durations are recorded by function and reloaded from the timings file"""
+
+    timings_filepath = os.path.join(str(tmp_path), 'timings.json')
+
+    G = GraphBuilder(timings_filepath=timings_filepath)
+    a = G.add(increment)(0)
+    a = G.add(increment)(a)
+    G.run()
+
+    assert(list(G.timing_history.durations) == [get_function_key(increment)])
+    assert(os.path.exists(timings_filepath))
+
+    H = GraphBuilder(timings_filepath=timings_filepath)
+    assert(H.timing_history.durations == G.timing_history.durations)
+
+    with pytest.raises(TypeError):
+        GraphBuilder(timings_filepath=1)
+
+def test_timing_history_separates_lambdas():
+    """Test that lambdas of the same scope keep separate durations"""
+
+    G = GraphBuilder()
+    G.add(lambda a: a + 1)(0)
+    G.add(lambda a: a * 2)(0)
+    G.run()
+
+    assert(len(G.timing_history) == 2)
+
+def _launch_order(G, **kwargs):
+
+    calls = []
+
+    for k, v in G.strong_ref_dict.items():
+        if v.node_type == 'operation':
+            v.function = _logged(v.function, k, calls)
+
+    G.run(scheduler='threads', max_workers=1, **kwargs)
+
+    return calls
+
+def _logged(function, node_uid, calls):
+
+    def wrapper(a):
+        calls.append(node_uid)
+        return function(a)
+
+    wrapper.__module__ = function.__module__
+    wrapper.__qualname__ = function.__qualname__
+
+    return wrapper
+
+def test_critical_path_order_starts_long_chains_first():
+
+    def build():
+        G = GraphBuilder()
+        s1 = G.add(increment)(1)
+        s2 = G.add(increment)(2)
+        c = G.add(increment)(3)
+        c = G.add(increment)(c)
+        c = G.add(increment)(c)
+        return G
+
+    assert(_launch_order(build())[0] == 'increment_0')
+    assert(_launch_order(build(), order='critical_path')[0] == 'increment_6')
+
+def test_critical_path_order_uses_recorded_durations():
+
+    G = GraphBuilder()
+    a = G.add(fast)(1)
+    a = G.add(fast)(a)
+    b = G.add(slow)(2)
+
+    G.timing_history.durations[get_function_key(fast)] = 0.01
+    G.timing_history.durations[get_function_key(slow)] = 1.0
+
+    assert(_launch_order(G, order='critical_path')[0] == 'slow_5')
+
+    with pytest.raises(ValueError):
+        G.run(scheduler='threads', order='critical_path', memory_budget=100)
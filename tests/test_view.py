@@ -0,0 +1,110 @@
+import pytest
+import shutil
+import os
+
+from pyflow import GraphBuilder
+from pyflow.utils import get_dot_source
+from pyflow.utils import set_dot_dpi
+from pyflow.utils import RENDERED_GRAPH_CACHE
+
+pytest.importorskip("graphviz")
+
+def adding(a, b):
+    return a + b
+
+def increment(a):
+    return a + 1
+
+def _dot_source(G, summary=True, verbose=False, **kwargs):
+    return get_dot_source(G.graph_dict, G.graph_uid, G._graph_attributes(), summary, verbose, **kwargs)
+
+def test_view_emits_each_node_once():
+    """Test that every node statement appears exactly once in the DOT source"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding)(a1, a1)
+    a3 = G.add(adding)(a1, a2)
+
+    dot_source = G.view(summary=False, engine='dot').source
+    node_lines = [elem.strip() for elem in dot_source.split('\n') if '[' in elem and '->' not in elem and not elem.strip().startswith('graph ')]
+    node_uids = [elem.split(' [')[0] for elem in node_lines]
+
+    assert(len(node_uids) == len(set(node_uids)))
+    assert(len(node_uids) == len([v for v in G.graph_dict.values() if 'type' in v]))
+
+def test_view_is_cached_per_graph_version():
+    """Test that the DOT source is reused until the graph changes"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+
+    assert(_dot_source(G) is _dot_source(G))
+    assert(_dot_source(G, summary=False) is not _dot_source(G))
+
+    dot_source = _dot_source(G)
+    a2 = G.add(adding, persist=True)(a1, 2)
+    assert(_dot_source(G) is not dot_source)
+    assert('{adding|}' in _dot_source(G))
+
+    G.run(a2)
+    assert('{adding|(1, )}' in _dot_source(G))
+
+def test_view_dependency_does_not_copy_graph():
+    """Test that the activation overlay leaves graph_dict untouched"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+    a2 = G.add(adding)(a1, 2)
+    a3 = G.add(adding)(3, 4)
+
+    version = G.graph_dict.version
+    dot_source = G.view_dependency(a2, engine='dot').source
+
+    assert(G.graph_dict.version == version)
+    assert(not any(v['is_activated'] for v in G.graph_dict.values()))
+    assert(dot_source.count('lawngreen') == 2)
+
+def test_view_long_chain():
+    """Test viewing a graph deeper than the recursion limit"""
+
+    G = GraphBuilder()
+    a = G.add(increment)(0)
+    for i in range(1500):
+        a = G.add(increment)(a)
+
+    assert(G.view(engine='dot').source.count('->') == 1500)
+
+def test_set_dot_dpi():
+    """Test the dpi graph attribute is injected into the DOT source"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+
+    dot_source = set_dot_dpi(G.view(engine='dot').source, 72)
+    assert(dot_source.split('\n')[1] == '\tgraph [dpi="72"]')
+
+def test_save_view_invalid_fileformat():
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+
+    with pytest.raises(TypeError):
+        G.save_view(fileformat='jpg')
+
+@pytest.mark.skipif(shutil.which('dot') is None, reason="requires the graphviz dot executable")
+@pytest.mark.parametrize("fileformat", ['png', 'pdf', 'svg'])
+def test_save_view_in_memory(tmp_path, fileformat):
+    """Test save_view writes only the requested file and caches the rendered bytes"""
+
+    G = GraphBuilder()
+    a1 = G.add(adding)(1, 2)
+
+    img_filepath = G.save_view(dirpath=str(tmp_path), filename='graph', fileformat=fileformat)
+
+    assert(os.listdir(str(tmp_path)) == ['graph.' + fileformat])
+    assert(img_filepath == os.path.join(str(tmp_path), 'graph.' + fileformat))
+
+    cache_size = len(RENDERED_GRAPH_CACHE)
+    G.save_view(dirpath=str(tmp_path), filename='graph', fileformat=fileformat)
+    assert(len(RENDERED_GRAPH_CACHE) == cache_size)